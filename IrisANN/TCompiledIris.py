@@ -0,0 +1,177 @@
+from array import array
+from types import MappingProxyType
+
+try:
+  from TPrototypeIndex import TPrototypeIndex
+except ImportError:
+  from IrisANN.TPrototypeIndex import TPrototypeIndex
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# Immutable, precompiled form of a TIris network that can be shared by any
+# number of threads. The weights are kept in flat, read-only float64 buffers
+# (row-major, one row per evolving node) and the sum of every prototype row is
+# computed once, so Recall only has to add the sum of the inputs to it instead
+# of re-accumulating the prototype weights for every call. Because the sums
+# are grouped differently, results can differ from TIris.Recall in the last
+# bit; Recall and RecallBatch of this class always agree with each other.
+#
+# Search selects how Recall finds the winning evolving node: "linear" scans
+# every prototype, "tree" uses a TPrototypeIndex, which returns the same
+# winner but only visits the prototypes near the input and pays off for
+# networks with thousands of evolving nodes. RecallBatch always scans.
+#
+# Ranges optionally maps the name of every input to its ( min, max ) range
+# in original units, for models loaded with their input ranges (see
+# TModelFile); it is None for models built from weights alone.
+SEARCH_METHODS = ( "linear", "tree" )
+
+class TCompiledIris ( object ):
+  __slots__ = ( "InputNodes", "EvolvingNodes", "OutputNodes", "I2EW", "E2OW", "RowSums", "Search", "Index", "Ranges" )
+
+  def __init__ ( self, I2EW, E2OW, Search = "linear", Ranges = None ):
+    InputNodes = len ( I2EW [ 0 ] )
+    OutputNodes = len ( E2OW [ 0 ] )
+    if len ( I2EW ) != len ( E2OW ):
+      raise ValueError ( "I2EW and E2OW must have one row per evolving node" )
+    for CurrRow in I2EW:
+      if len ( CurrRow ) != InputNodes:
+        raise ValueError ( "every I2EW row must have %d weights" % InputNodes )
+    for CurrRow in E2OW:
+      if len ( CurrRow ) != OutputNodes:
+        raise ValueError ( "every E2OW row must have %d weights" % OutputNodes )
+
+    RowSums = array ( "d" )
+    for CurrRow in I2EW:
+      CurrSum = 0.0
+      for CurrWeight in CurrRow:
+        CurrSum = CurrSum + CurrWeight
+      RowSums.append ( CurrSum )
+
+    self.__Assign ( InputNodes, OutputNodes,
+      memoryview ( array ( "d", [ W for Row in I2EW for W in Row ] ) ).toreadonly ( ),
+      memoryview ( array ( "d", [ W for Row in E2OW for W in Row ] ) ).toreadonly ( ),
+      memoryview ( RowSums ).toreadonly ( ), Search, Ranges )
+
+  def __Assign ( self, InputNodes, OutputNodes, I2EW, E2OW, RowSums, Search, Ranges ):
+    if Search not in SEARCH_METHODS:
+      raise ValueError ( "Search must be one of %s" % ", ".join ( SEARCH_METHODS ) )
+    if Ranges is not None:
+      if len ( Ranges ) != InputNodes:
+        raise ValueError ( "Ranges must have one entry per input" )
+      Ranges = MappingProxyType ( dict ( Ranges ) )
+    Set = object.__setattr__
+    Set ( self, "InputNodes", InputNodes )
+    Set ( self, "EvolvingNodes", len ( RowSums ) )
+    Set ( self, "OutputNodes", OutputNodes )
+    Set ( self, "I2EW", I2EW )
+    Set ( self, "E2OW", E2OW )
+    Set ( self, "RowSums", RowSums )
+    Set ( self, "Search", Search )
+    Set ( self, "Index", TPrototypeIndex ( I2EW, RowSums, InputNodes ) if Search == "tree" else None )
+    Set ( self, "Ranges", Ranges )
+
+  @classmethod
+  def FromModel ( cls, Model, Search = "linear", Ranges = None ):
+    return cls ( Model.I2EW, Model.E2OW, Search, Ranges )
+
+  # Builds a model directly on flat, read-only float64 buffers (e.g. views of
+  # a memory-mapped model file) without copying them. RowSums must hold the
+  # row sums accumulated as in __init__, so that results are the same.
+  @classmethod
+  def FromBuffers ( cls, InputNodes, OutputNodes, I2EW, E2OW, RowSums, Search = "linear", Ranges = None ):
+    EvolvingNodes = len ( RowSums )
+    if InputNodes < 1 or OutputNodes < 1 or EvolvingNodes < 1:
+      raise ValueError ( "a model needs at least one input, evolving and output node" )
+    if len ( I2EW ) != EvolvingNodes * InputNodes or len ( E2OW ) != EvolvingNodes * OutputNodes:
+      raise ValueError ( "I2EW and E2OW must have one row per evolving node" )
+    for Buffer in ( I2EW, E2OW, RowSums ):
+      if Buffer.format != "d" or not Buffer.readonly:
+        raise ValueError ( "model buffers must be read-only float64 memoryviews" )
+    Model = object.__new__ ( cls )
+    Model.__Assign ( InputNodes, OutputNodes, I2EW, E2OW, RowSums, Search, Ranges )
+    return Model
+
+  def __setattr__ ( self, Name, Value ):
+    raise AttributeError ( "TCompiledIris is immutable" )
+
+  def __delattr__ ( self, Name ):
+    raise AttributeError ( "TCompiledIris is immutable" )
+
+  def Recall ( self, InputValues ):
+    InputNodes = self.InputNodes
+    Weights = self.I2EW
+    RowSums = self.RowSums
+
+    InputSum = 0.0
+    for CurrValue in InputValues:
+      InputSum = InputSum + CurrValue
+
+    MaxActivation = 0.0
+    Winner = 0
+    if self.Index is not None:
+      Winner, MaxActivation = self.Index.Search ( InputValues, InputSum )
+    elif InputNodes == 4:
+      # unrolled form of the general loop below for the Iris network
+      X0, X1, X2, X3 = InputValues
+      Base = 0
+      for CurrEvol in range ( 0, self.EvolvingNodes ):
+        CurrDiff = abs ( X0 - Weights [ Base ] ) + abs ( X1 - Weights [ Base + 1 ] ) + abs ( X2 - Weights [ Base + 2 ] ) + abs ( X3 - Weights [ Base + 3 ] )
+        CurrActivation = 1.0 - CurrDiff / ( InputSum + RowSums [ CurrEvol ] )
+        if CurrActivation > 1.0:
+          CurrActivation = 1.0
+        if CurrActivation > MaxActivation:
+          MaxActivation = CurrActivation
+          Winner = CurrEvol
+        Base = Base + 4
+    else:
+      for CurrEvol in range ( 0, self.EvolvingNodes ):
+        Base = CurrEvol * InputNodes
+        CurrDiff = 0.0
+        for CurrInput in range ( 0, InputNodes ):
+          CurrDiff = CurrDiff + abs ( InputValues [ CurrInput ] - Weights [ Base + CurrInput ] )
+        CurrActivation = 1.0 - CurrDiff / ( InputSum + RowSums [ CurrEvol ] )
+        if CurrActivation > 1.0:
+          CurrActivation = 1.0
+        if CurrActivation > MaxActivation:
+          MaxActivation = CurrActivation
+          Winner = CurrEvol
+
+    OutputValues = []
+    Base = Winner * self.OutputNodes
+    for CurrOutput in range ( 0, self.OutputNodes ):
+      OutVal = MaxActivation * self.E2OW [ Base + CurrOutput ]
+      if OutVal > 1.0:
+        OutVal = 1.0
+      OutputValues.append ( OutVal )
+    return OutputValues
+
+  # Vectorised form of Recall (requires numpy); returns the N x OutputNodes
+  # output array and the winning evolving node of every row.
+  def RecallBatch ( self, InputMatrix ):
+    if numpy is None:
+      raise ImportError ( "RecallBatch requires numpy" )
+    Inputs = numpy.asarray ( InputMatrix, dtype = numpy.float64 )
+    if Inputs.ndim != 2 or Inputs.shape [ 1 ] != self.InputNodes:
+      raise ValueError ( "RecallBatch expects an N x %d array" % self.InputNodes )
+    Weights = numpy.frombuffer ( self.I2EW, dtype = numpy.float64 ).reshape ( self.EvolvingNodes, self.InputNodes )
+    OutWeights = numpy.frombuffer ( self.E2OW, dtype = numpy.float64 ).reshape ( self.EvolvingNodes, self.OutputNodes )
+    RowSums = numpy.frombuffer ( self.RowSums, dtype = numpy.float64 )
+
+    InputSum = numpy.zeros ( Inputs.shape [ 0 ] )
+    CurrDiff = numpy.zeros ( ( Inputs.shape [ 0 ], self.EvolvingNodes ) )
+    for CurrInput in range ( 0, self.InputNodes ):
+      InputSum = InputSum + Inputs [ :, CurrInput ]
+      CurrDiff = CurrDiff + numpy.abs ( Inputs [ :, CurrInput, None ] - Weights [ None, :, CurrInput ] )
+    Activation = numpy.minimum ( 1.0 - CurrDiff / ( InputSum [ :, None ] + RowSums [ None, : ] ), 1.0 )
+
+    # same winner rule as Recall: strictly positive, first maximum wins
+    Activation = numpy.where ( Activation > 0.0, Activation, 0.0 )
+    Winners = numpy.argmax ( Activation, axis = 1 )
+    MaxActivation = Activation [ numpy.arange ( Inputs.shape [ 0 ] ), Winners ]
+
+    OutputValues = numpy.minimum ( MaxActivation [ :, None ] * OutWeights [ Winners ], 1.0 )
+    return OutputValues, Winners
@@ -0,0 +1,220 @@
+import random
+from array import array
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# Precomputed decision table: an approximation of a network that answers
+# Recall in constant time, whatever the number of evolving nodes.
+#
+# The normalized input space [0,1]^InputNodes is cut into Resolution cells
+# per input, and the outputs of the network at the centre of every cell are
+# stored in a flat float32 array. Recall finds the cell holding the input and
+# returns its stored outputs. Cells next to a class boundary, where the
+# winning output of the cell differs from that of a neighbouring cell, can be
+# refined: they are cut again into Refine sub-cells per input, stored in a
+# second array, so the boundaries are followed more closely for a small
+# share of the memory a finer grid would take.
+#
+# The table is built from any model with a Recall method, e.g. TIris or
+# TCompiledIris; RecallBatch is used when numpy is available. It keeps the
+# shape, Ranges and EvolvingNodes of the model so it can be used in its
+# place, and the model itself so that Deviation can measure how far the
+# table is from exact recall.
+#
+# The grid is built and evaluated Chunk cells at a time, so building a fine
+# table never holds more than one chunk of cell centres besides the table.
+Chunk = 65536
+
+class TDecisionTable ( object ):
+  __slots__ = ( "InputNodes", "EvolvingNodes", "OutputNodes", "Ranges", "Resolution", "Refine", "Model", "Table", "Offsets", "Refined", "RefinedCells" )
+
+  def __init__ ( self, Model, Resolution = 16, Refine = 0 ):
+    if Resolution < 1:
+      raise ValueError ( "Resolution must be at least 1" )
+    if Refine == 1 or Refine < 0:
+      raise ValueError ( "Refine must be 0 (no refinement) or at least 2" )
+    self.InputNodes = Model.InputNodes
+    self.EvolvingNodes = Model.EvolvingNodes
+    self.OutputNodes = Model.OutputNodes
+    self.Ranges = getattr ( Model, "Ranges", None )
+    self.Resolution = Resolution
+    self.Refine = Refine
+    self.Model = Model
+
+    Cells = Resolution ** self.InputNodes
+    self.Table = array ( "f" )
+    for Points in self.__Centres ( Resolution, 1.0 ):
+      self.Table.extend ( self.__Evaluate ( Points ) )
+    self.Offsets = array ( "i", [ -1 ] ) * Cells
+    self.Refined = array ( "f" )
+    self.RefinedCells = 0
+    if Refine:
+      self.__RefineBoundaries ( )
+
+  def __Coordinates ( self, Cell, Resolution ):
+    # per-input coordinates of a flat cell index, first input most significant
+    Coordinates = [ 0 ] * self.InputNodes
+    for CurrInput in range ( self.InputNodes - 1, -1, -1 ):
+      Cell, Coordinates [ CurrInput ] = divmod ( Cell, Resolution )
+    return Coordinates
+
+  def __Centres ( self, Resolution, Scale ):
+    # centres of all the cells, in cell order, of a Resolution grid spanning
+    # Scale along every input from the origin; yields them Chunk cells at a
+    # time, as an N x InputNodes array with numpy, else as a list of lists
+    Cells = Resolution ** self.InputNodes
+    Shape = ( Resolution, ) * self.InputNodes
+    for Start in range ( 0, Cells, Chunk ):
+      End = min ( Start + Chunk, Cells )
+      if numpy is not None:
+        Coordinates = numpy.stack ( numpy.unravel_index ( numpy.arange ( Start, End ), Shape ), axis = 1 )
+        yield ( Coordinates + 0.5 ) * ( Scale / Resolution )
+      else:
+        yield [ [ ( Coordinate + 0.5 ) * Scale / Resolution for Coordinate in self.__Coordinates ( Cell, Resolution ) ] for Cell in range ( Start, End ) ]
+
+  def __Evaluate ( self, Points ):
+    # flat outputs of the model at every point
+    if numpy is not None and hasattr ( self.Model, "RecallBatch" ):
+      Outputs = []
+      for Start in range ( 0, len ( Points ), Chunk ):
+        Outputs.extend ( self.Model.RecallBatch ( Points [ Start : Start + Chunk ] ) [ 0 ].ravel ( ).tolist ( ) )
+      return Outputs
+    return [ OutVal for Point in Points for OutVal in self.Model.Recall ( Point ) ]
+
+  def __Class ( self, Cell ):
+    Values = self.Table [ Cell * self.OutputNodes : ( Cell + 1 ) * self.OutputNodes ]
+    return Values.index ( max ( Values ) )
+
+  def __Boundaries ( self ):
+    # cells whose winning output differs from that of a neighbouring cell
+    Resolution = self.Resolution
+    if numpy is not None:
+      Table = numpy.frombuffer ( self.Table, dtype = numpy.float32 ).reshape ( -1, self.OutputNodes )
+      Classes = Table.argmax ( axis = 1 ).astype ( numpy.int8 ).reshape ( ( Resolution, ) * self.InputNodes )
+      Boundary = numpy.zeros ( Classes.shape, dtype = bool )
+      for CurrInput in range ( 0, self.InputNodes ):
+        Lower = [ slice ( None ) ] * self.InputNodes
+        Upper = [ slice ( None ) ] * self.InputNodes
+        Lower [ CurrInput ] = slice ( 0, -1 )
+        Upper [ CurrInput ] = slice ( 1, None )
+        Differs = Classes [ tuple ( Lower ) ] != Classes [ tuple ( Upper ) ]
+        Boundary [ tuple ( Lower ) ] |= Differs
+        Boundary [ tuple ( Upper ) ] |= Differs
+      return numpy.flatnonzero ( Boundary ).tolist ( )
+
+    Classes = [ self.__Class ( Cell ) for Cell in range ( 0, len ( self.Offsets ) ) ]
+    Boundary = []
+    for Cell in range ( 0, len ( Classes ) ):
+      Coordinates = self.__Coordinates ( Cell, Resolution )
+      Stride = 1
+      for CurrInput in range ( self.InputNodes - 1, -1, -1 ):
+        if ( Coordinates [ CurrInput ] > 0 and Classes [ Cell - Stride ] != Classes [ Cell ] ) or ( Coordinates [ CurrInput ] < Resolution - 1 and Classes [ Cell + Stride ] != Classes [ Cell ] ):
+          Boundary.append ( Cell )
+          break
+        Stride = Stride * Resolution
+    return Boundary
+
+  def __RefineBoundaries ( self ):
+    Resolution = self.Resolution
+    Boundary = self.__Boundaries ( )
+
+    # the sub-cells of several cells are evaluated together, as RecallBatch
+    # is much faster on large batches
+    SubCentres = [ list ( Centre ) for Points in self.__Centres ( self.Refine, 1.0 / Resolution ) for Centre in Points ]
+    Group = max ( 1, Chunk // len ( SubCentres ) )
+    for Start in range ( 0, len ( Boundary ), Group ):
+      Points = []
+      for Cell in Boundary [ Start : Start + Group ]:
+        Origin = [ Coordinate / Resolution for Coordinate in self.__Coordinates ( Cell, Resolution ) ]
+        Points.extend ( [ [ Corner + Offset for Corner, Offset in zip ( Origin, Centre ) ] for Centre in SubCentres ] )
+        self.Offsets [ Cell ] = self.RefinedCells * len ( SubCentres )
+        self.RefinedCells = self.RefinedCells + 1
+      self.Refined.extend ( self.__Evaluate ( Points ) )
+
+  def Recall ( self, InputValues ):
+    Resolution = self.Resolution
+    Cell = 0
+    Positions = []
+    for CurrValue in InputValues:
+      Position = CurrValue * Resolution
+      Coordinate = int ( Position )
+      if Coordinate >= Resolution:
+        Coordinate = Resolution - 1
+      elif Coordinate < 0:
+        Coordinate = 0
+      Cell = Cell * Resolution + Coordinate
+      Positions.append ( Position - Coordinate )
+
+    Base = self.Offsets [ Cell ]
+    if Base < 0:
+      Start = Cell * self.OutputNodes
+      return self.Table [ Start : Start + self.OutputNodes ].tolist ( )
+
+    Refine = self.Refine
+    SubCell = 0
+    for Position in Positions:
+      Coordinate = int ( Position * Refine )
+      if Coordinate >= Refine:
+        Coordinate = Refine - 1
+      elif Coordinate < 0:
+        Coordinate = 0
+      SubCell = SubCell * Refine + Coordinate
+    Start = ( Base + SubCell ) * self.OutputNodes
+    return self.Refined [ Start : Start + self.OutputNodes ].tolist ( )
+
+  # Vectorised form of Recall (requires numpy); returns the N x OutputNodes
+  # output array and the coarse cell of every row.
+  def RecallBatch ( self, InputMatrix ):
+    if numpy is None:
+      raise ImportError ( "RecallBatch requires numpy" )
+    Inputs = numpy.asarray ( InputMatrix, dtype = numpy.float64 )
+    if Inputs.ndim != 2 or Inputs.shape [ 1 ] != self.InputNodes:
+      raise ValueError ( "RecallBatch expects an N x %d array" % self.InputNodes )
+    Positions = Inputs * self.Resolution
+    Coordinates = numpy.clip ( numpy.floor ( Positions ), 0, self.Resolution - 1 ).astype ( numpy.int64 )
+    Powers = self.Resolution ** numpy.arange ( self.InputNodes - 1, -1, -1, dtype = numpy.int64 )
+    Cells = Coordinates @ Powers
+
+    Table = numpy.frombuffer ( self.Table, dtype = numpy.float32 ).reshape ( -1, self.OutputNodes )
+    OutputValues = Table [ Cells ].astype ( numpy.float64 )
+    Bases = numpy.frombuffer ( self.Offsets, dtype = numpy.int32 ) [ Cells ]
+    Fine = Bases >= 0
+    if Fine.any ( ):
+      SubCoordinates = numpy.floor ( ( Positions [ Fine ] - Coordinates [ Fine ] ) * self.Refine )
+      SubCoordinates = numpy.clip ( SubCoordinates, 0, self.Refine - 1 ).astype ( numpy.int64 )
+      SubPowers = self.Refine ** numpy.arange ( self.InputNodes - 1, -1, -1, dtype = numpy.int64 )
+      Refined = numpy.frombuffer ( self.Refined, dtype = numpy.float32 ).reshape ( -1, self.OutputNodes )
+      OutputValues [ Fine ] = Refined [ Bases [ Fine ] + SubCoordinates @ SubPowers ]
+    return OutputValues, Cells
+
+  # bytes held by the table arrays
+  def MemoryBytes ( self ):
+    return sum ( Buffer.itemsize * len ( Buffer ) for Buffer in ( self.Table, self.Offsets, self.Refined ) )
+
+  # Compares the table with exact recall of the model on Samples random
+  # inputs. Returns the largest and the mean absolute difference of any
+  # output over the samples, and the fraction of samples whose winning output
+  # differs; these are estimates, not bounds over the whole grid. Near a
+  # class boundary the outputs of the two sides can differ by up to 1.0, so
+  # the largest difference only falls below that once no sample lands in a
+  # cell crossed by a boundary; the mismatch fraction is the useful measure
+  # of the accuracy lost.
+  def Deviation ( self, Samples = 10000, Seed = 1 ):
+    Generator = random.Random ( Seed )
+    MaxDeviation = 0.0
+    TotalDeviation = 0.0
+    Disagreements = 0
+    for CurrSample in range ( 0, Samples ):
+      InputValues = [ Generator.random ( ) for CurrInput in range ( 0, self.InputNodes ) ]
+      Expected = self.Model.Recall ( InputValues )
+      OutputValues = self.Recall ( InputValues )
+      for CurrOutput in range ( 0, self.OutputNodes ):
+        CurrDeviation = abs ( OutputValues [ CurrOutput ] - Expected [ CurrOutput ] )
+        MaxDeviation = max ( MaxDeviation, CurrDeviation )
+        TotalDeviation = TotalDeviation + CurrDeviation
+      if OutputValues.index ( max ( OutputValues ) ) != Expected.index ( max ( Expected ) ):
+        Disagreements = Disagreements + 1
+    return MaxDeviation, TotalDeviation / ( Samples * self.OutputNodes ), Disagreements / Samples
@@ -1,3 +1,7 @@
+try:
+  import numpy
+except ImportError:
+  numpy = None
 
 class TIris ( object ):
   def __init__ ( self ):
@@ -35,3 +39,34 @@ class TIris ( object ):
     
     return OutputValues
 
+  # Vectorised form of Recall for an N x 4 array of samples (requires numpy).
+  # The per-input accumulation order of Recall is kept so that every output
+  # is bit-for-bit identical to calling Recall on each row. Returns the N x 3
+  # output array and the N winning evolving node indices.
+  def RecallBatch ( self, InputMatrix ):
+    if numpy is None:
+      raise ImportError ( "RecallBatch requires numpy" )
+    Inputs = numpy.asarray ( InputMatrix, dtype = numpy.float64 )
+    if Inputs.ndim != 2 or Inputs.shape [ 1 ] != self.InputNodes:
+      raise ValueError ( "RecallBatch expects an N x %d array" % self.InputNodes )
+    Weights = numpy.asarray ( self.I2EW, dtype = numpy.float64 )
+    OutWeights = numpy.asarray ( self.E2OW, dtype = numpy.float64 )
+
+    CurrDiff = numpy.zeros ( ( Inputs.shape [ 0 ], self.EvolvingNodes ) )
+    CurrSum = numpy.zeros ( ( Inputs.shape [ 0 ], self.EvolvingNodes ) )
+    for CurrInput in range ( 0, self.InputNodes ):
+      Column = Inputs [ :, CurrInput, None ]
+      Row = Weights [ None, :, CurrInput ]
+      CurrDiff = CurrDiff + numpy.abs ( Column - Row )
+      CurrSum = ( CurrSum + Column ) + Row
+    Activation = numpy.minimum ( 1.0 - CurrDiff / CurrSum, 1.0 )
+
+    # Recall only accepts a node whose activation is strictly greater than the
+    # running maximum (starting at 0.0), so non-positive and NaN activations
+    # never win and ties go to the lowest node index, as with argmax.
+    Activation = numpy.where ( Activation > 0.0, Activation, 0.0 )
+    Winners = numpy.argmax ( Activation, axis = 1 )
+    MaxActivation = Activation [ numpy.arange ( Inputs.shape [ 0 ] ), Winners ]
+
+    OutputValues = numpy.minimum ( MaxActivation [ :, None ] * OutWeights [ Winners ], 1.0 )
+    return OutputValues, Winners
@@ -0,0 +1,126 @@
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+try:
+  from TCompiledIris import TCompiledIris
+except ImportError:
+  from IrisANN.TCompiledIris import TCompiledIris
+
+# Compact binary model files.
+#
+# A model file holds the weights of a network, the precomputed prototype row
+# sums, and the name and range of every input. It is memory-mapped read-only
+# when loaded and the model is built directly on views of the mapping, so
+# loading does not copy or parse the weights: start-up time does not depend
+# on the size of the network, and every process serving the same file shares
+# one physical copy of it through the page cache.
+#
+# Layout (all integers and floats little-endian):
+#
+#   header   8s magic "IRISANN1", then uint32 version, InputNodes,
+#            EvolvingNodes, OutputNodes and the byte length of the names
+#   names    the input names, UTF-8, separated by NUL bytes, zero padded so
+#            the floats start at a multiple of 8 bytes
+#   float64  Ranges   InputNodes x ( min, max )
+#            I2EW     EvolvingNodes x InputNodes, row-major
+#            E2OW     EvolvingNodes x OutputNodes, row-major
+#            RowSums  EvolvingNodes
+
+MAGIC = b"IRISANN1"
+VERSION = 1
+HEADER = struct.Struct ( "<8sIIIII" )
+
+def Align ( Offset ):
+  return ( Offset + 7 ) // 8 * 8
+
+def SaveModel ( FileName, I2EW, E2OW, Ranges ):
+  # Ranges maps every input name, in input order, to its ( min, max ) range.
+  # The row sums are computed by TCompiledIris so they are bit-identical to
+  # those of a model compiled from the same weights.
+  Model = TCompiledIris ( I2EW, E2OW, Ranges = Ranges )
+  Names = "\0".join ( Model.Ranges ).encode ( "utf-8" )
+  Floats = array ( "d", [ Bound for Range in Model.Ranges.values ( ) for Bound in Range ] )
+  Floats.extend ( Model.I2EW )
+  Floats.extend ( Model.E2OW )
+  Floats.extend ( Model.RowSums )
+  if sys.byteorder != "little":
+    Floats.byteswap ( )
+
+  Header = HEADER.pack ( MAGIC, VERSION, Model.InputNodes, Model.EvolvingNodes, Model.OutputNodes, len ( Names ) )
+  Padding = bytes ( Align ( len ( Header ) + len ( Names ) ) - len ( Header ) - len ( Names ) )
+  # the file may be mapped by a running server, whose weights would change
+  # or fault (SIGBUS past a shorter end) if it were rewritten in place: the
+  # model is written to a new file that then atomically replaces the old one,
+  # leaving the old mapping on the old, unlinked inode
+  Directory = os.path.dirname ( os.path.abspath ( FileName ) )
+  Handle, TempName = tempfile.mkstemp ( dir = Directory, prefix = ".", suffix = ".tmp" )
+  try:
+    with os.fdopen ( Handle, "wb" ) as ModelFile:
+      ModelFile.write ( Header + Names + Padding )
+      ModelFile.write ( Floats.tobytes ( ) )
+      ModelFile.flush ( )
+      os.fsync ( ModelFile.fileno ( ) )
+    os.chmod ( TempName, 0o666 & ~CurrentUmask ( ) )
+    os.replace ( TempName, FileName )
+  except BaseException:
+    try:
+      os.unlink ( TempName )
+    except OSError:
+      pass
+    raise
+
+def CurrentUmask ( ):
+  # mkstemp creates the file readable by its owner only; a model file gets
+  # the permissions open ( ) would have given it
+  Mask = os.umask ( 0 )
+  os.umask ( Mask )
+  return Mask
+
+def LoadModel ( FileName, Search = "linear", Copy = False ):
+  # returns a TCompiledIris whose weights are views of the read-only mapping
+  # of the file; Ranges holds the input ranges stored in the file. With Copy
+  # the file is read into memory instead, so the model does not depend on the
+  # file once loaded: a file that may be rewritten in place while it is served
+  # must be loaded this way
+  with open ( FileName, "rb" ) as ModelFile:
+    if Copy:
+      Mapping = ModelFile.read ( )
+    else:
+      Mapping = mmap.mmap ( ModelFile.fileno ( ), 0, access = mmap.ACCESS_READ )
+  if len ( Mapping ) < HEADER.size:
+    raise ValueError ( "%s is not a model file" % FileName )
+  Magic, Version, InputNodes, EvolvingNodes, OutputNodes, NamesLength = HEADER.unpack_from ( Mapping, 0 )
+  if Magic != MAGIC:
+    raise ValueError ( "%s is not a model file" % FileName )
+  if Version != VERSION:
+    raise ValueError ( "%s has unsupported version %d" % ( FileName, Version ) )
+
+  Start = Align ( HEADER.size + NamesLength )
+  Counts = [ InputNodes * 2, EvolvingNodes * InputNodes, EvolvingNodes * OutputNodes, EvolvingNodes ]
+  if len ( Mapping ) != Start + 8 * sum ( Counts ):
+    raise ValueError ( "%s is truncated or has trailing data" % FileName )
+  Names = Mapping [ HEADER.size : HEADER.size + NamesLength ].decode ( "utf-8" ).split ( "\0" )
+  if len ( Names ) != InputNodes:
+    raise ValueError ( "%s has %d input names for %d inputs" % ( FileName, len ( Names ), InputNodes ) )
+
+  Floats = memoryview ( Mapping ) [ Start : ]
+  if sys.byteorder == "little":
+    Floats = Floats.cast ( "d" )
+  else:
+    # a big-endian host cannot use the mapping in place
+    Swapped = array ( "d", bytes ( Floats ) )
+    Swapped.byteswap ( )
+    Floats = memoryview ( Swapped ).toreadonly ( )
+
+  Views = []
+  Offset = 0
+  for Count in Counts:
+    Views.append ( Floats [ Offset : Offset + Count ] )
+    Offset = Offset + Count
+  RangeValues, I2EW, E2OW, RowSums = Views
+  Ranges = [ ( Names [ CurrInput ], ( RangeValues [ 2 * CurrInput ], RangeValues [ 2 * CurrInput + 1 ] ) ) for CurrInput in range ( 0, InputNodes ) ]
+  return TCompiledIris.FromBuffers ( InputNodes, OutputNodes, I2EW, E2OW, RowSums, Search, Ranges )
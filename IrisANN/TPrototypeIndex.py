@@ -0,0 +1,108 @@
+from heapq import heappop, heappush
+
+# Exact winner search over the evolving node prototypes of a compiled network.
+#
+# The prototypes are organised in a k-d tree. Every tree node keeps the
+# bounding box of its prototypes and the largest prototype row sum, which
+# bounds the activation 1 - sum|x-w| / (sum(x) + sum(w)) of every prototype
+# below it: the distance to a prototype is at least the distance to the box,
+# and its row sum is at most the largest one. The tree is searched best bound
+# first, and subtrees whose bound is below the best activation found so far
+# are skipped.
+#
+# The search returns exactly the winner of the linear scan in
+# TCompiledIris.Recall. Candidates are evaluated with the same floating point
+# expression, and the bounds are computed with the same operations on values
+# that are never closer, so rounding can only make a bound larger, never
+# smaller than the activation it bounds. Ties are resolved like the linear
+# scan: the lowest node index with the highest strictly positive activation
+# wins, and node 0 with activation 0.0 when no activation is positive.
+class TPrototypeIndex ( object ):
+  __slots__ = ( "InputNodes", "Lower", "Upper", "MaxSums", "Children", "Members" )
+
+  def __init__ ( self, Weights, RowSums, InputNodes, LeafSize = 16 ):
+    # Weights is the flat, row-major I2EW buffer and RowSums the sum of every
+    # row, as stored by TCompiledIris
+    self.InputNodes = InputNodes
+    self.Lower = []
+    self.Upper = []
+    self.MaxSums = []
+    self.Children = []
+    self.Members = []
+    Prototypes = []
+    for CurrEvol in range ( 0, len ( RowSums ) ):
+      Row = tuple ( Weights [ CurrEvol * InputNodes : ( CurrEvol + 1 ) * InputNodes ] )
+      Prototypes.append ( ( CurrEvol, Row, RowSums [ CurrEvol ] ) )
+    self.__Build ( Prototypes, max ( LeafSize, 1 ) )
+
+  def __Build ( self, Prototypes, LeafSize ):
+    # append the tree node holding Prototypes, then its children, and return
+    # the index of the node
+    Node = len ( self.Lower )
+    Lower = [ min ( P [ 1 ] [ CurrInput ] for P in Prototypes ) for CurrInput in range ( 0, self.InputNodes ) ]
+    Upper = [ max ( P [ 1 ] [ CurrInput ] for P in Prototypes ) for CurrInput in range ( 0, self.InputNodes ) ]
+    self.Lower.append ( tuple ( Lower ) )
+    self.Upper.append ( tuple ( Upper ) )
+    self.MaxSums.append ( max ( P [ 2 ] for P in Prototypes ) )
+    self.Children.append ( None )
+    self.Members.append ( None )
+
+    if len ( Prototypes ) <= LeafSize:
+      # leaf members are kept in node order, so ties resolve like the scan
+      self.Members [ Node ] = sorted ( Prototypes )
+      return Node
+
+    # split at the median of the widest dimension
+    Axis = max ( range ( 0, self.InputNodes ), key = lambda CurrInput: Upper [ CurrInput ] - Lower [ CurrInput ] )
+    Prototypes = sorted ( Prototypes, key = lambda P: P [ 1 ] [ Axis ] )
+    Middle = len ( Prototypes ) // 2
+    Left = self.__Build ( Prototypes [ : Middle ], LeafSize )
+    Right = self.__Build ( Prototypes [ Middle : ], LeafSize )
+    self.Children [ Node ] = ( Left, Right )
+    return Node
+
+  def __Bound ( self, Node, InputValues, InputSum ):
+    # upper bound of the activation of every prototype below Node
+    Lower = self.Lower [ Node ]
+    Upper = self.Upper [ Node ]
+    Distance = 0.0
+    for CurrInput in range ( 0, self.InputNodes ):
+      Value = InputValues [ CurrInput ]
+      if Value < Lower [ CurrInput ]:
+        Distance = Distance + abs ( Value - Lower [ CurrInput ] )
+      elif Value > Upper [ CurrInput ]:
+        Distance = Distance + abs ( Value - Upper [ CurrInput ] )
+      else:
+        Distance = Distance + 0.0
+    return 1.0 - Distance / ( InputSum + self.MaxSums [ Node ] )
+
+  def Search ( self, InputValues, InputSum ):
+    # returns ( Winner, MaxActivation ) exactly as the linear scan would
+    MaxActivation = 0.0
+    Winner = 0
+    Pending = [ ( -self.__Bound ( 0, InputValues, InputSum ), 0 ) ]
+    while Pending:
+      Bound, Node = heappop ( Pending )
+      Bound = -Bound
+      if Bound <= 0.0 or Bound < MaxActivation:
+        break
+
+      Members = self.Members [ Node ]
+      if Members is None:
+        for Child in self.Children [ Node ]:
+          ChildBound = self.__Bound ( Child, InputValues, InputSum )
+          if ChildBound > 0.0 and ChildBound >= MaxActivation:
+            heappush ( Pending, ( -ChildBound, Child ) )
+        continue
+
+      for CurrEvol, Row, RowSum in Members:
+        CurrDiff = 0.0
+        for CurrInput in range ( 0, self.InputNodes ):
+          CurrDiff = CurrDiff + abs ( InputValues [ CurrInput ] - Row [ CurrInput ] )
+        CurrActivation = 1.0 - CurrDiff / ( InputSum + RowSum )
+        if CurrActivation > 1.0:
+          CurrActivation = 1.0
+        if CurrActivation > MaxActivation or ( CurrActivation == MaxActivation and CurrActivation > 0.0 and CurrEvol < Winner ):
+          MaxActivation = CurrActivation
+          Winner = CurrEvol
+    return Winner, MaxActivation
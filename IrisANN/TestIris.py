@@ -1,39 +1,212 @@
-import string
+import argparse
+import mmap
+import os
+import struct
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import TIris
 
-TestFileName = sys.argv[1]  # name/path of the data file
+# Bulk scorer for the Iris ANN.
+#
+#   python TestIris.py data.txt                     # one line of outputs per row, as before
+#   python TestIris.py data.txt --format csv -o out.csv --workers 8 --mmap
+#   python TestIris.py data.txt --format binary -o out.bin
+#
+# The data file is never loaded as a whole: it is cut into chunks of about
+# --chunk-bytes that end on a line boundary, and the chunks are scored on a
+# pool of worker processes. At most two chunks per worker are in flight, so
+# memory stays bounded however large the file is. Results are written in
+# input order through a large write buffer. With --mmap the workers map the
+# file themselves and only receive the byte offsets of their chunk.
+#
+# Output formats, one record per non-blank input row:
+#   text    the three outputs separated by spaces (the historical format)
+#   csv     the three outputs separated by commas
+#   binary  the three outputs packed as little-endian float64 (24 bytes)
 
-# load the data file into memory for parsing
-TestFile = open(TestFileName)
-Test = TestFile.readlines()
-TestFile.close()
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+WRITE_BUFFER_BYTES = 1024 * 1024
+BINARY_RECORD = struct.Struct("<3d")
 
-# instantiate the ANN class TIris as object TheNetwork
-TheNetwork = TIris.TIris()
+# state of each worker process, set up once by InitWorker
+TheNetwork = None
+MappedFile = None
 
-# loop over the test data file one line at a time
-for CurrLine in Test:
-    # split the line into tokens
-    CurrLine = CurrLine.strip()
-    Tokens = CurrLine.split(",")
-    InputVector = []
 
-    # convert the tokens into float values
-    # and enter them into a vector
-    for CurrTok in Tokens:
-        InVal = float(CurrTok)
-        InputVector.append(InVal)
+def InitWorker(FileName=None):
+    # instantiate the ANN once per process, and map the data file if requested
+    global TheNetwork, MappedFile
+    TheNetwork = TIris.TIris()
+    if FileName is not None:
+        with open(FileName, "rb") as DataFile:
+            MappedFile = mmap.mmap(DataFile.fileno(), 0, access=mmap.ACCESS_READ)
 
-    # recall the ANN with the vector
-    Output = TheNetwork.Recall(InputVector)
 
-    # convert the output vector to a string
-    OutputString = ""
-    for CurrOut in Output:
-        OutputString = OutputString + str(CurrOut) + " "
-    OutputString = OutputString + "\n"
+def ParseChunk(Chunk):
+    # convert the comma separated rows of a chunk into input vectors,
+    # skipping blank lines
+    Inputs = []
+    for CurrLine in Chunk.splitlines():
+        Tokens = CurrLine.split(b",")
+        if len(Tokens) == 1 and not Tokens[0].strip():
+            continue
+        Inputs.append([float(CurrTok) for CurrTok in Tokens])
+    return Inputs
 
-    # write the outputs to the console
-    print(OutputString.strip())
+
+def ScoreInputs(Inputs):
+    # recall the ANN on every vector; RecallBatch is bit-for-bit identical
+    # to Recall, which is used when numpy is not installed
+    if not Inputs:
+        return []
+    try:
+        return TheNetwork.RecallBatch(Inputs)[0].tolist()
+    except ImportError:
+        return [TheNetwork.Recall(InputVector) for InputVector in Inputs]
+
+
+def FormatOutputs(Outputs, Format):
+    # convert the output vectors of a chunk into the bytes written for it
+    if Format == "binary":
+        return b"".join(BINARY_RECORD.pack(*Output) for Output in Outputs)
+    Separator = "," if Format == "csv" else " "
+    Lines = [Separator.join(map(str, Output)) for Output in Outputs]
+    if not Lines:
+        return b""
+    return ("\n".join(Lines) + "\n").encode()
+
+
+def ScoreChunk(Chunk, Format):
+    # score one chunk of raw bytes and return its formatted output
+    return FormatOutputs(ScoreInputs(ParseChunk(Chunk)), Format)
+
+
+def ScoreMappedChunk(Start, End, Format):
+    # score the chunk found at the given offsets of the worker's mapping
+    return ScoreChunk(MappedFile[Start:End], Format)
+
+
+def ReadChunks(DataFile, ChunkBytes):
+    # yield chunks of about ChunkBytes that end on a line boundary
+    while True:
+        Chunk = DataFile.read(ChunkBytes)
+        if not Chunk:
+            return
+        if not Chunk.endswith(b"\n"):
+            Chunk += DataFile.readline()
+        yield Chunk
+
+
+def MappedChunks(Mapping, ChunkBytes):
+    # yield the (start, end) offsets of chunks of about ChunkBytes that end
+    # on a line boundary, without reading the data
+    Start = 0
+    while Start < len(Mapping):
+        End = Mapping.find(b"\n", min(Start + ChunkBytes, len(Mapping)) - 1)
+        End = len(Mapping) if End < 0 else End + 1
+        yield Start, End
+        Start = End
+
+
+def ScoreFile(
+    FileName,
+    Output,
+    Format="text",
+    Workers=None,
+    ChunkBytes=DEFAULT_CHUNK_BYTES,
+    UseMmap=False,
+):
+    # score every row of the data file and write the results to the binary
+    # stream Output, in input order
+    Workers = Workers or os.cpu_count() or 1
+    if Workers == 1 or os.path.getsize(FileName) <= ChunkBytes:
+        # a single chunk is scored in this process, without a pool
+        InitWorker()
+        with open(FileName, "rb") as DataFile:
+            for Chunk in ReadChunks(DataFile, ChunkBytes):
+                Output.write(ScoreChunk(Chunk, Format))
+        return
+
+    with open(FileName, "rb") as DataFile:
+        if UseMmap:
+            Mapping = mmap.mmap(DataFile.fileno(), 0, access=mmap.ACCESS_READ)
+            Tasks = (
+                (ScoreMappedChunk, Start, End)
+                for Start, End in MappedChunks(Mapping, ChunkBytes)
+            )
+            InitArgs = (FileName,)
+        else:
+            Mapping = None
+            Tasks = ((ScoreChunk, Chunk) for Chunk in ReadChunks(DataFile, ChunkBytes))
+            InitArgs = ()
+
+        with ProcessPoolExecutor(
+            Workers, initializer=InitWorker, initargs=InitArgs
+        ) as Pool:
+            # keep a bounded window of chunks in flight and write each
+            # result as soon as all the chunks before it are written
+            Pending = deque()
+            for Function, *Arguments in Tasks:
+                Pending.append(Pool.submit(Function, *Arguments, Format))
+                if len(Pending) >= 2 * Workers:
+                    Output.write(Pending.popleft().result())
+            while Pending:
+                Output.write(Pending.popleft().result())
+
+        if Mapping is not None:
+            Mapping.close()
+
+
+def ParseArguments(Argv=None):
+    Parser = argparse.ArgumentParser(description="Score an Iris data file with the ANN")
+    Parser.add_argument(
+        "TestFileName", help="comma separated file of normalized measurements"
+    )
+    Parser.add_argument(
+        "-o", "--output", help="write the results to this file instead of the console"
+    )
+    Parser.add_argument(
+        "--format",
+        choices=["text", "csv", "binary"],
+        default="text",
+        help="output format",
+    )
+    Parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="worker processes (default: one per CPU)",
+    )
+    Parser.add_argument(
+        "--chunk-bytes",
+        type=int,
+        default=DEFAULT_CHUNK_BYTES,
+        help="approximate size of the chunks handed to the workers",
+    )
+    Parser.add_argument(
+        "--mmap", action="store_true", help="map the data file instead of reading it"
+    )
+    return Parser.parse_args(Argv)
+
+
+if __name__ == "__main__":
+    Options = ParseArguments()
+    if Options.output:
+        Output = open(Options.output, "wb", buffering=WRITE_BUFFER_BYTES)
+    else:
+        Output = open(
+            sys.stdout.fileno(), "wb", buffering=WRITE_BUFFER_BYTES, closefd=False
+        )
+    try:
+        ScoreFile(
+            Options.TestFileName,
+            Output,
+            Options.format,
+            Options.workers,
+            Options.chunk_bytes,
+            Options.mmap,
+        )
+    finally:
+        Output.close()
@@ -0,0 +1,323 @@
+"""
+This module provides an asyncio-based TCP server for the Iris classification protocol.
+Every connection is served on a single event loop instead of a dedicated thread, which keeps memory and
+context-switch costs flat when thousands of clients are connected. The command set and the responses are
+the same as those of the threaded server because both engines share server.ClientSession.
+
+Classes:
+    TransportConnection: Adapts an asyncio transport to the socket-like interface used by ClientSession.
+    AsyncClientProtocol: Feeds the bytes received on one connection into its ClientSession.
+    AsyncServer: Starts the event loop, accepts connections, and shuts the server down.
+
+Modules:
+    asyncio: Provides the event loop, transports and protocols used to serve all clients.
+    server: Provides the shared ClientSession and protocol constants.
+    cache: Provides the server-wide cache of classification results.
+    metrics: Provides the server's counters and latency histograms.
+    serverlog: Provides the non-blocking logger shared with the threaded server.
+    timeouts: Sets TCP keepalive on accepted connections.
+
+"""
+
+import asyncio
+
+from cache import ResultCache
+from metrics import Metrics
+from server import WELCOME_MESSAGE, ClientSession, loadDefaultModel
+from serverlog import log
+from timeouts import setKeepalive
+
+
+class TransportConnection:
+    """
+    Wraps an asyncio transport so ClientSession can use it like a connected socket.
+    Writes are buffered by the transport and never block the event loop.
+
+    Attributes:
+        transport (asyncio.Transport): The transport of the client connection.
+
+    Methods:
+        send(data): Queues data for sending.
+        sendall(data): Queues data for sending.
+        close(): Closes the transport once the buffered data is flushed.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def send(self, data):
+        """
+        Queues data for sending to the client.
+
+        Parameters:
+            data (bytes): The bytes to send.
+
+        Returns:
+            int: The number of bytes queued.
+        """
+        self.transport.write(data)
+        return len(data)
+
+    def sendall(self, data):
+        """
+        Queues data for sending to the client.
+
+        Parameters:
+            data (bytes): The bytes to send.
+        """
+        self.transport.write(data)
+
+    def close(self):
+        """
+        Closes the transport after any buffered data has been sent.
+        """
+        self.transport.close()
+
+
+class AsyncClientProtocol(asyncio.Protocol):
+    """
+    Serves one client connection on the event loop.
+
+    Attributes:
+        server (AsyncServer): The server that accepted the connection.
+        transport (asyncio.Transport): The transport of the connection.
+        session (ClientSession): The session state and command handlers of the client.
+
+    Methods:
+        connection_made(transport): Creates the session and greets the client.
+        data_received(data): Dispatches complete messages to the session.
+        pause_writing(): Stops reading from a client that does not read its responses.
+        resume_writing(): Resumes reading once the responses have drained.
+        connection_lost(exc): Reports the end of the connection.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.session = None
+
+    def connection_made(self, transport):
+        """
+        Creates the client session and sends the welcome message.
+
+        Parameters:
+            transport (asyncio.Transport): The transport of the new connection.
+        """
+        self.transport = transport
+        address = transport.get_extra_info("peername")
+        self.session = ClientSession(
+            TransportConnection(transport),
+            address,
+            self.server,
+            self.server.shutdownServer,
+        )
+        if self.server.keepalive is not None:
+            setKeepalive(transport.get_extra_info("socket"), *self.server.keepalive)
+        if self.server.reaper is not None:
+            self.server.reaper.track(self.session)
+        self.session.log.info("connection opened")
+        self.server.metrics.connectionOpened()
+        self.session.reply(WELCOME_MESSAGE)
+
+    def data_received(self, data):
+        """
+        Hands received data to the session, which buffers it until a message is complete.
+
+        Parameters:
+            data (bytes): The bytes received from the client.
+        """
+        if not self.session.receive(data):
+            self.transport.close()
+
+    def pause_writing(self):
+        """
+        Called when the transport's write buffer exceeds its high-water mark, typically because a streaming
+        client sends rows faster than it reads the results. Reading stops until the buffer drains, so the
+        backlog stays in the client's socket instead of the server's memory.
+        """
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        """
+        Called when the transport's write buffer has drained below its low-water mark; reading resumes.
+        """
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        """
+        Reports that the connection with the client has ended.
+
+        Parameters:
+            exc (Exception): The error that ended the connection, or None on a normal close.
+        """
+        if isinstance(exc, ConnectionResetError):
+            self.session.log.warning("disconnected unexpectedly (ConnectionResetError)")
+        if self.server.reaper is not None:
+            self.server.reaper.forget(self.session)
+        self.server.metrics.connectionClosed()
+        self.session.log.info("connection closed")
+
+
+class AsyncServer:
+    """
+    Server engine that handles every client connection on a single asyncio event loop.
+    It exposes the same start/shutdownServer/stop methods as server.Server.
+
+    Attributes:
+        host (str): The server's hostname or IP address.
+        port (int): The server's port number.
+        server_socket (asyncio.base_events.Server): The listening server, once started.
+        loop (asyncio.AbstractEventLoop): The event loop serving the clients, once started.
+        model (TCompiledIris): The immutable classification model shared by every session, swapped on reload.
+        cache (ResultCache): The classification results shared by every session.
+        metrics (Metrics): Counters and latency histograms recorded by every session.
+        listener (socket.socket): An already listening socket to accept from instead of binding one, or None.
+        reusePort (bool): Whether the bound socket sets SO_REUSEPORT, so several processes can share the port.
+        reloader (ModelReloader): Reloads the model from its file without a restart, or None.
+        reaper (ConnectionReaper): Closes connections that time out, advanced on the event loop, or None.
+        keepalive (tuple): (idle, interval, count) TCP keepalive settings of accepted connections, or None.
+        http (HttpFrontend): The HTTP/JSON frontend, served on threads of its own next to the event loop, or None.
+        batcher (LoopBatcher): Runs the classify requests of concurrent sessions in shared batches, or None.
+        profiler (Profiler): Profiles the server for a window on demand, or None if profiling is disabled.
+
+    Methods:
+        start(): Runs the event loop until the server is shut down.
+        stats(): Returns the counter groups reported by 'stats' next to the metrics.
+        requestReload(): Starts reloading the model file in the background.
+        requestProfile(kind, duration): Opens a profiling window in the background.
+        serve(): Coroutine that listens for connections until shutdown is requested.
+        reapTimeouts(): Advances the timeouts every tick of the reaper's wheel.
+        shutdownServer(): Requests the server to stop accepting connections and exit.
+        stop(): Stops the server.
+    """
+
+    def __init__(
+        self, host, port, model=None, cache=None, listener=None, reusePort=False
+    ):
+        self.host = host
+        self.port = port
+        self.server_socket = None
+        self.loop = None
+        self.stopped = None
+        self.model = model if model is not None else loadDefaultModel()
+        self.cache = cache if cache is not None else ResultCache()
+        self.metrics = Metrics()
+        self.listener = listener
+        self.reusePort = reusePort
+        self.reloader = None
+        self.reaper = None
+        self.keepalive = None
+        self.http = None
+        self.batcher = None
+        self.profiler = None
+
+    def start(self):
+        """
+        Starts the server and blocks until it has been shut down.
+        """
+        asyncio.run(self.serve())
+        log.info("server has been shut down")
+
+    async def serve(self):
+        """
+        Binds the host and port and serves connections until shutdown is requested.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        if self.listener is not None:
+            self.server_socket = await self.loop.create_server(
+                lambda: AsyncClientProtocol(self), sock=self.listener
+            )
+        else:
+            self.server_socket = await self.loop.create_server(
+                lambda: AsyncClientProtocol(self),
+                self.host,
+                self.port,
+                reuse_address=True,
+                reuse_port=self.reusePort or None,
+            )
+        log.info(
+            "server started on %s:%s (asyncio), waiting for connections",
+            self.host,
+            self.port,
+        )
+        if self.reaper is not None:
+            self.reapTimeouts()
+        try:
+            await self.stopped.wait()
+        finally:
+            self.server_socket.close()
+
+    def reapTimeouts(self):
+        """
+        Closes the sessions that timed out and schedules the next call one wheel tick later. Running on the
+        event loop, it needs no thread and never races with the sessions it closes.
+        """
+        self.reaper.reap()
+        if not self.stopped.is_set():
+            self.loop.call_later(self.reaper.wheel.tick, self.reapTimeouts)
+
+    def stats(self):
+        """
+        Returns the counter groups reported by 'stats' next to the metrics.
+
+        Returns:
+            dict: The result cache counters and, when present, the model reload, timeout, batching and
+            profiling counters.
+        """
+        groups = {"cache": self.cache.stats()}
+        if self.reloader is not None:
+            groups["model"] = self.reloader.stats()
+        if self.reaper is not None:
+            groups["timeouts"] = self.reaper.stats()
+        if self.batcher is not None:
+            groups["batching"] = self.batcher.stats()
+        if self.profiler is not None:
+            groups["profiling"] = self.profiler.stats()
+        return groups
+
+    def requestReload(self):
+        """
+        Starts reloading the model file in the background, off the event loop.
+
+        Returns:
+            bool: Whether a reload was started (False if one is running), or None without a model file.
+        """
+        if self.reloader is None:
+            return None
+        return self.reloader.request()
+
+    def requestProfile(self, kind, duration=None):
+        """
+        Opens a CPU profiling or allocation tracing window, sampled and traced off the event loop.
+
+        Parameters:
+            kind (str): "cpu", "memory", or "all" for both.
+            duration (float): Length of the window in seconds, or None for the configured length.
+
+        Returns:
+            list: The report files of the windows opened (empty if they are all open already), or None if
+            profiling is disabled.
+        """
+        if self.profiler is None:
+            return None
+        return self.profiler.start(kind, duration)
+
+    def shutdownServer(self):
+        """
+        Initiates server shutdown by closing the listening socket and leaving the event loop.
+        """
+        log.info("shutting down the server")
+        self.stop()
+
+    def stop(self):
+        """
+        Stops the server. Safe to call from any thread, and after the event loop has finished.
+        """
+        if self.reloader is not None:
+            self.reloader.stop()
+        if self.http is not None:
+            self.http.stop()
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
@@ -0,0 +1,293 @@
+"""
+Cross-connection micro-batching of classify requests.
+
+When many clients send 'classify' at about the same time, running one scalar Recall per request wastes most of
+the time on per-call overhead. A batcher gathers the requests that miss the result cache, from every session,
+for at most a short window or until a batch is full, runs them as one vectorized recall, caches the results,
+and hands each one back to the session that asked for it. No request waits longer than the window plus the
+recall of its batch. The window is only waited for while there is concurrent traffic to gather, i.e. while
+batches hold several requests: a request that finds the batcher idle runs at once, with the scalar Recall, so
+an idle server or a single client gets the latency it would get without batching.
+
+Classes:
+    Batch: The classify requests gathered for one recall.
+    Batcher: Counters and batch execution shared by both engines.
+    ThreadBatcher: Batcher for the threaded server; the first request of a batch waits for the others and runs it.
+    LoopBatcher: Batcher for the asyncio server; a timer on the event loop runs every batch.
+
+Modules:
+    asyncio: Schedules the batches of the asyncio server on its event loop.
+    threading: Lets the threads of the threaded server wait for the batch holding their request.
+    time: Measures the batching window.
+    server: Runs a model on several input vectors at once.
+    serverlog: Reports a batch that failed.
+
+Constants:
+    DEFAULT_WINDOW (float): Default seconds a batch stays open for more requests.
+    DEFAULT_MAX_BATCH (int): Default largest number of requests run in one recall.
+
+"""
+
+import asyncio
+import threading
+import time
+
+from server import recallVectors
+from serverlog import log
+
+# Below a millisecond the window adds less latency than a network round trip
+DEFAULT_WINDOW = 200e-6
+
+# Large enough for the vectorized recall to pay off, small enough to keep a batch's recall short
+DEFAULT_MAX_BATCH = 64
+
+
+class Batch:
+    """
+    The classify requests gathered for one recall, all for the same model.
+
+    Attributes:
+        model (TCompiledIris): The model the requests are run with.
+        vectors (list): The normalized input vector of every request.
+        keys (list): The result cache key of every request.
+        callbacks (list): The function receiving the outputs of every request (LoopBatcher only).
+        outputs (list): The outputs of every request once run, or None if the recall failed.
+        done (threading.Event): Set once the batch has run (ThreadBatcher), or True (LoopBatcher).
+        timer (asyncio.TimerHandle): Runs the batch at the end of its window (LoopBatcher only).
+    """
+
+    __slots__ = ("model", "vectors", "keys", "callbacks", "outputs", "done", "timer")
+
+    def __init__(self, model):
+        self.model = model
+        self.vectors = []
+        self.keys = []
+        self.callbacks = []
+        self.outputs = None
+        self.done = None
+        self.timer = None
+
+
+class Batcher:
+    """
+    Counters and batch execution shared by the batchers of both engines.
+
+    Attributes:
+        window (float): Seconds a batch stays open for more requests after its first one.
+        maxSize (int): Largest number of requests run in one recall.
+        cache (ResultCache): The server's result cache, consulted before and filled after every recall.
+        metrics (Metrics): The server's instrumentation, recording the recall of every batch.
+        current (Batch): The batch open for more requests, or None.
+        running (int): Number of batches being run (ThreadBatcher only).
+        lastSize (int): Number of requests of the last batch run; above one, new batches wait for the window.
+        batches (int): Number of batches run.
+        requests (int): Number of requests run in batches.
+        largest (int): Number of requests of the largest batch run.
+
+    Methods:
+        run(batch): Runs a batch and caches its results.
+        count(batch): Adds a batch that has run to the counters.
+        stats(): Returns the batching counters.
+    """
+
+    def __init__(
+        self, cache, metrics, window=DEFAULT_WINDOW, maxSize=DEFAULT_MAX_BATCH
+    ):
+        self.window = window
+        self.maxSize = maxSize
+        self.cache = cache
+        self.metrics = metrics
+        self.current = None
+        self.running = 0
+        self.lastSize = 0
+        self.batches = 0
+        self.requests = 0
+        self.largest = 0
+
+    def run(self, batch):
+        """
+        Runs every request of a batch in one recall and caches the results.
+
+        Parameters:
+            batch (Batch): The closed batch.
+        """
+        try:
+            batch.outputs = recallVectors(batch.model, batch.vectors, self.metrics)
+        except Exception as err:
+            log.error(
+                "batched recall of %d requests failed: %s", len(batch.vectors), err
+            )
+            return
+        for key, outputs in zip(batch.keys, batch.outputs):
+            self.cache.store(batch.model, key, outputs)
+
+    def count(self, batch):
+        """
+        Adds a batch that has run to the counters.
+
+        Parameters:
+            batch (Batch): The batch.
+        """
+        self.batches += 1
+        self.requests += len(batch.vectors)
+        self.largest = max(self.largest, len(batch.vectors))
+        self.lastSize = len(batch.vectors)
+
+    def stats(self):
+        """
+        Returns the batching counters reported by 'stats'.
+
+        Returns:
+            dict: Batches and requests run, the largest batch, and the configured limits.
+        """
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "largest": self.largest,
+            "window_us": round(self.window * 1e6),
+            "max_size": self.maxSize,
+        }
+
+
+class ThreadBatcher(Batcher):
+    """
+    Batcher for the threaded server, where every session blocks in its own thread. The first request of a
+    batch is its leader: it waits for more requests until the window ends or the batch fills up, then runs
+    the batch on its own thread and wakes the other requests, which only wait. While one batch runs, the
+    next one is already gathering requests under a new leader. A request that finds no batch open, none
+    running, and the last batch run alone has no one to wait for, and runs alone at once.
+
+    Attributes:
+        lock (threading.Lock): Guards the open batch and the counters.
+        full (threading.Condition): Wakes a leader whose batch has filled up.
+
+    Methods:
+        submit(model, vector, callback): Classifies a vector, waiting for its batch, and calls back.
+    """
+
+    def __init__(
+        self, cache, metrics, window=DEFAULT_WINDOW, maxSize=DEFAULT_MAX_BATCH
+    ):
+        super().__init__(cache, metrics, window, maxSize)
+        self.lock = threading.Lock()
+        self.full = threading.Condition(self.lock)
+
+    def submit(self, model, vector, callback):
+        """
+        Classifies a normalized input vector, from the cache or in a batch, and calls back with its outputs
+        before returning.
+
+        Parameters:
+            model (TCompiledIris): The model to run.
+            vector (list): The normalized input values.
+            callback (function): Receives the outputs, or None if the recall failed.
+        """
+        key, outputs = self.cache.lookup(model, vector)
+        if outputs is not None:
+            callback(outputs)
+            return
+        with self.lock:
+            batch = self.current
+            leader = batch is None or batch.model is not model
+            if leader:
+                idle = batch is None and self.running == 0 and self.lastSize <= 1
+                batch = Batch(model)
+                batch.done = threading.Event()
+                # An idle batcher runs the request at once; otherwise the batch stays open for the window.
+                # A reload leaves the open batch of the previous model to its own leader
+                if not idle:
+                    self.current = batch
+            index = len(batch.vectors)
+            batch.vectors.append(vector)
+            batch.keys.append(key)
+            if len(batch.vectors) >= self.maxSize:
+                if self.current is batch:
+                    self.current = None
+                self.full.notify_all()
+            elif leader and self.current is batch:
+                deadline = time.monotonic() + self.window
+                while self.current is batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.current = None
+                        break
+                    self.full.wait(remaining)
+            if leader:
+                self.running += 1
+        if leader:
+            # The followers wait for done whatever happens to the recall
+            try:
+                self.run(batch)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.count(batch)
+                batch.done.set()
+        else:
+            batch.done.wait()
+        callback(None if batch.outputs is None else batch.outputs[index])
+
+
+class LoopBatcher(Batcher):
+    """
+    Batcher for the asyncio server, where every session runs on the event loop and must not block. A batch
+    opens with a timer for the window; it runs when the timer fires, or on the next loop iteration once it
+    is full, and calls every request back on the loop. Batches run on the loop itself, so none is ever
+    running when a request arrives: the batcher counts as idle after a batch of a single request, and the
+    next batch then runs on the next loop iteration with the requests received by the same wake-up of the
+    loop, instead of waiting for the window.
+
+    Methods:
+        submit(model, vector, callback): Classifies a vector and calls back, now on a cache hit, else once its batch has run.
+        flush(batch): Runs a batch and calls its requests back.
+    """
+
+    def submit(self, model, vector, callback):
+        """
+        Classifies a normalized input vector. A cache hit calls back before returning; otherwise the request
+        joins the open batch and is called back from the event loop once the batch has run.
+
+        Parameters:
+            model (TCompiledIris): The model to run.
+            vector (list): The normalized input values.
+            callback (function): Receives the outputs, or None if the recall failed.
+        """
+        key, outputs = self.cache.lookup(model, vector)
+        if outputs is not None:
+            callback(outputs)
+            return
+        loop = asyncio.get_running_loop()
+        batch = self.current
+        if batch is None or batch.model is not model:
+            if batch is not None:
+                batch.timer.cancel()
+                loop.call_soon(self.flush, batch)
+            batch = self.current = Batch(model)
+            delay = self.window if self.lastSize > 1 else 0
+            batch.timer = loop.call_later(delay, self.flush, batch)
+        batch.vectors.append(vector)
+        batch.keys.append(key)
+        batch.callbacks.append(callback)
+        if len(batch.vectors) >= self.maxSize:
+            self.current = None
+            batch.timer.cancel()
+            loop.call_soon(self.flush, batch)
+
+    def flush(self, batch):
+        """
+        Runs a batch, unless it has run already, and calls every request back with its outputs.
+
+        Parameters:
+            batch (Batch): The batch.
+        """
+        if batch.done:
+            return
+        batch.done = True
+        if self.current is batch:
+            self.current = None
+        try:
+            self.run(batch)
+        finally:
+            self.count(batch)
+            for index, callback in enumerate(batch.callbacks):
+                callback(None if batch.outputs is None else batch.outputs[index])
@@ -0,0 +1,307 @@
+"""
+Concurrency benchmark comparing the threaded and asyncio server engines.
+
+For every engine and client count, the benchmark starts server.py in a subprocess, connects all simulated
+clients, and once every client is connected has each of them run the command sequence
+input x4, classify, return class a number of times. It reports connection errors, the sequence rate,
+latency percentiles, and the peak resident memory and thread count of the server process.
+
+Usage:
+    python benchmarks/concurrency.py --clients 100,1000,3000 --rounds 5
+    python benchmarks/concurrency.py --server-args "--cache-size 0 --batch-window 200"
+
+Functions:
+    runClient(host, port, ready, go, rounds, latencies): Coroutine simulating one client.
+    runLoad(host, port, clients, rounds): Coroutine driving all clients against one server.
+    benchmarkEngine(mode, clients, rounds, port, serverArgs): Measures one engine at one client count.
+    main(): Parses the options, runs every combination, and prints a table.
+
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One typical flower, sent as the four 'input' commands of every sequence
+SAMPLE = [
+    ("sepallength", 5.1),
+    ("sepalwidth", 3.5),
+    ("petallength", 1.4),
+    ("petalwidth", 0.2),
+]
+
+
+def raiseFileLimit():
+    """
+    Raises the open file limit to its hard maximum so thousands of sockets can be opened.
+    The server subprocesses inherit the raised limit.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def waitForPort(host, port, timeout=10.0):
+    """
+    Waits until the server accepts connections.
+
+    Parameters:
+        host (str): The server address.
+        port (int): The server port.
+        timeout (float): Seconds to wait before giving up.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1.0) as probe:
+                probe.recv(1024)
+                probe.send(b"quit")
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server did not start on {host}:{port}")
+
+
+def readProcessStatus(pid):
+    """
+    Reads the resident memory and thread count of a process from /proc.
+
+    Parameters:
+        pid (int): The process id.
+
+    Returns:
+        tuple: (resident memory in KiB, number of threads), or (0, 0) if unavailable.
+    """
+    rss = threads = 0
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, threads
+
+
+async def runClient(host, port, ready, go, rounds, latencies, limit):
+    """
+    Simulates one client: connects, waits for every other client, then runs the command sequence.
+
+    Parameters:
+        host (str): The server address.
+        port (int): The server port.
+        ready (list): Receives one entry per connected client.
+        go (asyncio.Event): Set once all clients are connected.
+        rounds (int): Number of command sequences to run.
+        latencies (list): Receives the duration of every sequence, in seconds.
+        limit (asyncio.Semaphore): Bounds the number of simultaneous connection attempts.
+
+    Returns:
+        bool: True if the client completed all its sequences.
+    """
+    async with limit:
+        reader, writer = await asyncio.open_connection(host, port)
+        await reader.read(1024)
+    ready.append(True)
+    await go.wait()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for name, value in SAMPLE:
+                writer.write(f"input {name} {value}".encode())
+                await reader.read(1024)
+            writer.write(b"classify")
+            await reader.read(1024)
+            writer.write(b"return class")
+            reply = await reader.read(1024)
+            latencies.append(time.perf_counter() - started)
+            if not reply.startswith(b"Classification"):
+                return False
+        writer.write(b"quit")
+        await reader.read(1024)
+        return True
+    finally:
+        writer.close()
+
+
+async def runLoad(host, port, clients, rounds):
+    """
+    Connects all clients, releases them at the same time, and waits for them to finish.
+
+    Parameters:
+        host (str): The server address.
+        port (int): The server port.
+        clients (int): Number of concurrent clients.
+        rounds (int): Number of command sequences per client.
+
+    Returns:
+        tuple: (number of failed clients, list of sequence latencies, elapsed seconds).
+    """
+    ready = []
+    latencies = []
+    go = asyncio.Event()
+    limit = asyncio.Semaphore(64)
+    tasks = [
+        asyncio.create_task(runClient(host, port, ready, go, rounds, latencies, limit))
+        for _ in range(clients)
+    ]
+    while len(ready) < clients and not all(task.done() for task in tasks):
+        if any(task.done() and task.exception() for task in tasks):
+            break
+        await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    go.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for result in results if result is not True)
+    return failed, latencies, elapsed
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at the given fraction of a sorted list.
+
+    Parameters:
+        values (list): Sorted values.
+        fraction (float): Position between 0 and 1.
+
+    Returns:
+        float: The percentile value, or 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def benchmarkEngine(mode, clients, rounds, port, serverArgs=()):
+    """
+    Starts the server with one engine and measures it under the given number of clients.
+
+    Parameters:
+        mode (str): 'threaded' or 'asyncio'.
+        clients (int): Number of concurrent clients.
+        rounds (int): Number of command sequences per client.
+        port (int): Port the server listens on.
+        serverArgs (list): Additional command-line options of the server.
+
+    Returns:
+        dict: The measurements of the run.
+    """
+    host = "127.0.0.1"
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "server.py",
+            "--host",
+            host,
+            "--port",
+            str(port),
+            "--mode",
+            mode,
+        ]
+        + list(serverArgs),
+        cwd=REPOSITORY,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    peak = {"rss": 0, "threads": 0}
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.is_set():
+            rss, threads = readProcessStatus(process.pid)
+            peak["rss"] = max(peak["rss"], rss)
+            peak["threads"] = max(peak["threads"], threads)
+            sampling.wait(0.05)
+
+    try:
+        waitForPort(host, port)
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        failed, latencies, elapsed = asyncio.run(runLoad(host, port, clients, rounds))
+        sampling.set()
+        sampler.join()
+        with socket.create_connection((host, port), timeout=5.0) as admin:
+            admin.recv(1024)
+            admin.send(b"shutdown")
+            admin.recv(1024)
+    finally:
+        sampling.set()
+        try:
+            process.wait(timeout=5.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "clients": clients,
+        "failed": failed,
+        "sequences_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mib": peak["rss"] / 1024,
+        "peak_threads": peak["threads"],
+    }
+
+
+def main():
+    """
+    Parses the command-line options, benchmarks every engine at every client count, and prints the results.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compare the threaded and asyncio server engines"
+    )
+    parser.add_argument(
+        "--clients", default="100,1000", help="comma separated client counts"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=5, help="command sequences per client"
+    )
+    parser.add_argument(
+        "--modes", default="threaded,asyncio", help="engines to compare"
+    )
+    parser.add_argument(
+        "--port", type=int, default=6991, help="port used by the server"
+    )
+    parser.add_argument(
+        "--server-args", default="", help="additional options passed to server.py"
+    )
+    options = parser.parse_args()
+
+    raiseFileLimit()
+    print(
+        f"{'mode':<10}{'clients':>8}{'failed':>8}{'seq/s':>10}"
+        f"{'p50 ms':>10}{'p99 ms':>10}{'RSS MiB':>10}{'threads':>9}"
+    )
+    for clients in [int(count) for count in options.clients.split(",")]:
+        for mode in options.modes.split(","):
+            result = benchmarkEngine(
+                mode,
+                clients,
+                options.rounds,
+                options.port,
+                shlex.split(options.server_args),
+            )
+            print(
+                f"{result['mode']:<10}{result['clients']:>8}{result['failed']:>8}"
+                f"{result['sequences_per_s']:>10.0f}{result['p50_ms']:>10.2f}"
+                f"{result['p99_ms']:>10.2f}{result['peak_rss_mib']:>10.1f}"
+                f"{result['peak_threads']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark of the decision table: accuracy, memory and speed against exact recall of the compiled network.
+
+Builds TDecisionTable approximations of the built-in Iris network at several resolutions and refinement factors,
+and reports for each the build time, memory, output deviation and class mismatch rate on random inputs, and the
+microseconds per Recall of the table and of the compiled network.
+
+Usage:
+    python benchmarks/decision_table.py --tables 8,16,16x2,24,32 --output table.json
+
+Functions:
+    parseTable(spec): Parses a RESOLUTION or RESOLUTIONxREFINE table specification.
+    timeRecall(model, queries): Times Recall over the queries.
+    benchmarkTable(model, resolution, refine, queries, samples): Builds, measures and times one table.
+    main(): Parses the options, runs the benchmark, and prints or writes the results.
+
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from IrisANN.TCompiledIris import TCompiledIris  # noqa: E402
+from IrisANN.TDecisionTable import TDecisionTable  # noqa: E402
+from IrisANN.TIris import TIris  # noqa: E402
+
+
+def parseTable(spec):
+    """
+    Parses a table specification.
+
+    Parameters:
+        spec (str): RESOLUTION, or RESOLUTIONxREFINE for a table refined along class boundaries.
+
+    Returns:
+        tuple: (resolution, refine).
+    """
+    resolution, _, refine = spec.partition("x")
+    return int(resolution), int(refine or 0)
+
+
+def timeRecall(model, queries):
+    """
+    Times Recall over the queries, one at a time.
+
+    Parameters:
+        model (TCompiledIris or TDecisionTable): The model to time.
+        queries (list): Query vectors.
+
+    Returns:
+        float: Microseconds per query.
+    """
+    recall = model.Recall
+    started = time.perf_counter()
+    for query in queries:
+        recall(query)
+    return (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def benchmarkTable(model, resolution, refine, queries, samples):
+    """
+    Builds one decision table of the model, measures its deviation and memory, and times it.
+
+    Parameters:
+        model (TCompiledIris): The exact model.
+        resolution (int): Cells per input.
+        refine (int): Sub-cells per input of the cells next to a class boundary, or 0.
+        queries (list): Query vectors to time.
+        samples (int): Random inputs the deviation is measured on.
+
+    Returns:
+        dict: Build time, memory, deviations, mismatch rate, and microseconds per query of the table and the model.
+    """
+    started = time.perf_counter()
+    table = TDecisionTable(model, resolution, refine)
+    build = time.perf_counter() - started
+    maxDeviation, meanDeviation, mismatches = table.Deviation(samples)
+    tableTime = timeRecall(table, queries)
+    modelTime = timeRecall(model, queries)
+    return {
+        "resolution": resolution,
+        "refine": refine,
+        "refined_cells": table.RefinedCells,
+        "build_s": build,
+        "memory_kib": table.MemoryBytes() / 1024,
+        "max_deviation": maxDeviation,
+        "mean_deviation": meanDeviation,
+        "mismatch_rate": mismatches,
+        "table_us": tableTime,
+        "model_us": modelTime,
+        "speedup": modelTime / tableTime if tableTime else 0.0,
+    }
+
+
+def main():
+    """
+    Parses the command-line options, runs the benchmark, and reports the results.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the decision table")
+    parser.add_argument(
+        "--tables",
+        default="8,16,16x2,24,32",
+        help="comma separated RESOLUTION or RESOLUTIONxREFINE tables to build",
+    )
+    parser.add_argument("--queries", type=int, default=20000, help="queries timed")
+    parser.add_argument(
+        "--samples", type=int, default=20000, help="inputs the deviation is measured on"
+    )
+    parser.add_argument("--seed", type=int, default=1, help="seed of the timed queries")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    options = parser.parse_args()
+
+    generator = random.Random(options.seed)
+    queries = [[generator.random() for _ in range(4)] for _ in range(options.queries)]
+    model = TCompiledIris.FromModel(TIris())
+    results = [
+        benchmarkTable(model, resolution, refine, queries, options.samples)
+        for resolution, refine in map(parseTable, options.tables.split(","))
+    ]
+
+    print(
+        f"{'table':>7}{'build s':>9}{'KiB':>9}{'mean dev':>10}{'mismatch':>10}"
+        f"{'table us':>10}{'model us':>10}{'speedup':>9}"
+    )
+    for result in results:
+        name = f"{result['resolution']}x{result['refine']}"
+        print(
+            f"{name:>7}{result['build_s']:>9.2f}{result['memory_kib']:>9.0f}"
+            f"{result['mean_deviation']:>10.4f}{result['mismatch_rate']:>10.2%}"
+            f"{result['table_us']:>10.2f}{result['model_us']:>10.2f}{result['speedup']:>9.1f}"
+        )
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark of the text receive path: the memory allocated and the time taken per command.
+
+Feeds the commands of a classification sequence (four 'input' commands, 'classify', 'return class' and 'clear')
+through a BlockingSession over a local socket pair, receiving each one exactly as BlockingSession.serve does, in
+this thread. For every command it reports the peak of the memory allocated while the command is received and
+dispatched, as traced by tracemalloc, and the microseconds per command without tracing.
+
+Usage:
+    python benchmarks/dispatch.py --iterations 2000 --output dispatch.json
+
+Functions:
+    serveCommand(session, client, buffer, command): Sends one command and serves it like BlockingSession.serve.
+    measureAllocations(session, client, buffer, rounds): Peak bytes allocated per command.
+    measureTime(session, client, buffer, iterations): Microseconds per command.
+    main(): Parses the options, runs the benchmark, and prints or writes the results.
+
+"""
+
+import argparse
+import gc
+import json
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from server import BlockingSession, Server, receiveBuffer  # noqa: E402
+from serverlog import LEVELS, log  # noqa: E402
+
+# One classification sequence, as sent by a text client
+COMMANDS = [
+    b"input sepallength 5.1",
+    b"input sepalwidth 3.5",
+    b"input petallength 1.4",
+    b"input petalwidth 0.2",
+    b"classify",
+    b"return class",
+    b"clear",
+]
+
+
+def serveCommand(session, client, buffer, command):
+    """
+    Sends one command from the client side and serves it like BlockingSession.serve, then reads the reply.
+
+    Parameters:
+        session (BlockingSession): The session on the server side of the socket pair.
+        client (socket.socket): The client side of the socket pair.
+        buffer (memoryview): The receive buffer of this thread.
+        command (bytes): The command to send.
+    """
+    client.sendall(command)
+    count = session.connection.recv_into(buffer)
+    session.receive(buffer[:count])
+    client.recv(4096)
+
+
+def measureAllocations(session, client, buffer, rounds):
+    """
+    Measures the peak memory allocated while each command is received and dispatched.
+
+    Parameters:
+        session (BlockingSession): The session on the server side of the socket pair.
+        client (socket.socket): The client side of the socket pair.
+        buffer (memoryview): The receive buffer of this thread.
+        rounds (int): Sequences measured; the largest peak of every command is kept.
+
+    Returns:
+        dict: Peak bytes allocated, by command.
+    """
+    peaks = dict.fromkeys((command.decode() for command in COMMANDS), 0)
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        for _ in range(rounds):
+            for command in COMMANDS:
+                client.sendall(command)
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                count = session.connection.recv_into(buffer)
+                session.receive(buffer[:count])
+                peak = tracemalloc.get_traced_memory()[1] - before
+                client.recv(4096)
+                name = command.decode()
+                peaks[name] = max(peaks[name], peak)
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    return peaks
+
+
+def measureTime(session, client, buffer, iterations):
+    """
+    Times the commands of the sequence, each sent, served and answered in turn.
+
+    Parameters:
+        session (BlockingSession): The session on the server side of the socket pair.
+        client (socket.socket): The client side of the socket pair.
+        buffer (memoryview): The receive buffer of this thread.
+        iterations (int): Sequences timed.
+
+    Returns:
+        float: Microseconds per command.
+    """
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for command in COMMANDS:
+            serveCommand(session, client, buffer, command)
+    return (time.perf_counter() - started) / (iterations * len(COMMANDS)) * 1e6
+
+
+def main():
+    """
+    Parses the command-line options, runs the benchmark, and reports the results.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the text receive path")
+    parser.add_argument("--iterations", type=int, default=2000, help="sequences timed")
+    parser.add_argument(
+        "--rounds", type=int, default=200, help="sequences traced for allocations"
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    options = parser.parse_args()
+    log.configure(level=LEVELS["off"])
+
+    server = Server("127.0.0.1", 0)
+    connection, client = socket.socketpair()
+    session = BlockingSession(
+        connection, ("127.0.0.1", 0), server, server.shutdownServer
+    )
+    buffer = receiveBuffer()
+    # Warm up the caches of the session, the model and the interpreter
+    for _ in range(100):
+        for command in COMMANDS:
+            serveCommand(session, client, buffer, command)
+
+    peaks = measureAllocations(session, client, buffer, options.rounds)
+    microseconds = measureTime(session, client, buffer, options.iterations)
+    connection.close()
+    client.close()
+
+    print(f"{'command':<24}{'peak bytes':>12}")
+    for command, peak in peaks.items():
+        print(f"{command:<24}{peak:>12}")
+    print(f"{'us/command':<24}{microseconds:>12.2f}")
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(
+                {"peak_bytes": peaks, "us_per_command": microseconds}, output, indent=2
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Load test for the Iris server.
+
+Starts server.py locally, drives it with N concurrent simulated clients, and reports throughput and latency
+percentiles per command. Every client replays the rows of IrisANN/iris-trn.txt through the real command
+sequence: four 'input' commands, 'classify', and 'return class'. The rows of the data file are normalized, so
+they are mapped back to original units with server.VARIABLE_RANGES before being sent. The results are
+written as JSON so runs can be compared across releases.
+
+Usage:
+    python benchmarks/loadtest.py --clients 50 --duration 10 --output results.json
+
+Functions:
+    loadRows(path): Reads the data file and converts its rows to original units.
+    runClient(...): Coroutine replaying rows on one connection until the deadline.
+    driveClients(options, rows): Coroutine running every client for the configured duration.
+    runLoadTest(options): Starts the server, runs the load, and collects the measurements.
+    summarize(latencies, elapsed): Computes the count, rate and latency percentiles of one command.
+    main(): Parses the options, runs the test, and writes the JSON report.
+
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from concurrency import percentile, raiseFileLimit, waitForPort
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from server import VARIABLE_RANGES  # noqa: E402
+
+# Commands whose latency is reported separately
+COMMANDS = ["input", "classify", "return"]
+
+
+def loadRows(path):
+    """
+    Reads the normalized rows of a data file and converts them to original measurement units.
+
+    Parameters:
+        path (str): The comma-separated data file.
+
+    Returns:
+        list: Rows of (variable name, value) pairs ready to be sent with 'input'.
+    """
+    rows = []
+    with open(path) as data:
+        for line in data:
+            line = line.strip()
+            if not line:
+                continue
+            values = [float(token) for token in line.split(",")]
+            rows.append(
+                [
+                    (name, round(low + value * (high - low), 4))
+                    for (name, (low, high)), value in zip(
+                        VARIABLE_RANGES.items(), values
+                    )
+                ]
+            )
+    return rows
+
+
+async def runClient(host, port, rows, offset, deadline, latencies, errors):
+    """
+    Replays rows through the command sequence on one connection until the deadline passes.
+
+    Parameters:
+        host (str): The server address.
+        port (int): The server port.
+        rows (list): Rows produced by loadRows.
+        offset (int): Index of the first row, so clients do not all send the same row at once.
+        deadline (float): time.perf_counter() value at which the client stops.
+        latencies (dict): Receives the latency of every command, keyed by command name.
+        errors (list): Receives one entry per unexpected response.
+
+    Returns:
+        int: Number of completed samples.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.read(1024)
+    samples = 0
+    index = offset
+    try:
+        while time.perf_counter() < deadline:
+            row = rows[index % len(rows)]
+            index += 1
+            for name, value in row:
+                started = time.perf_counter()
+                writer.write(f"input {name} {value}".encode())
+                reply = await reader.read(1024)
+                latencies["input"].append(time.perf_counter() - started)
+                if reply != b"OK":
+                    errors.append(reply)
+            started = time.perf_counter()
+            writer.write(b"classify")
+            reply = await reader.read(1024)
+            latencies["classify"].append(time.perf_counter() - started)
+            if reply != b"Classification complete":
+                errors.append(reply)
+            started = time.perf_counter()
+            writer.write(b"return class")
+            reply = await reader.read(1024)
+            latencies["return"].append(time.perf_counter() - started)
+            if not reply.startswith(b"Classification:"):
+                errors.append(reply)
+            samples += 1
+        writer.write(b"quit")
+        await reader.read(1024)
+    finally:
+        writer.close()
+    return samples
+
+
+def summarize(latencies, elapsed):
+    """
+    Computes the statistics reported for one command.
+
+    Parameters:
+        latencies (list): Latencies of the command, in seconds.
+        elapsed (float): Duration of the measured run, in seconds.
+
+    Returns:
+        dict: Count, rate per second, and mean/p50/p95/p99/max latency in milliseconds.
+    """
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "per_second": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+
+async def driveClients(options, rows):
+    """
+    Runs all simulated clients concurrently for the configured duration.
+
+    Parameters:
+        options (argparse.Namespace): The parsed command-line options.
+        rows (list): Rows produced by loadRows.
+
+    Returns:
+        tuple: (latencies by command, errors, completed samples, failed clients, elapsed seconds).
+    """
+    latencies = {command: [] for command in COMMANDS}
+    errors = []
+    started = time.perf_counter()
+    deadline = started + options.duration
+    results = await asyncio.gather(
+        *(
+            runClient(
+                options.host,
+                options.port,
+                rows,
+                client * 7,
+                deadline,
+                latencies,
+                errors,
+            )
+            for client in range(options.clients)
+        ),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+    samples = sum(result for result in results if isinstance(result, int))
+    failed = sum(1 for result in results if not isinstance(result, int))
+    return latencies, errors, samples, failed, elapsed
+
+
+def gitRevision():
+    """
+    Returns the git revision of the repository, if available.
+
+    Returns:
+        str: The commit hash, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPOSITORY,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runLoadTest(options):
+    """
+    Starts the server, drives it with the simulated clients, shuts it down, and builds the report.
+
+    Parameters:
+        options (argparse.Namespace): The parsed command-line options.
+
+    Returns:
+        dict: The JSON-serializable report.
+    """
+    rows = loadRows(options.data)
+    process = None
+    if not options.external:
+        process = subprocess.Popen(
+            [sys.executable, "server.py", "--host", options.host]
+            + ["--port", str(options.port), "--mode", options.mode]
+            + options.server_args,
+            cwd=REPOSITORY,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    try:
+        waitForPort(options.host, options.port)
+        latencies, errors, samples, failed, elapsed = asyncio.run(
+            driveClients(options, rows)
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": gitRevision(),
+        "python": platform.python_version(),
+        "mode": options.mode if process is not None else "external",
+        "clients": options.clients,
+        "duration_s": elapsed,
+        "samples": samples,
+        "samples_per_second": samples / elapsed if elapsed else 0.0,
+        "failed_clients": failed,
+        "errors": len(errors),
+        "commands": {
+            command: summarize(latencies[command], elapsed) for command in COMMANDS
+        },
+    }
+
+
+def main():
+    """
+    Parses the command-line options, runs the load test, and writes the JSON report.
+    """
+    parser = argparse.ArgumentParser(description="Load test the Iris server")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--host", default="127.0.0.1", help="server address")
+    parser.add_argument("--port", type=int, default=6992, help="server port")
+    parser.add_argument(
+        "--mode",
+        choices=["threaded", "asyncio"],
+        default="threaded",
+        help="server engine",
+    )
+    parser.add_argument(
+        "--external",
+        action="store_true",
+        help="test a server that is already running instead of starting one",
+    )
+    parser.add_argument(
+        "--data",
+        default=os.path.join(REPOSITORY, "IrisANN", "iris-trn.txt"),
+        help="data file whose rows are replayed",
+    )
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument(
+        "server_args", nargs="*", help="extra options passed to server.py after --"
+    )
+    options = parser.parse_args()
+
+    raiseFileLimit()
+    report = runLoadTest(options)
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w") as output:
+            output.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Microbenchmarks for the recall kernel.
+
+Times single-sample Recall, batch RecallBatch, end-to-end scoring of IrisANN/iris-trn.txt with TestIris.py,
+and chunked batch scoring of synthetic datasets scaled from 10^4 to 10^7 rows. Every measurement reports
+nanoseconds per sample, and batch measurements also report the peak memory traced while they ran. Before anything is timed, the outputs of
+every implementation are cross-checked against the reference TIris.Recall, so a speedup is only reported
+for results that are proven correct.
+
+Usage:
+    python benchmarks/recall.py --sizes 10000,100000,1000000,10000000 --output recall.json
+
+Functions:
+    loadRows(path): Reads the normalized rows of a data file.
+    crossCheck(rows): Compares every implementation with TIris.Recall.
+    timeSingle(model, rows, repeat): Times Recall one sample at a time.
+    timeBatch(model, matrix, chunk): Times RecallBatch over a matrix in chunks.
+    timeTestIris(path, repeat): Times TestIris.py scoring a file end to end.
+    main(): Parses the options, runs the suite, and prints or writes the results.
+
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from IrisANN.TCompiledIris import TCompiledIris  # noqa: E402
+from IrisANN.TIris import TIris  # noqa: E402
+
+# Largest deviation from TIris.Recall tolerated for implementations that regroup sums
+TOLERANCE = 1e-12
+
+
+def loadRows(path):
+    """
+    Reads the normalized rows of a comma-separated data file.
+
+    Parameters:
+        path (str): The data file.
+
+    Returns:
+        list: Rows of floats.
+    """
+    with open(path) as data:
+        return [
+            [float(token) for token in line.split(",")] for line in data if line.strip()
+        ]
+
+
+def crossCheck(rows):
+    """
+    Compares every implementation with the reference TIris.Recall on the given rows.
+
+    Parameters:
+        rows (list): Normalized input rows.
+
+    Returns:
+        dict: Per implementation, the largest absolute output deviation, winner mismatches, and whether it passed.
+    """
+    reference = TIris()
+    compiled = TCompiledIris.FromModel(reference)
+    expected = numpy.array([reference.Recall(row) for row in rows])
+    candidates = {
+        "TIris.RecallBatch": (reference.RecallBatch(rows)[0], 0.0),
+        "TCompiledIris.Recall": (
+            numpy.array([compiled.Recall(row) for row in rows]),
+            TOLERANCE,
+        ),
+        "TCompiledIris.RecallBatch": (compiled.RecallBatch(rows)[0], TOLERANCE),
+    }
+    report = {}
+    for name, (outputs, tolerance) in candidates.items():
+        deviation = (
+            float(numpy.max(numpy.abs(outputs - expected))) if len(rows) else 0.0
+        )
+        mismatches = int(numpy.sum(outputs.argmax(axis=1) != expected.argmax(axis=1)))
+        report[name] = {
+            "rows": len(rows),
+            "max_deviation": deviation,
+            "class_mismatches": mismatches,
+            "passed": deviation <= tolerance and mismatches == 0,
+        }
+    return report
+
+
+def measure(function, samples, traceMemory=True):
+    """
+    Times a function and reports its cost per sample. Tracing slows allocations down, so the peak
+    memory is taken from a second, traced run rather than from the timed one.
+
+    Parameters:
+        function (callable): The work to time.
+        samples (int): Number of samples processed by the work.
+        traceMemory (bool): Whether to run the work a second time under tracemalloc.
+
+    Returns:
+        dict: Samples, total seconds, nanoseconds per sample, and peak traced memory in bytes (or None).
+    """
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if traceMemory:
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "samples": samples,
+        "seconds": elapsed,
+        "ns_per_sample": elapsed / samples * 1e9 if samples else 0.0,
+        "peak_bytes": peak,
+    }
+
+
+def timeSingle(model, rows, repeat):
+    """
+    Times Recall called one sample at a time.
+
+    Parameters:
+        model (TIris or TCompiledIris): The model to time.
+        rows (list): Normalized input rows.
+        repeat (int): How many times the rows are scored.
+
+    Returns:
+        dict: The measurement.
+    """
+
+    def work():
+        recall = model.Recall
+        for _ in range(repeat):
+            for row in rows:
+                recall(row)
+
+    return measure(work, len(rows) * repeat, traceMemory=False)
+
+
+def timeBatch(model, matrix, chunk):
+    """
+    Times RecallBatch over a matrix scored in chunks, as a bulk scoring job would.
+
+    Parameters:
+        model (TIris or TCompiledIris): The model to time.
+        matrix (numpy.ndarray): N x 4 normalized inputs.
+        chunk (int): Rows scored per RecallBatch call.
+
+    Returns:
+        dict: The measurement.
+    """
+
+    def work():
+        for start in range(0, len(matrix), chunk):
+            model.RecallBatch(matrix[start : start + chunk])
+
+    return measure(work, len(matrix))
+
+
+def timeTestIris(path, repeat):
+    """
+    Times TestIris.py scoring a data file end to end, including interpreter start-up.
+
+    Parameters:
+        path (str): The data file to score.
+        repeat (int): Number of runs; the fastest is reported.
+
+    Returns:
+        dict: Samples, seconds and nanoseconds per sample of the fastest run.
+    """
+    samples = len(loadRows(path))
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "TestIris.py", os.path.abspath(path)],
+            cwd=os.path.join(REPOSITORY, "IrisANN"),
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "samples": samples,
+        "seconds": best,
+        "ns_per_sample": best / samples * 1e9,
+        "peak_bytes": None,
+    }
+
+
+def main():
+    """
+    Parses the command-line options, runs the cross-checks and benchmarks, and reports the results.
+    Exits with status 1 if any implementation disagrees with the reference.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the TIris recall kernel")
+    parser.add_argument(
+        "--data",
+        default=os.path.join(REPOSITORY, "IrisANN", "iris-trn.txt"),
+        help="data file used for single-sample, batch and end-to-end timings",
+    )
+    parser.add_argument(
+        "--sizes",
+        default="10000,100000,1000000,10000000",
+        help="comma separated sizes of the synthetic datasets",
+    )
+    parser.add_argument(
+        "--chunk", type=int, default=65536, help="rows per RecallBatch call"
+    )
+    parser.add_argument(
+        "--scalar-limit",
+        type=int,
+        default=100000,
+        help="largest synthetic size also timed with single-sample Recall",
+    )
+    parser.add_argument(
+        "--check-rows",
+        type=int,
+        default=20000,
+        help="synthetic rows cross-checked against TIris.Recall",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="passes over the data file"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=1, help="seed of the synthetic data"
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    options = parser.parse_args()
+
+    rows = loadRows(options.data)
+    sizes = [int(size) for size in options.sizes.split(",")]
+    generator = numpy.random.default_rng(options.seed)
+    reference = TIris()
+    compiled = TCompiledIris.FromModel(reference)
+    models = {"TIris": reference, "TCompiledIris": compiled}
+
+    checkRows = rows + generator.random((options.check_rows, 4)).tolist()
+    results = {"cross_check": crossCheck(checkRows), "file": {}, "synthetic": {}}
+    for name, check in results["cross_check"].items():
+        print(
+            f"check {name:<26} rows {check['rows']:>8}  max deviation {check['max_deviation']:.3g}"
+            f"  class mismatches {check['class_mismatches']}  {'ok' if check['passed'] else 'FAILED'}"
+        )
+    if not all(check["passed"] for check in results["cross_check"].values()):
+        sys.exit(1)
+
+    matrix = numpy.array(rows)
+    for name, model in models.items():
+        results["file"][f"{name}.Recall"] = timeSingle(model, rows, options.repeat)
+        results["file"][f"{name}.RecallBatch"] = timeBatch(
+            model, numpy.tile(matrix, (options.repeat, 1)), options.chunk
+        )
+    results["file"]["TestIris.py"] = timeTestIris(options.data, 3)
+
+    for size in sizes:
+        synthetic = generator.random((size, 4))
+        entry = results["synthetic"][str(size)] = {}
+        for name, model in models.items():
+            entry[f"{name}.RecallBatch"] = timeBatch(model, synthetic, options.chunk)
+            if size <= options.scalar_limit:
+                entry[f"{name}.Recall"] = timeSingle(model, synthetic.tolist(), 1)
+        del synthetic
+
+    print(f"\n{'dataset':<12}{'implementation':<28}{'ns/sample':>12}{'peak MiB':>10}")
+    for dataset, entry in [("iris-trn", results["file"])] + list(
+        results["synthetic"].items()
+    ):
+        for name, measurement in entry.items():
+            peak = measurement["peak_bytes"]
+            print(
+                f"{dataset:<12}{name:<28}{measurement['ns_per_sample']:>12.0f}"
+                f"{peak / 2**20 if peak is not None else float('nan'):>10.2f}"
+            )
+
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
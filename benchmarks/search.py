@@ -0,0 +1,174 @@
+"""
+Benchmark of the winner search of TCompiledIris: linear scan against the exact TPrototypeIndex tree.
+
+Builds synthetic networks with a growing number of evolving nodes, checks that both searches return the same
+outputs for every query, and reports the tree build time and the microseconds per Recall of each search. The
+prototypes and queries are drawn from a mixture of clusters, as a network evolved on real data would be; the
+built-in 21-node Iris network is measured too.
+
+Usage:
+    python benchmarks/search.py --sizes 100,1000,10000,50000 --output search.json
+
+Functions:
+    makeNetwork(size, generator): Builds the weights of a synthetic network.
+    makeQueries(count, centres, generator): Draws queries around the cluster centres.
+    timeRecall(model, queries): Times Recall over the queries.
+    benchmarkNetwork(I2EW, E2OW, queries): Cross-checks and times both searches on one network.
+    main(): Parses the options, runs the benchmark, and prints or writes the results.
+
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from IrisANN.TCompiledIris import TCompiledIris  # noqa: E402
+from IrisANN.TIris import TIris  # noqa: E402
+
+# Number of clusters the synthetic prototypes and queries are drawn around
+CLUSTERS = 24
+
+
+def makeNetwork(size, generator):
+    """
+    Builds the weights of a synthetic network whose prototypes lie around random cluster centres.
+
+    Parameters:
+        size (int): Number of evolving nodes.
+        generator (numpy.random.Generator): Source of random numbers.
+
+    Returns:
+        tuple: (I2EW, E2OW, centres) with the weights as lists of rows and the cluster centres as an array.
+    """
+    centres = generator.random((CLUSTERS, 4))
+    members = generator.integers(0, CLUSTERS, size)
+    prototypes = numpy.clip(
+        centres[members] + generator.normal(0.0, 0.08, (size, 4)), 0.0, 1.0
+    )
+    outputs = numpy.zeros((size, 3))
+    outputs[numpy.arange(size), members % 3] = 1.0 + 0.1 * generator.random(size)
+    return prototypes.tolist(), outputs.tolist(), centres
+
+
+def makeQueries(count, centres, generator):
+    """
+    Draws queries around the cluster centres.
+
+    Parameters:
+        count (int): Number of queries.
+        centres (numpy.ndarray): The cluster centres.
+        generator (numpy.random.Generator): Source of random numbers.
+
+    Returns:
+        list: Query vectors.
+    """
+    members = generator.integers(0, len(centres), count)
+    queries = centres[members] + generator.normal(0.0, 0.1, (count, 4))
+    return numpy.clip(queries, 0.0, 1.0).tolist()
+
+
+def timeRecall(model, queries):
+    """
+    Times Recall over the queries, one at a time.
+
+    Parameters:
+        model (TCompiledIris): The model to time.
+        queries (list): Query vectors.
+
+    Returns:
+        tuple: (outputs, microseconds per query).
+    """
+    recall = model.Recall
+    started = time.perf_counter()
+    outputs = [recall(query) for query in queries]
+    return outputs, (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def benchmarkNetwork(I2EW, E2OW, queries):
+    """
+    Cross-checks and times the linear and tree searches on one network.
+
+    Parameters:
+        I2EW (list): Prototype weights, one row per evolving node.
+        E2OW (list): Output weights, one row per evolving node.
+        queries (list): Query vectors.
+
+    Returns:
+        dict: Build time, microseconds per query of each search, speedup, and whether all outputs matched.
+    """
+    linear = TCompiledIris(I2EW, E2OW, "linear")
+    started = time.perf_counter()
+    tree = TCompiledIris(I2EW, E2OW, "tree")
+    build = time.perf_counter() - started
+    expected, linearTime = timeRecall(linear, queries)
+    outputs, treeTime = timeRecall(tree, queries)
+    return {
+        "nodes": len(I2EW),
+        "queries": len(queries),
+        "tree_build_s": build,
+        "linear_us": linearTime,
+        "tree_us": treeTime,
+        "speedup": linearTime / treeTime if treeTime else 0.0,
+        "identical": outputs == expected,
+    }
+
+
+def main():
+    """
+    Parses the command-line options, runs the benchmark, and reports the results.
+    Exits with status 1 if the searches disagree on any query.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the winner search")
+    parser.add_argument(
+        "--sizes",
+        default="100,1000,10000,50000",
+        help="comma separated numbers of evolving nodes of the synthetic networks",
+    )
+    parser.add_argument("--queries", type=int, default=2000, help="queries per network")
+    parser.add_argument(
+        "--seed", type=int, default=1, help="seed of the synthetic data"
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    options = parser.parse_args()
+
+    generator = numpy.random.default_rng(options.seed)
+    iris = TIris()
+    results = [
+        benchmarkNetwork(
+            iris.I2EW,
+            iris.E2OW,
+            generator.random((options.queries, 4)).tolist(),
+        )
+    ]
+    for size in [int(size) for size in options.sizes.split(",")]:
+        I2EW, E2OW, centres = makeNetwork(size, generator)
+        results.append(
+            benchmarkNetwork(
+                I2EW, E2OW, makeQueries(options.queries, centres, generator)
+            )
+        )
+
+    print(
+        f"{'nodes':>8}{'build s':>10}{'linear us':>12}{'tree us':>10}{'speedup':>9}  identical"
+    )
+    for result in results:
+        print(
+            f"{result['nodes']:>8}{result['tree_build_s']:>10.3f}{result['linear_us']:>12.1f}"
+            f"{result['tree_us']:>10.1f}{result['speedup']:>9.1f}  {result['identical']}"
+        )
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if not all(result["identical"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Benchmark of the memory held by idle client sessions.
+
+The 'objects' mode creates idle sessions in this process, as the asyncio engine does (ClientSession) or as the
+threaded engine does before starting a thread (ClientHandler), each with its four measurements entered, and
+reports the bytes traced per session by tracemalloc. The 'connect' mode opens real idle connections to a running
+server and reports the growth of the server's resident memory per connection, which includes the kernel-side
+socket buffers only as far as they are charged to the process.
+
+Usage:
+    python benchmarks/sessions.py --counts 10000,100000
+    python benchmarks/sessions.py --mode connect --port 9000 --pid 1234 --counts 10000
+
+Classes:
+    IdleConnection: Stands in for the socket of a session created without a connection.
+
+Functions:
+    measureObjects(kind, count): Bytes traced per idle session object.
+    residentBytes(pid): Resident memory of a process.
+    measureConnections(host, port, pid, count): Resident memory of the server per idle connection.
+    main(): Parses the options, runs the benchmark, and prints or writes the results.
+
+"""
+
+import argparse
+import gc
+import json
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from server import ClientHandler, ClientSession, Server  # noqa: E402
+from serverlog import LEVELS, log  # noqa: E402
+
+# Measurements entered into every session, as a client would before classifying
+MEASUREMENTS = [
+    "sepallength 5.1",
+    "sepalwidth 3.5",
+    "petallength 1.4",
+    "petalwidth 0.2",
+]
+
+
+class IdleConnection:
+    """
+    Stands in for the socket of a session created without a connection; every reply is discarded.
+
+    Methods:
+        send(data): Discards data.
+        sendall(data): Discards data.
+        close(): Does nothing.
+    """
+
+    def send(self, data):
+        return len(data)
+
+    def sendall(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+def measureObjects(kind, count):
+    """
+    Creates idle sessions with their measurements entered and measures the memory they hold.
+
+    Parameters:
+        kind (str): "session" for ClientSession objects, "handler" for (unstarted) ClientHandler threads.
+        count (int): Number of sessions.
+
+    Returns:
+        dict: Sessions created and bytes traced per session.
+    """
+    server = Server("127.0.0.1", 0)
+    connection = IdleConnection()
+    factory = ClientSession if kind == "session" else ClientHandler
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = []
+    for index in range(count):
+        session = factory(
+            connection, ("127.0.0.1", index), server, server.shutdownServer
+        )
+        for measurement in MEASUREMENTS:
+            session.handleInput(measurement)
+        sessions.append(session)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # The list holding the sessions is not part of their state
+    held -= sys.getsizeof(sessions)
+    return {"mode": kind, "sessions": count, "bytes_per_session": held / count}
+
+
+def residentBytes(pid):
+    """
+    Returns the resident memory of a process.
+
+    Parameters:
+        pid (int): The process id.
+
+    Returns:
+        int: VmRSS of the process in bytes.
+    """
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise ValueError(f"no VmRSS for process {pid}")
+
+
+def measureConnections(host, port, pid, count):
+    """
+    Opens idle connections to a running server and measures its resident memory growth.
+
+    Parameters:
+        host (str): The server host.
+        port (int): The server port.
+        pid (int): The server process id, whose resident memory is read.
+        count (int): Number of connections to open.
+
+    Returns:
+        dict: Connections opened and server bytes per connection.
+    """
+    before = residentBytes(pid)
+    connections = []
+    try:
+        for _ in range(count):
+            connection = socket.create_connection((host, port))
+            connection.recv(4096)
+            connections.append(connection)
+        time.sleep(1.0)
+        after = residentBytes(pid)
+    finally:
+        for connection in connections:
+            connection.close()
+    return {
+        "mode": "connect",
+        "sessions": count,
+        "bytes_per_session": (after - before) / count,
+    }
+
+
+def main():
+    """
+    Parses the command-line options, runs the benchmark, and reports the results.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark idle session memory")
+    parser.add_argument(
+        "--mode",
+        choices=["objects", "connect"],
+        default="objects",
+        help="objects: session objects in this process; connect: connections to a running server",
+    )
+    parser.add_argument(
+        "--counts", default="10000,100000", help="comma separated numbers of sessions"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="connect: server host")
+    parser.add_argument("--port", type=int, default=9000, help="connect: server port")
+    parser.add_argument("--pid", type=int, help="connect: server process id")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    options = parser.parse_args()
+    log.configure(level=LEVELS["off"])
+
+    results = []
+    for count in [int(count) for count in options.counts.split(",")]:
+        if options.mode == "connect":
+            results.append(
+                measureConnections(options.host, options.port, options.pid, count)
+            )
+        else:
+            results.append(measureObjects("session", count))
+            results.append(measureObjects("handler", count))
+
+    print(f"{'mode':>10}{'sessions':>10}{'bytes/session':>15}")
+    for result in results:
+        print(
+            f"{result['mode']:>10}{result['sessions']:>10}{result['bytes_per_session']:>15.0f}"
+        )
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
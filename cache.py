@@ -0,0 +1,151 @@
+"""
+Server-wide cache of classification results.
+
+Clients often send the same measurements again and again, so the result of a recall is remembered under the
+quantized normalized input vector and reused by every session. The cache is bounded, evicts the least recently
+used entry, counts hits and misses, and forgets everything as soon as it is used with a different model.
+
+Classes:
+    ResultCache: Thread-safe, bounded LRU cache placed in front of the model's Recall.
+
+Modules:
+    collections: Provides the ordered dictionary that keeps entries in recency order.
+    threading: Provides the lock guarding the cache across client threads.
+
+Constants:
+    DEFAULT_CACHE_SIZE (int): Default maximum number of cached results.
+    DEFAULT_QUANTUM (float): Default quantization step applied to normalized inputs to form a key.
+
+"""
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_QUANTUM = 1e-9
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of model outputs keyed on the quantized normalized input vector.
+
+    Attributes:
+        maxSize (int): Maximum number of cached results; 0 disables the cache.
+        quantum (float): Quantization step applied to every normalized input value to build the key.
+        model (object): The model the cached results were computed with.
+        entries (OrderedDict): Cached outputs, least recently used first.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that ran the model.
+        evictions (int): Number of entries dropped to respect maxSize.
+
+    Methods:
+        recall(model, vector): Returns the model outputs for a vector, from the cache when possible.
+        lookup(model, vector): Returns the key of a vector and its cached outputs, if any.
+        store(model, key, outputs): Caches the outputs computed for a key.
+        invalidate(model): Drops every cached result, optionally binding the cache to a new model.
+        stats(): Returns the cache counters.
+    """
+
+    def __init__(self, maxSize=DEFAULT_CACHE_SIZE, quantum=DEFAULT_QUANTUM):
+        self.maxSize = maxSize
+        self.quantum = quantum
+        self.model = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def recall(self, model, vector):
+        """
+        Returns the outputs of model.Recall for a normalized input vector, using a cached result when one
+        exists for the same quantized vector. Results cached for another model are discarded first.
+
+        Parameters:
+            model (TCompiledIris): The model to run on a cache miss.
+            vector (list): The normalized input values.
+
+        Returns:
+            list: The model outputs.
+        """
+        key, outputs = self.lookup(model, vector)
+        if outputs is not None:
+            return outputs
+
+        # Run the model outside the lock so concurrent misses do not serialize
+        outputs = model.Recall(vector)
+        self.store(model, key, outputs)
+        return outputs
+
+    def lookup(self, model, vector):
+        """
+        Looks a normalized input vector up, counting a hit or a miss. Results cached for another model are
+        discarded first. Used with store() by callers that run the model themselves, such as the batcher.
+
+        Parameters:
+            model (TCompiledIris): The model the outputs must come from.
+            vector (list): The normalized input values.
+
+        Returns:
+            tuple: (key to store the outputs under, cached outputs or None); the key is None if the cache is disabled.
+        """
+        if self.maxSize <= 0:
+            return None, None
+
+        key = tuple(round(value / self.quantum) for value in vector)
+        with self.lock:
+            if model is not self.model:
+                self.entries.clear()
+                self.model = model
+            outputs = self.entries.get(key)
+            if outputs is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return key, list(outputs)
+            self.misses += 1
+        return key, None
+
+    def store(self, model, key, outputs):
+        """
+        Caches the outputs computed for a key returned by lookup(), unless the model has changed since.
+
+        Parameters:
+            model (TCompiledIris): The model that computed the outputs.
+            key (tuple): The key returned by lookup(), or None if the cache is disabled.
+            outputs (list): The model outputs.
+        """
+        if key is None:
+            return
+        with self.lock:
+            if model is self.model:
+                self.entries[key] = tuple(outputs)
+                if len(self.entries) > self.maxSize:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, model=None):
+        """
+        Drops every cached result. Called whenever the server's model changes.
+
+        Parameters:
+            model (TCompiledIris): The model subsequent results will be computed with, if known.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.model = model
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Hits, misses, evictions, current size and maximum size.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "max_size": self.maxSize,
+            }
@@ -9,6 +9,7 @@ Classes:
 Modules:
     socket: Provides access to network sockets for communication between client and server.
     sys: Provides system-specific parameters and functions, used here for handling the main entry point.
+    protocol: Provides the framing and packing of the optional binary protocol.
 
 Constants:
     VARIABLE_RANGES (dict): Acceptable ranges for each Iris flower variable, imported from the client module.
@@ -21,7 +22,17 @@ Classes:
 import socket
 import sys
 
-from server import VARIABLE_RANGES
+from protocol import (
+    OP_CLASSIFY,
+    OP_COMMAND,
+    OP_RESULT,
+    STATUS_OK,
+    FrameReader,
+    encodeFrame,
+    packMeasurements,
+    unpackResults,
+)
+from server import SPECIES_NAMES, VARIABLE_RANGES
 
 
 class TCPClient:
@@ -31,15 +42,23 @@ class TCPClient:
     Attributes:
         clientSocket (socket.socket): The socket instance used for client-server communication.
         portNum (int): The port number for the connection, defaulting to 5991.
+        frames (FrameReader): Frame reader once the binary protocol is in use, otherwise None.
+        received (list): Frames received in binary mode that have not been consumed yet.
 
     Methods:
         handleInputError(text): Prints an error message for invalid user input.
         handleServerError(sStatus): Prints an error message for errors returned by the server.
+        sendCommand(command): Sends a command as text or, in binary mode, as a command frame.
+        receiveReply(): Receives one response from the server.
         handleOpen(command): Establishes a connection to the server at a specified address.
+        handleProtocol(command): Switches the connection between the text and binary protocols.
         handleClose(): Closes the current connection with the server.
         handleInput(command): Sends an input command to the server.
         handleClear(): Clears the stored inputs and outputs on the server.
         handleClassify(): Requests classification of the current inputs from the server.
+        handleStats(): Requests the server's statistics and prints all of them.
+        handleBatch(command): Sends several measurement rows for classification in one message.
+        handleBinaryBatch(command): Sends measurement rows as packed vectors over the binary protocol.
         handleShutdown(): Sends a shutdown command to the server.
         handleQuit(): Closes the client connection and exits.
         mainFunction(): Main loop to interact with the user and manage commands.
@@ -48,6 +67,8 @@ class TCPClient:
     def __init__(self):
         self.clientSocket = None  # Initialize the client socket
         self.portNum = 5991  # Default port number for connection
+        self.frames = None  # Set once the binary protocol has been negotiated
+        self.received = []  # Complete frames not yet consumed
 
     def handleInputError(self, text="Text cannot be empty. Please enter a valid Text."):
         """
@@ -71,6 +92,37 @@ class TCPClient:
         print(f"* ERROR: {sStatus} *")
         print("***************************************")
 
+    def sendCommand(self, command):
+        """
+        Sends a command to the server, wrapped in a command frame when the binary protocol is in use.
+
+        Parameters:
+            command (str): The command to send.
+        """
+        data = command.encode()
+        if self.frames is not None:
+            data = encodeFrame(OP_COMMAND, data)
+        self.clientSocket.sendall(data)
+
+    def receiveReply(self):
+        """
+        Receives one response from the server. In binary mode this waits until a whole frame has arrived.
+
+        Returns:
+            str or list: The response text, or the decoded result records of a binary classify request.
+        """
+        if self.frames is None:
+            return self.clientSocket.recv(1024).decode()
+        while not self.received:
+            chunk = self.clientSocket.recv(4096)
+            if not chunk:
+                return ""
+            self.received.extend(self.frames.feed(chunk))
+        opcode, payload = self.received.pop(0)
+        if opcode == OP_RESULT:
+            return unpackResults(payload)
+        return payload.decode()
+
     def handleOpen(self, command):
         """
         Establishes a connection to the server at the specified address.
@@ -88,6 +140,8 @@ class TCPClient:
 
         try:
             self.clientSocket = socket.socket()
+            self.frames = None
+            self.received = []
             print(f"Trying to connect to host {address} on port {self.portNum}")
             self.clientSocket.connect((address, self.portNum))
             print("Connection successful")
@@ -102,8 +156,8 @@ class TCPClient:
         Closes the current connection with the server.
         """
         if self.clientSocket:
-            self.clientSocket.send("close".encode())  # Send close command to server
-            sStatus = self.clientSocket.recv(1024).decode()  # Receive server response
+            self.sendCommand("close")  # Send close command to server
+            sStatus = self.receiveReply()  # Receive server response
             print("Server:", sStatus)
             if sStatus == "200 OK":
                 print("Connection closed.")
@@ -120,8 +174,8 @@ class TCPClient:
             command (str): The input command, including the variable name and value.
         """
         if self.clientSocket:
-            self.clientSocket.send(command.encode())  # Send input command to server
-            sStatus = self.clientSocket.recv(1024).decode()  # Receive server response
+            self.sendCommand(command)  # Send input command to server
+            sStatus = self.receiveReply()  # Receive server response
             print("Server:", sStatus)
         else:
             self.handleInputError(
@@ -133,8 +187,8 @@ class TCPClient:
         Sends a command to clear stored inputs and outputs on the server.
         """
         if self.clientSocket:
-            self.clientSocket.send("clear".encode())  # Send clear command to server
-            sStatus = self.clientSocket.recv(1024).decode()  # Receive server response
+            self.sendCommand("clear")  # Send clear command to server
+            sStatus = self.receiveReply()  # Receive server response
             print("Server:", sStatus)
         else:
             self.handleInputError(
@@ -146,11 +200,113 @@ class TCPClient:
         Requests classification of the current inputs stored on the server.
         """
         if self.clientSocket:
-            self.clientSocket.send(
-                "classify".encode()
-            )  # Send classify command to server
-            sStatus = self.clientSocket.recv(1024).decode()  # Receive server response
+            self.sendCommand("classify")  # Send classify command to server
+            sStatus = self.receiveReply()  # Receive server response
+            print("Server:", sStatus)
+        else:
+            self.handleInputError(
+                "No active connection. Please use 'open <address>' to connect."
+            )
+
+    def handleStats(self):
+        """
+        Requests the server's statistics. The reply can span several reads; its first line announces how
+        many statistic lines follow, and all of them are read before printing.
+        """
+        if self.clientSocket:
+            self.sendCommand("stats")
+            sStatus = self.receiveReply()
+            header = sStatus.split("\n", 1)[0].split()
+            if self.frames is None and header[:3] == ["200", "OK", "stats"]:
+                expected = int(header[3]) + 1 if len(header) == 4 else 0
+                while sStatus.count("\n") < expected:
+                    chunk = self.clientSocket.recv(4096).decode()
+                    if not chunk:
+                        break
+                    sStatus += chunk
+            print("Server:", sStatus.rstrip("\n"))
+        else:
+            self.handleInputError(
+                "No active connection. Please use 'open <address>' to connect."
+            )
+
+    def handleBatch(self, command):
+        """
+        Sends a batch of measurement rows to the server and prints the result for every row.
+
+        Parameters:
+            command (str): The batch command, e.g. 'batch 5.1,3.5,1.4,0.2;6.3,3.3,6.0,2.5'.
+        """
+        if self.clientSocket and self.frames is not None:
+            self.handleBinaryBatch(command)
+        elif self.clientSocket:
+            self.clientSocket.sendall((command + "\n").encode())
+            sStatus = self.clientSocket.recv(4096).decode()
+            # The first line announces how many row results follow
+            header = sStatus.split("\n", 1)[0].split()
+            if header[:2] == ["200", "OK"] and len(header) == 3:
+                expected = int(header[2]) + 1
+                while sStatus.count("\n") < expected:
+                    chunk = self.clientSocket.recv(4096).decode()
+                    if not chunk:
+                        break
+                    sStatus += chunk
+            print("Server:", sStatus.rstrip("\n"))
+        else:
+            self.handleInputError(
+                "No active connection. Please use 'open <address>' to connect."
+            )
+
+    def handleBinaryBatch(self, command):
+        """
+        Sends the rows of a batch command as packed float32 vectors in one classify frame and prints the results.
+
+        Parameters:
+            command (str): The batch command, e.g. 'batch 5.1,3.5,1.4,0.2;6.3,3.3,6.0,2.5'.
+        """
+        try:
+            _, payload = command.split(maxsplit=1)
+            rows = [
+                [float(value) for value in row.replace(",", " ").split()]
+                for row in payload.split(";")
+                if row.strip()
+            ]
+            if any(len(row) != len(VARIABLE_RANGES) for row in rows):
+                raise ValueError
+        except ValueError:
+            self.handleInputError(
+                "Please give rows of four numbers (e.g., 'batch 5.1,3.5,1.4,0.2;6.3,3.3,6.0,2.5')."
+            )
+            return
+
+        self.clientSocket.sendall(encodeFrame(OP_CLASSIFY, packMeasurements(rows)))
+        results = self.receiveReply()
+        if isinstance(results, str):
+            print("Server:", results)
+            return
+        for row, (status, winner, outputs) in zip(rows, results):
+            if status == STATUS_OK:
+                probabilities = " ".join(f"{value:.5f}" for value in outputs)
+                print(f"Server: {row} -> {probabilities} {SPECIES_NAMES[winner]}")
+            else:
+                print(f"Server: {row} -> 400 Error: Value out of range.")
+
+    def handleProtocol(self, command):
+        """
+        Asks the server to switch to the text or binary protocol and switches locally once it agrees.
+
+        Parameters:
+            command (str): The protocol command, 'protocol binary' or 'protocol text'.
+        """
+        if self.clientSocket:
+            self.sendCommand(command)
+            sStatus = self.receiveReply()
             print("Server:", sStatus)
+            if sStatus == "200 OK binary":
+                self.frames = FrameReader()
+                self.received = []
+            elif sStatus == "200 OK text":
+                self.frames = None
         else:
             self.handleInputError(
                 "No active connection. Please use 'open <address>' to connect."
@@ -161,10 +317,8 @@ class TCPClient:
         Sends a command to shut down the server and closes the client connection.
         """
         if self.clientSocket:
-            self.clientSocket.send(
-                "shutdown".encode()
-            )  # Send shutdown command to server
-            sStatus = self.clientSocket.recv(1024).decode()  # Receive server response
+            self.sendCommand("shutdown")  # Send shutdown command to server
+            sStatus = self.receiveReply()  # Receive server response
             print("Server:", sStatus)
             if "Server is shutting down" in sStatus:
                 self.clientSocket.close()
@@ -180,7 +334,7 @@ class TCPClient:
         Sends a quit command to the server and closes the client connection.
         """
         if self.clientSocket:
-            self.clientSocket.send("quit".encode())  # Send quit command to server
+            self.sendCommand("quit")  # Send quit command to server
             print("Closing connection.")
             self.clientSocket.close()
             self.clientSocket = None
@@ -197,7 +351,10 @@ class TCPClient:
                 " - OPEN <address>\n"
                 " - CLOSE \n"
                 " - INPUT <variable> <value>\n"
+                " - BATCH <row>;<row>;... (row: sl,sw,pl,pw)\n"
                 " - RETURN <inputs|outputs|class>\n"
+                " - PROTOCOL <text|binary>\n"
+                " - STATS\n"
                 " - CLASSIFY\n"
                 " - CLEAR \n"
                 " - QUIT \n"
@@ -229,6 +386,12 @@ class TCPClient:
                     break
                 elif command.startswith("input"):
                     self.handleInput(command)
+                elif command.startswith("batch"):
+                    self.handleBatch(command)
+                elif command.startswith("protocol"):
+                    self.handleProtocol(command)
+                elif command == "stats":
+                    self.handleStats()
                 elif command.startswith("return"):
                     self.handleInput(command)  # Send return command to server
                 elif command == "classify":
@@ -239,7 +402,7 @@ class TCPClient:
                     self.handleShutdown()
                 else:
                     self.handleInputError(
-                        "Invalid command. Please use one of the following: OPEN <address>/ CLOSE/ INPUT <variable> <value>/ RETURN <inputs|outputs|class>/ CLASSIFY/ CLEAR/ QUIT/ SHUTDOWN."
+                        "Invalid command. Please use one of the following: OPEN <address>/ CLOSE/ INPUT <variable> <value>/ BATCH <rows>/ RETURN <inputs|outputs|class>/ PROTOCOL <text|binary>/ STATS/ CLASSIFY/ CLEAR/ QUIT/ SHUTDOWN."
                     )
                     continue
 
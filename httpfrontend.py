@@ -0,0 +1,334 @@
+"""
+HTTP/1.1 frontend of the Iris server.
+
+Callers that only speak HTTP classify samples with a single stateless request instead of the input/classify/
+return dialogue of the TCP protocol. The frontend runs in the same process as the TCP listener, on threads of
+its own, and uses the server's current model, measurement ranges, validation and metrics, so a model reload is
+seen by both. Connections are kept alive between requests.
+
+Endpoints:
+    POST /classify
+        Body: {"samples": [sample, ...]} or {"sample": sample}, where a sample is a list of the measurements
+        in input order, or an object mapping every measurement name to its value.
+        Response: {"results": [result, ...]} with one result per sample, in order: either
+        {"species": name, "probabilities": {label: value, ...}} or {"error": message}.
+    GET /health
+        Response: {"status": "ok", "inputs": [name, ...]}.
+
+Classes:
+    ClassifyRequestHandler: Serves the requests of one HTTP connection.
+    HttpServer: Threading HTTP server that can share its port between worker processes.
+    HttpFrontend: Runs the HTTP server next to a TCP server.
+
+Modules:
+    http.server: Parses HTTP/1.1 requests and serves each connection on a thread.
+    json: Decodes requests and encodes responses.
+    socket: Sets SO_REUSEPORT in multi-process mode.
+    threading: Runs the HTTP server's accept loop.
+    time: Times the requests.
+    server: Provides the measurement ranges, validation, recall and species names.
+    serverlog: Reports HTTP connections and errors.
+
+Constants:
+    MAX_BODY_BYTES (int): Largest request body accepted, the same bound as a TCP batch message.
+
+"""
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from server import (
+    MAX_BATCH_BYTES,
+    SPECIES_LABELS,
+    SPECIES_NAMES,
+    modelRanges,
+    normalizeMeasurements,
+    recallVectors,
+)
+from serverlog import log
+
+MAX_BODY_BYTES = MAX_BATCH_BYTES
+
+
+class ClassifyRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the requests of one HTTP connection, on its own thread, until the client closes it or it stays
+    idle longer than the server's timeout.
+
+    Attributes:
+        iris (Server or AsyncServer): The TCP server whose model and metrics are used.
+
+    Methods:
+        setup(): Counts the connection and applies the idle timeout.
+        finish(): Counts the end of the connection.
+        do_GET(): Serves GET /health.
+        do_POST(): Serves POST /classify.
+        classify(document): Validates and classifies the samples of a request.
+        parseSample(sample, ranges): Returns the measurements of one sample in input order.
+        formatResult(output): Formats the outputs of one sample.
+        sendJson(status, document): Sends a JSON response.
+        log_message(format, *args): Sends the request log to the server log.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "IrisServer"
+
+    def setup(self):
+        """
+        Counts the new connection and applies the idle timeout to its socket.
+        """
+        self.iris = self.server.iris
+        self.timeout = self.server.idleTimeout or None
+        super().setup()
+        self.iris.metrics.connectionOpened()
+
+    def finish(self):
+        """
+        Counts the end of the connection and folds the thread's metrics into the totals.
+        """
+        try:
+            super().finish()
+        finally:
+            self.iris.metrics.connectionClosed()
+            self.iris.metrics.retire()
+
+    def do_GET(self):
+        """
+        Serves GET /health.
+        """
+        if self.path != "/health":
+            self.sendJson(404, {"error": "Not found."})
+            return
+        ranges = modelRanges(self.iris.model)
+        self.sendJson(200, {"status": "ok", "inputs": list(ranges)})
+
+    def do_POST(self):
+        """
+        Serves POST /classify: reads and decodes the JSON body, classifies its samples, and responds.
+        """
+        started = time.perf_counter()
+        if self.path != "/classify":
+            self.sendJson(404, {"error": "Not found."})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.sendJson(411, {"error": "Content-Length required."})
+            return
+        if length < 0 or length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self.sendJson(413, {"error": "Request body too large."})
+            return
+
+        body = self.rfile.read(length)
+        self.iris.metrics.received(len(body))
+        try:
+            document = json.loads(body)
+        except ValueError:
+            self.sendJson(400, {"error": "Invalid JSON."})
+            return
+        status, response = self.classify(document)
+        self.sendJson(status, response)
+        self.iris.metrics.record("http", time.perf_counter() - started)
+
+    def classify(self, document):
+        """
+        Validates the samples of a request against the model's ranges and classifies all valid ones in a
+        single recall. An invalid sample gets an error result and does not fail the others.
+
+        Parameters:
+            document (object): The decoded request body.
+
+        Returns:
+            tuple: (HTTP status, response document).
+        """
+        if isinstance(document, dict) and "samples" in document:
+            samples = document["samples"]
+        elif isinstance(document, dict) and "sample" in document:
+            samples = [document["sample"]]
+        else:
+            return 400, {"error": "Expected a 'samples' or 'sample' member."}
+        if not isinstance(samples, list):
+            return 400, {"error": "'samples' must be a list."}
+
+        model = self.iris.model
+        ranges = modelRanges(model)
+        results = []
+        vectors = []
+        for sample in samples:
+            values = self.parseSample(sample, ranges)
+            if isinstance(values, str):
+                results.append({"error": values})
+                continue
+            normalized = normalizeMeasurements(values, ranges)
+            if normalized is None:
+                results.append({"error": "Value out of range."})
+                continue
+            results.append(len(vectors))
+            vectors.append(normalized)
+
+        outputs = recallVectors(model, vectors, self.iris.metrics)
+        return 200, {
+            "results": [
+                (
+                    result
+                    if isinstance(result, dict)
+                    else self.formatResult(outputs[result])
+                )
+                for result in results
+            ]
+        }
+
+    @staticmethod
+    def parseSample(sample, ranges):
+        """
+        Returns the measurements of one sample in input order.
+
+        Parameters:
+            sample (object): A list of measurements, or an object mapping measurement names to values.
+            ranges (dict): The measurement ranges of the model, by name, in input order.
+
+        Returns:
+            list: The measurements as floats, or the error message if the sample is malformed.
+        """
+        if isinstance(sample, dict):
+            named = {str(name).lower(): value for name, value in sample.items()}
+            if set(named) != set(ranges):
+                return "Invalid input format."
+            sample = [named[name] for name in ranges]
+        elif not isinstance(sample, list) or len(sample) != len(ranges):
+            return "Invalid input format."
+        if not all(
+            isinstance(value, (int, float)) and not isinstance(value, bool)
+            for value in sample
+        ):
+            return "Invalid value format."
+        try:
+            return [float(value) for value in sample]
+        except OverflowError:
+            # A JSON integer too large for a float
+            return "Invalid value format."
+
+    @staticmethod
+    def formatResult(output):
+        """
+        Formats the outputs of one sample.
+
+        Parameters:
+            output (list): The model outputs of the sample.
+
+        Returns:
+            dict: The species with the highest output, and the output of every species.
+        """
+        return {
+            "species": SPECIES_NAMES[output.index(max(output))],
+            "probabilities": {
+                label: round(value, 5) for label, value in zip(SPECIES_LABELS, output)
+            },
+        }
+
+    def sendJson(self, status, document):
+        """
+        Sends a JSON response with its length, so the connection can be kept alive.
+
+        Parameters:
+            status (int): The HTTP status.
+            document (object): The response document.
+        """
+        body = json.dumps(document, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+        self.iris.metrics.sent(len(body))
+
+    def log_message(self, format, *args):
+        """
+        Sends the request log of the base class to the server log.
+        """
+        log.debug("[http %s] " + format, self.address_string(), *args)
+
+
+class HttpServer(ThreadingHTTPServer):
+    """
+    Threading HTTP server whose connection threads do not keep the process alive, and which can share its
+    port with the HTTP servers of the other worker processes.
+
+    Attributes:
+        iris (Server or AsyncServer): The TCP server whose model and metrics are used.
+        idleTimeout (float): Seconds a connection may stay idle between requests, or 0.
+        reusePort (bool): Whether the socket sets SO_REUSEPORT.
+
+    Methods:
+        server_bind(): Binds the socket, with SO_REUSEPORT if requested.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, iris, idleTimeout=0.0, reusePort=False):
+        self.iris = iris
+        self.idleTimeout = idleTimeout
+        self.reusePort = reusePort
+        super().__init__(address, ClassifyRequestHandler)
+
+    def server_bind(self):
+        """
+        Binds the socket, setting SO_REUSEPORT first in multi-process mode.
+        """
+        if self.reusePort:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+class HttpFrontend:
+    """
+    Runs the HTTP frontend of a TCP server on a thread of its own.
+
+    Attributes:
+        iris (Server or AsyncServer): The TCP server whose model and metrics are used.
+        host (str): The HTTP host.
+        port (int): The HTTP port.
+        idleTimeout (float): Seconds a connection may stay idle between requests, or 0.
+        reusePort (bool): Whether the port is shared with other worker processes.
+        httpd (HttpServer): The HTTP server, once started.
+
+    Methods:
+        start(): Binds the port and starts serving on a background thread.
+        stop(): Stops serving and closes the port.
+    """
+
+    def __init__(self, iris, host, port, idleTimeout=0.0, reusePort=False):
+        self.iris = iris
+        self.host = host
+        self.port = port
+        self.idleTimeout = idleTimeout
+        self.reusePort = reusePort
+        self.httpd = None
+
+    def start(self):
+        """
+        Binds the HTTP port and starts serving on a background thread.
+        """
+        self.httpd = HttpServer(
+            (self.host, self.port), self.iris, self.idleTimeout, self.reusePort
+        )
+        threading.Thread(
+            target=self.httpd.serve_forever, name="http", daemon=True
+        ).start()
+        log.info("HTTP frontend started on %s:%s", self.host, self.port)
+
+    def stop(self):
+        """
+        Stops serving and closes the HTTP port. Safe to call from any thread but the serving one.
+        """
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -0,0 +1,684 @@
+"""
+Programmatic client library for the Iris classification server.
+
+Unlike the interactive client.TCPClient, this module is meant to be called from other services. It keeps a
+pool of persistent connections that speak the binary protocol, lets many threads or coroutines classify
+concurrently, reconnects when a pooled connection turns out to be broken, and applies a timeout to every call.
+Results are returned as ClassificationResult tuples instead of being printed.
+
+Classes:
+    ClassificationResult: Structured result of classifying one row of measurements.
+    IrisClientError: Raised when the server rejects a request or answers with something unexpected.
+    Connection: One blocking connection to the server using the binary protocol.
+    IrisClient: Thread-safe connection pool with blocking and concurrent (Future based) calls.
+    AsyncIrisClient: asyncio connection pool with coroutine calls.
+
+Example:
+    with IrisClient("127.0.0.1") as client:
+        result = client.classify([5.1, 3.5, 1.4, 0.2])
+        print(result.species, result.outputs)
+
+"""
+
+import asyncio
+import itertools
+import queue
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from protocol import (
+    HEADER,
+    OP_CLASSIFY,
+    OP_COMMAND,
+    OP_RESULT,
+    OP_TEXT,
+    STATUS_OK,
+    FrameReader,
+    ProtocolError,
+    encodeFrame,
+    packMeasurements,
+    unpackResults,
+)
+from server import SPECIES_NAMES
+
+# Result of classifying one row: the species name and output vector, or the error reported for the row
+ClassificationResult = namedtuple(
+    "ClassificationResult", ["species", "outputs", "error"]
+)
+
+# Rows sent per write in streaming mode
+STREAM_CHUNK = 256
+
+# Confirmation of 'protocol binary', sent unframed and without a line terminator
+BINARY_REPLY = b"200 OK binary"
+
+# Exceptions after which a pooled connection is discarded and the call retried on a fresh one
+RETRYABLE_ERRORS = (ConnectionError, EOFError, asyncio.IncompleteReadError)
+
+
+class IrisClientError(Exception):
+    """
+    Raised when the server rejects a request or its answer cannot be understood.
+    """
+
+
+def toResults(records):
+    """
+    Converts the records of a result frame into ClassificationResult tuples.
+
+    Parameters:
+        records (list): Tuples of (status, class index, outputs) from protocol.unpackResults.
+
+    Returns:
+        list: One ClassificationResult per record.
+    """
+    results = []
+    for status, winner, outputs in records:
+        if status == STATUS_OK:
+            results.append(
+                ClassificationResult(SPECIES_NAMES[winner], tuple(outputs), None)
+            )
+        else:
+            results.append(ClassificationResult(None, None, "Value out of range."))
+    return results
+
+
+def welcomeComplete(welcome):
+    """
+    Tells whether the welcome banner received so far is complete: its Protocols line has been terminated, or
+    the server has turned the connection away.
+
+    Parameters:
+        welcome (bytes): The bytes received since the connection was opened.
+
+    Returns:
+        bool: True once the banner can be checked.
+    """
+    if welcome.startswith(b"503"):
+        return welcome.endswith(b"\n")
+    return b"\n" in welcome.partition(b"Protocols:")[2]
+
+
+def parseStreamResult(text):
+    """
+    Converts one result line of the streaming mode, without its tag, into a ClassificationResult.
+
+    Parameters:
+        text (str): '<label> <output> ... <species>' or '400 Error: <message>'.
+
+    Returns:
+        ClassificationResult: The classification of the row.
+    """
+    if text.startswith("400"):
+        return ClassificationResult(None, None, text.partition(": ")[2])
+    fields = text.split()
+    outputs = tuple(float(value) for value in fields[1:6:2])
+    return ClassificationResult(" ".join(fields[6:]), outputs, None)
+
+
+def checkRows(rows, width=None):
+    """
+    Makes sure every row holds the same number of measurements before it is packed.
+
+    Parameters:
+        rows (list): Rows of measurements.
+        width (int): Measurements expected per row, or None to take the length of the first row.
+
+    Returns:
+        list: The rows as lists of floats.
+    """
+    rows = [[float(value) for value in row] for row in rows]
+    if rows and width is None:
+        width = len(rows[0])
+    if width == 0:
+        raise ValueError("every row must hold at least one measurement")
+    if any(len(row) != width for row in rows):
+        raise ValueError(f"every row must hold {width} measurements")
+    return rows
+
+
+class Connection:
+    """
+    A blocking connection to the server that has switched to the binary protocol.
+
+    Attributes:
+        host (str): The server address.
+        port (int): The server port.
+        sock (socket.socket): The connected socket.
+        frames (FrameReader): Reassembles the frames received from the server.
+        received (list): Complete frames not consumed yet.
+
+    Methods:
+        request(opcode, payload, timeout): Sends one frame and waits for the answering frame.
+        classify(rows, timeout): Classifies rows of measurements.
+        close(): Says goodbye to the server and closes the socket.
+    """
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.frames = FrameReader()
+        self.received = []
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        try:
+            welcome = b""
+            # The protocols are listed on the last line of the banner, which may arrive in several reads
+            while not welcomeComplete(welcome):
+                chunk = self.sock.recv(1024)
+                if not chunk:
+                    raise ConnectionError("server closed the connection")
+                welcome += chunk
+            if welcome.startswith(b"503"):
+                # Turned away by a saturated server; retryable like any refused connection
+                raise ConnectionRefusedError(welcome.decode(errors="replace").strip())
+            if b"binary" not in welcome:
+                raise IrisClientError("server does not support the binary protocol")
+            self.sock.sendall(b"protocol binary")
+            reply = b""
+            # Stop early on a reply that cannot be the confirmation, such as an error
+            while len(reply) < len(BINARY_REPLY) and BINARY_REPLY.startswith(reply):
+                chunk = self.sock.recv(1024)
+                if not chunk:
+                    raise ConnectionError("server closed the connection")
+                reply += chunk
+            if reply != BINARY_REPLY:
+                raise IrisClientError(f"protocol negotiation failed: {reply!r}")
+        except BaseException:
+            self.sock.close()
+            raise
+
+    def request(self, opcode, payload, timeout):
+        """
+        Sends one frame and waits for the frame answering it.
+
+        Parameters:
+            opcode (int): The frame type to send.
+            payload (bytes): The frame body.
+            timeout (float): Seconds allowed for the whole exchange.
+
+        Returns:
+            tuple: (frame type, frame body) of the answer.
+        """
+        deadline = time.monotonic() + timeout
+        self.sock.settimeout(timeout)
+        self.sock.sendall(encodeFrame(opcode, payload))
+        while not self.received:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("timed out waiting for the server")
+            self.sock.settimeout(remaining)
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            self.received.extend(self.frames.feed(chunk))
+        return self.received.pop(0)
+
+    def classify(self, rows, timeout):
+        """
+        Classifies rows of measurements in one round trip.
+
+        Parameters:
+            rows (list): Rows of measurements in original units, one per model input.
+            timeout (float): Seconds allowed for the call.
+
+        Returns:
+            list: One ClassificationResult per row.
+        """
+        opcode, payload = self.request(OP_CLASSIFY, packMeasurements(rows), timeout)
+        if opcode == OP_RESULT:
+            return toResults(unpackResults(payload))
+        raise IrisClientError(payload.decode(errors="replace").strip())
+
+    def close(self):
+        """
+        Sends 'quit' to the server and closes the socket.
+        """
+        try:
+            self.sock.settimeout(1.0)
+            self.sock.sendall(encodeFrame(OP_COMMAND, b"quit"))
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class IrisClient:
+    """
+    Thread-safe client keeping a pool of persistent connections to the server.
+    Connections are opened on demand up to poolSize and reused by later calls.
+
+    Attributes:
+        host (str): The server address.
+        port (int): The server port.
+        poolSize (int): Maximum number of simultaneous connections.
+        timeout (float): Default seconds allowed for each call, including waiting for a free connection.
+        retries (int): How many times a call is retried on a fresh connection after a broken one.
+        width (int): Measurements per row expected by the served model, or None to accept any width shared by
+            all the rows of a call and let the server check it.
+
+    Methods:
+        classify(measurements, timeout): Classifies one row of measurements.
+        classifyMany(rows, timeout): Classifies many rows in one round trip.
+        submit(measurements, timeout): Classifies one row in the background and returns a Future.
+        map(rows, timeout): Classifies rows concurrently over the pool, returning results in order.
+        stream(rows, timeout): Streams rows over a dedicated connection, yielding results as they arrive.
+        close(): Closes every pooled connection.
+    """
+
+    def __init__(self, host, port=5991, poolSize=4, timeout=5.0, retries=1, width=None):
+        self.host = host
+        self.port = port
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.retries = retries
+        self.width = width
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def acquire(self, deadline, fresh=False):
+        """
+        Takes an idle connection from the pool, opening a new one if the pool is not full.
+
+        Parameters:
+            deadline (float): time.monotonic() value after which waiting is abandoned.
+            fresh (bool): Open a new connection instead of reusing an idle one, used after a broken connection.
+
+        Returns:
+            Connection: A connection reserved for the caller.
+        """
+        if fresh:
+            # Idle connections opened at the same time as a broken one are likely broken too
+            while True:
+                try:
+                    self.discard(self.idle.get_nowait())
+                except queue.Empty:
+                    break
+        else:
+            try:
+                return self.idle.get_nowait()
+            except queue.Empty:
+                pass
+        with self.lock:
+            create = self.opened < self.poolSize
+            if create:
+                self.opened += 1
+        if create:
+            try:
+                return Connection(
+                    self.host, self.port, max(deadline - time.monotonic(), 0.001)
+                )
+            except BaseException:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        try:
+            return self.idle.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            raise TimeoutError("timed out waiting for a free connection") from None
+
+    def discard(self, connection):
+        """
+        Closes a broken connection and frees its place in the pool.
+
+        Parameters:
+            connection (Connection): The connection to drop.
+        """
+        connection.sock.close()
+        with self.lock:
+            self.opened -= 1
+
+    def classifyMany(self, rows, timeout=None):
+        """
+        Classifies many rows of measurements in one round trip.
+
+        Parameters:
+            rows (list): Rows of measurements in original units, one per model input.
+            timeout (float): Seconds allowed for the call, defaulting to the client's timeout.
+
+        Returns:
+            list: One ClassificationResult per row.
+        """
+        rows = checkRows(rows, self.width)
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        for attempt in range(self.retries + 1):
+            connection = self.acquire(deadline, fresh=attempt > 0)
+            try:
+                results = connection.classify(
+                    rows, max(deadline - time.monotonic(), 0.001)
+                )
+            except RETRYABLE_ERRORS + (ProtocolError,):
+                self.discard(connection)
+                if attempt == self.retries:
+                    raise
+                continue
+            except BaseException:
+                # A timed out or interrupted exchange leaves the stream in an unknown state
+                self.discard(connection)
+                raise
+            self.idle.put(connection)
+            return results
+
+    def classify(self, measurements, timeout=None):
+        """
+        Classifies one row of measurements.
+
+        Parameters:
+            measurements (list): One measurement per model input, e.g. sepal length, sepal width, petal length
+                and petal width for the built-in network.
+            timeout (float): Seconds allowed for the call, defaulting to the client's timeout.
+
+        Returns:
+            ClassificationResult: The classification of the row.
+        """
+        return self.classifyMany([measurements], timeout)[0]
+
+    def submit(self, measurements, timeout=None):
+        """
+        Classifies one row of measurements on a background thread.
+
+        Parameters:
+            measurements (list): One measurement per model input, e.g. sepal length, sepal width, petal length
+                and petal width for the built-in network.
+            timeout (float): Seconds allowed for the call, defaulting to the client's timeout.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the ClassificationResult of the row.
+        """
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.poolSize)
+        return self.executor.submit(self.classify, measurements, timeout)
+
+    def map(self, rows, timeout=None):
+        """
+        Classifies rows concurrently over the pooled connections.
+
+        Parameters:
+            rows (list): Rows of measurements in original units, one per model input.
+            timeout (float): Seconds allowed for each row, defaulting to the client's timeout.
+
+        Returns:
+            list: One ClassificationResult per row, in the order of the rows.
+        """
+        futures = [self.submit(row, timeout) for row in rows]
+        return [future.result() for future in futures]
+
+    def stream(self, rows, timeout=None):
+        """
+        Classifies rows over a dedicated connection in the server's streaming mode. A background thread sends
+        the rows without waiting for answers while the results are read and yielded, so the link stays busy
+        in both directions; the rows may come from an endless iterator. If results are not consumed, TCP flow
+        control eventually stops the sending thread too.
+
+        Parameters:
+            rows (iterable): Rows of measurements in original units, one per model input.
+            timeout (float): Seconds allowed between two results, defaulting to the client's timeout.
+
+        Yields:
+            ClassificationResult: The classification of each row, in the order of the rows.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        failures = []
+
+        def send():
+            try:
+                iterator = iter(rows)
+                index = 0
+                width = self.width
+                while True:
+                    chunk = checkRows(itertools.islice(iterator, STREAM_CHUNK), width)
+                    if not chunk:
+                        break
+                    # Every row of the stream has the width of the first one
+                    width = len(chunk[0])
+                    lines = []
+                    for row in chunk:
+                        lines.append(f"{index} {','.join(map(str, row))}\n")
+                        index += 1
+                    sock.sendall("".join(lines).encode())
+            except Exception as err:
+                failures.append(err)
+            try:
+                sock.sendall(b"end\n")
+            except OSError:
+                pass
+
+        try:
+            welcome = b""
+            while not welcomeComplete(welcome):
+                chunk = sock.recv(1024)
+                if not chunk:
+                    raise ConnectionError("server closed the connection")
+                welcome += chunk
+            if b"stream" not in welcome:
+                raise IrisClientError("server does not support streaming")
+            sock.sendall(b"stream\n")
+            reader = sock.makefile("rb")
+            reply = reader.readline()
+            if reply != b"200 OK stream\n":
+                raise IrisClientError(f"streaming negotiation failed: {reply!r}")
+
+            sender = threading.Thread(target=send, name="iris-stream", daemon=True)
+            sender.start()
+            expected = 0
+            for line in reader:
+                tag, _, text = line.decode(errors="replace").strip().partition(" ")
+                if tag == "200" and text.startswith("OK end"):
+                    break
+                if tag != str(expected):
+                    raise IrisClientError(f"unexpected stream result: {line!r}")
+                expected += 1
+                yield parseStreamResult(text)
+            else:
+                raise ConnectionError("server closed the connection")
+            if failures:
+                raise failures[0]
+        finally:
+            sock.close()
+
+    def close(self):
+        """
+        Stops the background threads and closes every idle pooled connection.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        while True:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self.lock:
+                self.opened -= 1
+
+
+class AsyncIrisClient:
+    """
+    asyncio client keeping a pool of persistent connections to the server.
+
+    Attributes:
+        host (str): The server address.
+        port (int): The server port.
+        poolSize (int): Maximum number of simultaneous connections.
+        timeout (float): Default seconds allowed for each call, including waiting for a free connection.
+        retries (int): How many times a call is retried on a fresh connection after a broken one.
+        width (int): Measurements per row expected by the served model, or None to accept any width shared by
+            all the rows of a call and let the server check it.
+
+    Methods:
+        classify(measurements, timeout): Coroutine classifying one row of measurements.
+        classifyMany(rows, timeout): Coroutine classifying many rows in one round trip.
+        gather(rows, timeout): Coroutine classifying rows concurrently over the pool.
+        close(): Coroutine closing every pooled connection.
+    """
+
+    def __init__(self, host, port=5991, poolSize=4, timeout=5.0, retries=1, width=None):
+        self.host = host
+        self.port = port
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.retries = retries
+        self.width = width
+        self.idle = []
+        self.slots = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        """
+        Opens a connection and switches it to the binary protocol.
+
+        Returns:
+            tuple: The (reader, writer) stream pair of the connection.
+        """
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            welcome = b""
+            # The protocols are listed on the last line of the banner, which may arrive in several reads
+            while not welcomeComplete(welcome):
+                chunk = await reader.read(1024)
+                if not chunk:
+                    raise ConnectionError("server closed the connection")
+                welcome += chunk
+            if welcome.startswith(b"503"):
+                # Turned away by a saturated server; retryable like any refused connection
+                raise ConnectionRefusedError(welcome.decode(errors="replace").strip())
+            if b"binary" not in welcome:
+                raise IrisClientError("server does not support the binary protocol")
+            writer.write(b"protocol binary")
+            reply = b""
+            # Stop early on a reply that cannot be the confirmation, such as an error
+            while len(reply) < len(BINARY_REPLY) and BINARY_REPLY.startswith(reply):
+                chunk = await reader.read(1024)
+                if not chunk:
+                    raise ConnectionError("server closed the connection")
+                reply += chunk
+            if reply != BINARY_REPLY:
+                raise IrisClientError(f"protocol negotiation failed: {reply!r}")
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def exchange(self, streams, rows):
+        """
+        Sends the rows in one classify frame and reads the answering frame.
+
+        Parameters:
+            streams (tuple): The (reader, writer) pair of a pooled connection.
+            rows (list): Rows of measurements, one per model input.
+
+        Returns:
+            list: One ClassificationResult per row.
+        """
+        reader, writer = streams
+        writer.write(encodeFrame(OP_CLASSIFY, packMeasurements(rows)))
+        await writer.drain()
+        (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+        frame = await reader.readexactly(length)
+        if frame[0] == OP_RESULT:
+            return toResults(unpackResults(frame[1:]))
+        if frame[0] == OP_TEXT:
+            raise IrisClientError(frame[1:].decode(errors="replace").strip())
+        raise ProtocolError(f"unexpected frame type {frame[0]}")
+
+    async def attempt(self, rows):
+        """
+        Runs one classification on a pooled connection, reconnecting after broken connections.
+
+        Parameters:
+            rows (list): Rows of measurements, one per model input.
+
+        Returns:
+            list: One ClassificationResult per row.
+        """
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.poolSize)
+        async with self.slots:
+            for attempt in range(self.retries + 1):
+                if attempt > 0:
+                    # Idle connections opened with a broken one are likely broken too
+                    while self.idle:
+                        self.idle.pop()[1].close()
+                streams = self.idle.pop() if self.idle else await self.connect()
+                try:
+                    results = await self.exchange(streams, rows)
+                except RETRYABLE_ERRORS + (ProtocolError,):
+                    streams[1].close()
+                    if attempt == self.retries:
+                        raise
+                    continue
+                except BaseException:
+                    # Cancelled or timed out mid-exchange: the stream state is unknown
+                    streams[1].close()
+                    raise
+                self.idle.append(streams)
+                return results
+
+    async def classifyMany(self, rows, timeout=None):
+        """
+        Classifies many rows of measurements in one round trip.
+
+        Parameters:
+            rows (list): Rows of measurements in original units, one per model input.
+            timeout (float): Seconds allowed for the call, defaulting to the client's timeout.
+
+        Returns:
+            list: One ClassificationResult per row.
+        """
+        rows = checkRows(rows, self.width)
+        return await asyncio.wait_for(
+            self.attempt(rows), self.timeout if timeout is None else timeout
+        )
+
+    async def classify(self, measurements, timeout=None):
+        """
+        Classifies one row of measurements.
+
+        Parameters:
+            measurements (list): One measurement per model input, e.g. sepal length, sepal width, petal length
+                and petal width for the built-in network.
+            timeout (float): Seconds allowed for the call, defaulting to the client's timeout.
+
+        Returns:
+            ClassificationResult: The classification of the row.
+        """
+        return (await self.classifyMany([measurements], timeout))[0]
+
+    async def gather(self, rows, timeout=None):
+        """
+        Classifies rows concurrently over the pooled connections.
+
+        Parameters:
+            rows (list): Rows of measurements in original units, one per model input.
+            timeout (float): Seconds allowed for each row, defaulting to the client's timeout.
+
+        Returns:
+            list: One ClassificationResult per row, in the order of the rows.
+        """
+        return await asyncio.gather(*(self.classify(row, timeout) for row in rows))
+
+    async def close(self):
+        """
+        Sends 'quit' on every idle pooled connection and closes it.
+        """
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.write(encodeFrame(OP_COMMAND, b"quit"))
+            writer.close()
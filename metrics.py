@@ -0,0 +1,363 @@
+"""
+Built-in instrumentation for the Iris server.
+
+Every client thread records into its own shard of counters and latency histograms, so recording takes no lock
+and threads never contend; the shards are only summed when a snapshot is requested. Histograms use fixed
+power-of-two buckets from one microsecond upwards, so recording a latency is a single bisect and an increment.
+The server exposes the numbers through the 'stats' command and, optionally, a periodic text dump.
+
+Classes:
+    Histogram: Latency histogram with fixed power-of-two buckets.
+    MetricsShard: Counters and histograms written by a single thread.
+    Metrics: Server-wide metrics made of one shard per recording thread.
+
+Functions:
+    mergeShard(target, shard): Adds the contents of one shard to another.
+
+Modules:
+    bisect: Finds the bucket of a latency.
+    sys: Provides the default stream of the periodic dump.
+    threading: Provides the per-thread shards and the periodic dump thread.
+    time: Provides the clock used for uptime.
+
+Constants:
+    BUCKET_BOUNDS (List[float]): Upper bounds, in seconds, of the histogram buckets.
+    TIMED_COMMANDS (List[str]): Commands whose latency histograms are always reported.
+
+"""
+
+import bisect
+import sys
+import threading
+import time
+
+# Bucket i counts latencies up to 2**i microseconds; the last bucket catches everything slower
+BUCKET_BOUNDS = [1e-6 * 2**exponent for exponent in range(27)]
+
+TIMED_COMMANDS = ["input", "classify", "return"]
+
+
+class Histogram:
+    """
+    Latency histogram with fixed power-of-two buckets.
+
+    Attributes:
+        counts (list): Number of latencies recorded in each bucket.
+        total (float): Sum of the recorded latencies, in seconds.
+
+    Methods:
+        record(seconds): Adds one latency.
+        merge(other): Adds the contents of another histogram.
+        count(): Returns the number of recorded latencies.
+        percentile(fraction): Returns the upper bound of the bucket holding the given percentile.
+    """
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.total = 0.0
+
+    def record(self, seconds):
+        """
+        Adds one latency to the histogram.
+
+        Parameters:
+            seconds (float): The latency.
+        """
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.total += seconds
+
+    def merge(self, other):
+        """
+        Adds the contents of another histogram to this one.
+
+        Parameters:
+            other (Histogram): The histogram to add.
+        """
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+
+    def count(self):
+        """
+        Returns the number of recorded latencies.
+
+        Returns:
+            int: The count.
+        """
+        return sum(self.counts)
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket holding the given percentile.
+
+        Parameters:
+            fraction (float): Position between 0 and 1.
+
+        Returns:
+            float: The latency bound in seconds, or 0.0 if nothing was recorded.
+        """
+        total = self.count()
+        if not total:
+            return 0.0
+        rank = fraction * total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return BUCKET_BOUNDS[min(index, len(BUCKET_BOUNDS) - 1)]
+        return BUCKET_BOUNDS[-1]
+
+
+class MetricsShard:
+    """
+    Counters and histograms written by a single thread.
+
+    Attributes:
+        latencies (dict): Histogram per command name.
+        recall (Histogram): Time spent running the model.
+        samples (int): Number of samples classified by the model.
+        bytesIn (int): Bytes received from clients.
+        bytesOut (int): Bytes sent to clients.
+    """
+
+    __slots__ = ("latencies", "recall", "samples", "bytesIn", "bytesOut")
+
+    def __init__(self):
+        self.latencies = {}
+        self.recall = Histogram()
+        self.samples = 0
+        self.bytesIn = 0
+        self.bytesOut = 0
+
+
+def mergeShard(target, shard):
+    """
+    Adds the counters and histograms of one shard to another.
+
+    Parameters:
+        target (MetricsShard): The shard receiving the totals.
+        shard (MetricsShard): The shard to add.
+    """
+    for command, histogram in list(shard.latencies.items()):
+        target.latencies.setdefault(command, Histogram()).merge(histogram)
+    target.recall.merge(shard.recall)
+    target.samples += shard.samples
+    target.bytesIn += shard.bytesIn
+    target.bytesOut += shard.bytesOut
+
+
+class Metrics:
+    """
+    Server-wide metrics. Each thread records into its own MetricsShard without locking; snapshot() sums them.
+
+    Attributes:
+        started (float): time.time() at which the metrics were created.
+        active (int): Number of currently open client connections.
+        connections (int): Number of client connections accepted so far.
+
+    Methods:
+        shard(): Returns the shard of the calling thread.
+        retire(): Folds the calling thread's shard into the totals before the thread ends.
+        record(command, seconds): Counts a command and its latency.
+        recordRecall(seconds, samples): Records time spent running the model.
+        received(count): Counts bytes received from a client.
+        sent(count): Counts bytes sent to a client.
+        connectionOpened(): Counts a new client connection.
+        connectionClosed(): Counts a closed client connection.
+        snapshot(): Returns the totals over all shards.
+        format(extra): Formats a snapshot as the text of the 'stats' response.
+        startDump(interval, stream): Starts a thread writing the formatted metrics periodically.
+        stopDump(): Stops the periodic dump.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.active = 0
+        self.connections = 0
+        self.local = threading.local()
+        self.shards = []
+        self.retired = MetricsShard()
+        self.lock = threading.Lock()
+        self.dumpStop = None
+
+    def shard(self):
+        """
+        Returns the shard of the calling thread, creating it on first use.
+
+        Returns:
+            MetricsShard: The shard owned by the calling thread.
+        """
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = MetricsShard()
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def retire(self):
+        """
+        Folds the calling thread's shard into the retired totals, so short-lived client threads do not leave
+        one shard each behind. Called by a thread that will record nothing more.
+        """
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            return
+        del self.local.shard
+        with self.lock:
+            self.shards.remove(shard)
+            mergeShard(self.retired, shard)
+
+    def record(self, command, seconds):
+        """
+        Counts one command and records its latency.
+
+        Parameters:
+            command (str): The command name.
+            seconds (float): Time taken to process the command.
+        """
+        latencies = self.shard().latencies
+        histogram = latencies.get(command)
+        if histogram is None:
+            histogram = latencies[command] = Histogram()
+        histogram.record(seconds)
+
+    def recordRecall(self, seconds, samples=1):
+        """
+        Records time spent running the model.
+
+        Parameters:
+            seconds (float): Duration of the recall.
+            samples (int): Number of samples classified by it.
+        """
+        shard = self.shard()
+        shard.recall.record(seconds)
+        shard.samples += samples
+
+    def received(self, count):
+        """
+        Counts bytes received from a client.
+
+        Parameters:
+            count (int): Number of bytes.
+        """
+        self.shard().bytesIn += count
+
+    def sent(self, count):
+        """
+        Counts bytes sent to a client.
+
+        Parameters:
+            count (int): Number of bytes.
+        """
+        self.shard().bytesOut += count
+
+    def connectionOpened(self):
+        """
+        Counts a newly accepted client connection.
+        """
+        with self.lock:
+            self.active += 1
+            self.connections += 1
+
+    def connectionClosed(self):
+        """
+        Counts a client connection that has been closed.
+        """
+        with self.lock:
+            self.active -= 1
+
+    def snapshot(self):
+        """
+        Sums every shard into one set of totals. Counters owned by other threads may move while they are
+        read, so the snapshot is consistent to within the commands in flight.
+
+        Returns:
+            dict: Uptime, connection counts, byte counts, recall statistics and per-command histograms.
+        """
+        total = MetricsShard()
+        for command in TIMED_COMMANDS:
+            total.latencies[command] = Histogram()
+        with self.lock:
+            shards = list(self.shards)
+            active, connections = self.active, self.connections
+            mergeShard(total, self.retired)
+        for shard in shards:
+            mergeShard(total, shard)
+        return {
+            "uptime": time.time() - self.started,
+            "active": active,
+            "connections": connections,
+            "bytes_in": total.bytesIn,
+            "bytes_out": total.bytesOut,
+            "recall": total.recall,
+            "samples": total.samples,
+            "latencies": total.latencies,
+        }
+
+    def format(self, extra=None):
+        """
+        Formats the current totals as text, one statistic per line.
+
+        Parameters:
+            extra (dict): Additional named counter groups to report, e.g. the result cache counters.
+
+        Returns:
+            str: The formatted metrics.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"uptime_s {snapshot['uptime']:.1f}",
+            f"connections_active {snapshot['active']}",
+            f"connections_total {snapshot['connections']}",
+            f"bytes_in {snapshot['bytes_in']}",
+            f"bytes_out {snapshot['bytes_out']}",
+        ]
+        rows = [("recall", snapshot["recall"])] + sorted(snapshot["latencies"].items())
+        for name, histogram in rows:
+            count = histogram.count()
+            mean = histogram.total / count * 1000 if count else 0.0
+            label = name if name == "recall" else f"command {name}"
+            lines.append(
+                f"{label} count {count} mean_ms {mean:.3f}"
+                f" p50_ms {histogram.percentile(0.50) * 1000:.3f}"
+                f" p95_ms {histogram.percentile(0.95) * 1000:.3f}"
+                f" p99_ms {histogram.percentile(0.99) * 1000:.3f}"
+            )
+        lines.append(f"recall samples {snapshot['samples']}")
+        for group, counters in (extra or {}).items():
+            lines.append(
+                f"{group} "
+                + " ".join(f"{key} {value}" for key, value in counters.items())
+            )
+        return "\n".join(lines)
+
+    def startDump(self, interval, stream=None, extra=None):
+        """
+        Starts a daemon thread that writes the formatted metrics every interval seconds.
+
+        Parameters:
+            interval (float): Seconds between dumps.
+            stream (file): Where to write, defaulting to sys.stdout.
+            extra (callable): Returns the extra counter groups passed to format().
+        """
+        self.dumpStop = threading.Event()
+
+        def dump(stop):
+            while not stop.wait(interval):
+                text = self.format(extra() if extra else None)
+                out = stream or sys.stdout
+                out.write(f"--- stats ---\n{text}\n")
+                out.flush()
+
+        threading.Thread(target=dump, args=(self.dumpStop,), daemon=True).start()
+
+    def stopDump(self):
+        """
+        Stops the periodic dump, if one is running.
+        """
+        if self.dumpStop is not None:
+            self.dumpStop.set()
+            self.dumpStop = None
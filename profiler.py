@@ -0,0 +1,254 @@
+"""
+On-demand CPU profiling and allocation tracing for the Iris server.
+
+A running server can be profiled for a fixed window without a restart. The CPU profiler is a sampling profiler:
+a background thread reads the stack of every thread of the process at a fixed rate and counts identical stacks,
+which are written as collapsed stacks ('frame;frame;frame count' per line), the input format of flamegraph.pl,
+speedscope and similar tools. Threads blocked in a system call are sampled in the Python frame that made the
+call. The allocation tracer starts tracemalloc for the window and writes the largest allocations made during the
+window and still alive at its end, by source line, with the peak traced memory.
+
+Nothing is installed while no window is open: no profiling hook, no sampling thread and no tracemalloc, so a
+server with profiling enabled runs exactly as fast as one without until a window is requested, by the admin
+'profile' command or by SIGUSR2.
+
+Classes:
+    Profiler: Runs CPU profiling and allocation tracing windows and writes their reports.
+
+Functions:
+    collapseStack(frame): Returns the collapsed stack of a frame.
+
+Modules:
+    os: Creates the report directory and names the reports after the process.
+    sys: Reads the current stack of every thread.
+    threading: Runs the sampling and window threads.
+    time: Paces the samples and names the reports.
+    tracemalloc: Traces the allocations of the window.
+    serverlog: Reports the windows and their reports.
+
+Constants:
+    DEFAULT_DURATION (float): Default length of a window, in seconds.
+    DEFAULT_INTERVAL (float): Default seconds between two CPU samples.
+    TRACE_FRAMES (int): Frames stored per traced allocation.
+    TOP_ALLOCATIONS (int): Source lines listed in an allocation report.
+    KINDS (List[str]): The profiles a window can record.
+
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from serverlog import log
+
+DEFAULT_DURATION = 30.0
+
+# 200 samples per second per thread: enough for a readable flamegraph of a 30 second window
+DEFAULT_INTERVAL = 0.005
+
+# Enough frames to tell the command handler behind an allocation, few enough to keep tracing affordable
+TRACE_FRAMES = 16
+
+TOP_ALLOCATIONS = 50
+
+KINDS = ["cpu", "memory"]
+
+
+def collapseStack(frame):
+    """
+    Returns the collapsed stack of a frame: its callers from the outermost to the frame itself, separated by
+    semicolons, each as 'module:function'.
+
+    Parameters:
+        frame (frame): The innermost frame.
+
+    Returns:
+        str: The collapsed stack.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class Profiler:
+    """
+    Runs CPU profiling and allocation tracing windows on demand and writes their reports to a directory. At
+    most one window of each kind is open at a time.
+
+    Attributes:
+        directory (str): Where the reports are written, created if missing.
+        duration (float): Default length of a window, in seconds.
+        interval (float): Seconds between two CPU samples.
+        running (dict): The report path of the open window of each kind, or None.
+        reports (int): Number of reports written.
+        lastReport (str): Path of the last report written, or None.
+        lock (threading.Lock): Guards the open windows.
+
+    Methods:
+        start(kind, duration): Opens a window of one kind, or of both with "all".
+        profileCpu(path, duration): Body of a CPU window: samples every thread and writes the collapsed stacks.
+        traceMemory(path, duration): Body of an allocation window: traces allocations and writes the top lines.
+        finish(kind, path): Records the report of a closed window.
+        stats(): Returns the profiling counters.
+    """
+
+    def __init__(self, directory, duration=DEFAULT_DURATION, interval=DEFAULT_INTERVAL):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.duration = duration
+        self.interval = interval
+        self.running = dict.fromkeys(KINDS)
+        self.reports = 0
+        self.lastReport = None
+        self.lock = threading.Lock()
+
+    def start(self, kind, duration=None):
+        """
+        Opens a profiling window in the background. Safe to call from a signal handler or the event loop.
+
+        Parameters:
+            kind (str): "cpu", "memory", or "all" for both.
+            duration (float): Length of the window in seconds, or None for the default length.
+
+        Returns:
+            list: The report path of every window opened; a kind whose window is already open is skipped.
+        """
+        kinds = KINDS if kind == "all" else [kind]
+        duration = duration or self.duration
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"{time.time() % 1:.3f}"[1:]
+        paths = []
+        with self.lock:
+            for kind in kinds:
+                if self.running[kind] is not None:
+                    continue
+                extension = "folded" if kind == "cpu" else "txt"
+                path = os.path.join(
+                    self.directory, f"{kind}-{os.getpid()}-{stamp}.{extension}"
+                )
+                self.running[kind] = path
+                body = self.profileCpu if kind == "cpu" else self.traceMemory
+                threading.Thread(
+                    target=body,
+                    args=(path, duration),
+                    name=f"profile-{kind}",
+                    daemon=True,
+                ).start()
+                paths.append(path)
+        for path in paths:
+            log.info("profiling window of %.1f s opened, writing %s", duration, path)
+        return paths
+
+    def profileCpu(self, path, duration):
+        """
+        Samples the stack of every thread but the profiler's own until the window ends, then writes the
+        collapsed stacks, the most frequent first. Each stack starts with the name of its thread.
+
+        Parameters:
+            path (str): The report file.
+            duration (float): Length of the window, in seconds.
+        """
+        counts = {}
+        names = {}
+        deadline = time.monotonic() + duration
+        try:
+            while time.monotonic() < deadline:
+                for thread in threading.enumerate():
+                    names.setdefault(thread.ident, thread.name)
+                for ident, frame in sys._current_frames().items():
+                    name = names.get(ident) or f"thread-{ident}"
+                    if name.startswith("profile-"):
+                        continue
+                    stack = f"{name};{collapseStack(frame)}"
+                    counts[stack] = counts.get(stack, 0) + 1
+                time.sleep(self.interval)
+            with open(path, "w") as report:
+                for stack, count in sorted(
+                    counts.items(), key=lambda item: item[1], reverse=True
+                ):
+                    report.write(f"{stack} {count}\n")
+        except OSError as err:
+            log.error("cannot write CPU profile %s: %s", path, err)
+            path = None
+        self.finish("cpu", path)
+
+    def traceMemory(self, path, duration):
+        """
+        Traces allocations until the window ends, then writes the source lines holding the most memory
+        allocated during the window and still alive, and the peak traced memory. Tracing is stopped afterwards,
+        unless it was already running before the window.
+
+        Parameters:
+            path (str): The report file.
+            duration (float): Length of the window, in seconds.
+        """
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        time.sleep(duration)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started:
+            tracemalloc.stop()
+
+        statistics = snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        ).statistics("lineno")
+        try:
+            with open(path, "w") as report:
+                report.write(
+                    f"window {duration:.1f} s, traced {current / 1024:.1f} KiB,"
+                    f" peak {peak / 1024:.1f} KiB\n"
+                )
+                report.write(f"top {TOP_ALLOCATIONS} lines by size\n")
+                for statistic in statistics[:TOP_ALLOCATIONS]:
+                    frame = statistic.traceback[0]
+                    report.write(
+                        f"{statistic.size / 1024:10.1f} KiB {statistic.count:8d} blocks"
+                        f"  {frame.filename}:{frame.lineno}\n"
+                    )
+        except OSError as err:
+            log.error("cannot write allocation report %s: %s", path, err)
+            path = None
+        self.finish("memory", path)
+
+    def finish(self, kind, path):
+        """
+        Closes the window of one kind and records its report.
+
+        Parameters:
+            kind (str): "cpu" or "memory".
+            path (str): The report written, or None if it could not be written.
+        """
+        with self.lock:
+            self.running[kind] = None
+            if path is not None:
+                self.reports += 1
+                self.lastReport = path
+        if path is not None:
+            log.info("profiling window closed, report written to %s", path)
+
+    def stats(self):
+        """
+        Returns the profiling counters reported by 'stats'.
+
+        Returns:
+            dict: The windows open, the reports written, and the last report.
+        """
+        with self.lock:
+            return {
+                "cpu": "running" if self.running["cpu"] else "idle",
+                "memory": "running" if self.running["memory"] else "idle",
+                "reports": self.reports,
+                "last": self.lastReport or "none",
+            }
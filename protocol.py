@@ -0,0 +1,244 @@
+"""
+Binary wire protocol shared by the Iris server and its clients.
+
+The server advertises the binary protocol in its welcome message. A client switches to it by sending the text
+command 'protocol binary'; once the server has answered '200 OK binary', both sides exchange length-prefixed
+frames only. Every frame is a 4-byte big-endian payload length followed by the payload, whose first byte is
+the frame type:
+
+    OP_COMMAND  client -> server   UTF-8 text command, handled exactly like the text protocol
+    OP_CLASSIFY client -> server   one or more packed float32 measurement vectors (original units), each
+                                   holding as many values as the served model has inputs
+    OP_TEXT     server -> client   UTF-8 text response to an OP_COMMAND frame
+    OP_RESULT   server -> client   one record per classified vector: status, class index, float32 outputs
+
+Classes:
+    ProtocolError: Raised when a peer sends a malformed or oversized frame.
+    FrameReader: Reassembles frames from a byte stream however it is segmented.
+
+Functions:
+    encodeFrame(opcode, payload): Builds a complete frame.
+    measurementStruct(width): Returns the packing of one measurement vector of a given width.
+    packMeasurements(rows): Packs measurement vectors into an OP_CLASSIFY payload.
+    unpackMeasurements(payload, width): Unpacks the measurement vectors of an OP_CLASSIFY payload.
+    float32Decimal(value): Returns the shortest decimal that reads back as the same float32.
+    packResults(results): Packs classification results into an OP_RESULT payload.
+    unpackResults(payload): Unpacks the classification results of an OP_RESULT payload.
+
+Constants:
+    OP_COMMAND, OP_CLASSIFY, OP_TEXT, OP_RESULT (int): Frame types.
+    STATUS_OK, STATUS_OUT_OF_RANGE (int): Per-vector result status codes.
+    MAX_FRAME_SIZE (int): Largest payload a FrameReader accepts.
+    MEASUREMENT_WIDTH (int): Values per measurement vector of the built-in network.
+
+"""
+
+import struct
+
+OP_COMMAND = 0x01
+OP_CLASSIFY = 0x02
+OP_TEXT = 0x81
+OP_RESULT = 0x82
+
+STATUS_OK = 0
+STATUS_OUT_OF_RANGE = 1
+
+# Largest payload accepted in a single frame, in bytes
+MAX_FRAME_SIZE = 1024 * 1024
+
+# Frame length prefix, one measurement vector of the built-in network, and one result record
+HEADER = struct.Struct("!I")
+MEASUREMENT_WIDTH = 4
+MEASUREMENT = struct.Struct(f"!{MEASUREMENT_WIDTH}f")
+RESULT = struct.Struct("!BB3f")
+FLOAT32 = struct.Struct("!f")
+
+# Packing of a measurement vector, by number of values; a loaded model file may have any number of inputs
+measurementStructs = {MEASUREMENT_WIDTH: MEASUREMENT}
+
+
+class ProtocolError(Exception):
+    """
+    Raised when a peer sends a frame that cannot be decoded.
+    """
+
+
+def encodeFrame(opcode, payload=b""):
+    """
+    Builds a complete frame from a frame type and its body.
+
+    Parameters:
+        opcode (int): The frame type.
+        payload (bytes): The body of the frame.
+
+    Returns:
+        bytes: The length-prefixed frame.
+    """
+    return HEADER.pack(len(payload) + 1) + bytes((opcode,)) + payload
+
+
+def measurementStruct(width):
+    """
+    Returns the packing of one measurement vector.
+
+    Parameters:
+        width (int): Number of measurements in the vector.
+
+    Returns:
+        struct.Struct: The big-endian float32 packing of the vector.
+    """
+    packing = measurementStructs.get(width)
+    if packing is None:
+        packing = measurementStructs.setdefault(width, struct.Struct(f"!{width}f"))
+    return packing
+
+
+def packMeasurements(rows):
+    """
+    Packs measurement vectors into the body of an OP_CLASSIFY frame.
+
+    Parameters:
+        rows (list): Vectors of measurements in the model's input order, e.g. sepal length, sepal width,
+            petal length and petal width for the built-in network.
+
+    Returns:
+        bytes: The packed float32 values.
+
+    Raises:
+        ProtocolError: If the vectors do not all have the same number of measurements.
+    """
+    rows = list(rows)
+    if not rows:
+        return b""
+    width = len(rows[0])
+    if any(len(row) != width for row in rows):
+        raise ProtocolError("measurement vectors of different lengths")
+    packing = measurementStruct(width)
+    return b"".join(packing.pack(*row) for row in rows)
+
+
+def unpackMeasurements(payload, width=MEASUREMENT_WIDTH):
+    """
+    Unpacks the measurement vectors of an OP_CLASSIFY frame body.
+
+    Parameters:
+        payload (bytes): The frame body without its type byte.
+        width (int): Number of measurements per vector, the input count of the served model.
+
+    Returns:
+        list: Tuples of width measurements.
+    """
+    packing = measurementStruct(width)
+    if len(payload) % packing.size:
+        raise ProtocolError(
+            f"classify frame is not a whole number of {width}-value vectors"
+        )
+    return list(packing.iter_unpack(payload))
+
+
+def float32Decimal(value):
+    """
+    Returns the shortest decimal that reads back as the same float32 as a value, so a measurement typed as
+    7.9 and sent as float32 is seen again as 7.9 rather than 7.900000095367432. Nine significant digits
+    always suffice.
+
+    Parameters:
+        value (float): A value read from a float32.
+
+    Returns:
+        float: The shortest decimal rounding to the same float32.
+    """
+    packed = FLOAT32.pack(value)
+    for digits in range(6, 10):
+        decimal = float(f"{value:.{digits}g}")
+        if FLOAT32.pack(decimal) == packed:
+            return decimal
+    return value
+
+
+def packResults(results):
+    """
+    Packs classification results into the body of an OP_RESULT frame.
+
+    Parameters:
+        results (list): Tuples of (status, class index, outputs), one per classified vector.
+
+    Returns:
+        bytes: The packed result records.
+    """
+    return b"".join(
+        RESULT.pack(status, winner, *outputs) for status, winner, outputs in results
+    )
+
+
+def unpackResults(payload):
+    """
+    Unpacks the classification results of an OP_RESULT frame body.
+
+    Parameters:
+        payload (bytes): The frame body without its type byte.
+
+    Returns:
+        list: Tuples of (status, class index, outputs).
+    """
+    if len(payload) % RESULT.size:
+        raise ProtocolError("result frame is not a whole number of records")
+    return [
+        (status, winner, outputs)
+        for status, winner, *outputs in RESULT.iter_unpack(payload)
+    ]
+
+
+class FrameReader:
+    """
+    Reassembles frames from a byte stream. Data may be fed in arbitrary pieces: a frame split over several
+    reads is held back until complete, and several frames arriving in one read are all returned.
+
+    Attributes:
+        buffer (bytearray): Received bytes that do not form a complete frame yet.
+        maxSize (int): Largest payload accepted.
+
+    Methods:
+        feed(data): Adds received bytes and returns the frames completed by them.
+        pending(): Tells whether a partially received frame is buffered.
+    """
+
+    def __init__(self, maxSize=MAX_FRAME_SIZE):
+        self.buffer = bytearray()
+        self.maxSize = maxSize
+
+    def feed(self, data):
+        """
+        Adds received bytes to the buffer and extracts every complete frame.
+
+        Parameters:
+            data (bytes): The bytes just received.
+
+        Returns:
+            list: Tuples of (frame type, frame body) in arrival order.
+        """
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, offset)
+            if length < 1 or length > self.maxSize:
+                raise ProtocolError(f"invalid frame length {length}")
+            end = offset + HEADER.size + length
+            if end > len(self.buffer):
+                break
+            start = offset + HEADER.size
+            frames.append((self.buffer[start], bytes(self.buffer[start + 1 : end])))
+            offset = end
+        if offset:
+            del self.buffer[:offset]
+        return frames
+
+    def pending(self):
+        """
+        Tells whether part of a frame has been received but not completed.
+
+        Returns:
+            bool: True if bytes are waiting for the rest of their frame.
+        """
+        return bool(self.buffer)
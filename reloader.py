@@ -0,0 +1,207 @@
+"""
+Zero-downtime model reload for the Iris server.
+
+A reload loads the model file on a background thread, validates it, and then replaces the server's model with a
+single attribute assignment. Sessions read server.model once per command, so a command already running finishes
+on the model it started with and the next one uses the new model; the recall path takes no lock and no client
+connection is closed. A model that fails to load or validate is reported and the current model stays in service.
+
+A reload is triggered by the 'reload' command, by SIGHUP, or by the watcher thread noticing that the model file
+has changed on disk. Files are best replaced by writing a new file and renaming it over the old one, as SaveModel
+does, so that a reload never sees a partially written file. A file written in place (cp, an editor) is tolerated
+when watched: the watcher waits until the file has stopped changing for one interval before reloading, the model
+file loader rejects a file whose size does not match its header, and the server copies a watched model into
+memory instead of mapping it, so rewriting the file cannot change or fault the model in service.
+
+Classes:
+    ModelReloader: Loads, validates and swaps in new versions of the server's model file.
+
+Modules:
+    math: Checks that the outputs of a candidate model are finite.
+    os: Reads the identity and modification time of the model file.
+    threading: Runs loads and the file watcher in the background.
+    time: Timestamps successful reloads.
+    serverlog: Reports reloads and their failures.
+
+Constants:
+    PROBE_LEVELS (List[float]): Normalized input levels a candidate model must classify before it is swapped in.
+
+"""
+
+import math
+import os
+import threading
+import time
+
+from serverlog import log
+
+# Every candidate model recalls the inputs with all values at each of these levels as a smoke test
+PROBE_LEVELS = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+class ModelReloader:
+    """
+    Reloads the server's model from its model file without stopping the server.
+
+    Attributes:
+        server (Server or AsyncServer): The server whose model is replaced.
+        path (str): The model file.
+        loader (callable): Loads the model file given its path, e.g. server.loadModelFile.
+        interval (float): Seconds between two checks of the file, or 0 if the file is not watched.
+        generation (int): Number of models swapped in since the server started.
+        loaded (float): time.time() of the last successful reload, or None.
+        lastError (str): Why the last reload failed, or None if it succeeded.
+
+    Methods:
+        fileSignature(): Identifies the current version of the model file.
+        start(): Starts watching the model file, if an interval is set.
+        watch(): Body of the watcher thread.
+        request(): Starts a reload in the background unless one is already running.
+        reload(): Loads, validates and swaps in the model file; returns whether it succeeded.
+        validate(model): Checks that a candidate model can replace the current one.
+        stats(): Returns the reload counters.
+        stop(): Stops watching the model file.
+    """
+
+    def __init__(self, server, path, loader, interval=0):
+        self.server = server
+        self.path = path
+        self.loader = loader
+        self.interval = interval
+        self.generation = 0
+        self.loaded = None
+        self.lastError = None
+        self.running = threading.Lock()
+        self.stopped = threading.Event()
+        self.signature = self.fileSignature()
+
+    def fileSignature(self):
+        """
+        Identifies the current version of the model file.
+
+        Returns:
+            tuple: Inode, size and modification time of the file, or None if it cannot be read.
+        """
+        try:
+            status = os.stat(self.path)
+        except OSError:
+            return None
+        return (status.st_ino, status.st_size, status.st_mtime_ns)
+
+    def start(self):
+        """
+        Starts the thread watching the model file, if an interval is set.
+        """
+        if self.interval > 0:
+            threading.Thread(
+                target=self.watch, name="model-watcher", daemon=True
+            ).start()
+
+    def watch(self):
+        """
+        Body of the watcher thread: reloads the model once the file's identity, size or modification time has
+        changed and then stayed the same for one interval, so a file still being written is not loaded.
+        """
+        pending = None
+        while not self.stopped.wait(self.interval):
+            signature = self.fileSignature()
+            if signature is None or signature == self.signature:
+                pending = None
+            elif signature != pending:
+                pending = signature
+            else:
+                pending = None
+                self.reload()
+
+    def request(self):
+        """
+        Starts a reload on a background thread, so the caller (possibly the event loop) never waits for it.
+
+        Returns:
+            bool: False if a reload was already running.
+        """
+        if self.running.locked():
+            return False
+        threading.Thread(target=self.reload, name="model-reload", daemon=True).start()
+        return True
+
+    def reload(self):
+        """
+        Loads and validates the model file, then swaps it in. Concurrent reloads are skipped.
+
+        Returns:
+            bool: True if a new model is now in service.
+        """
+        if not self.running.acquire(blocking=False):
+            return False
+        try:
+            self.signature = self.fileSignature()
+            try:
+                model = self.loader(self.path)
+                self.validate(model)
+            except Exception as err:
+                # Any failure, e.g. a degenerate model dividing by zero when probed, keeps the current model
+                self.lastError = f"{type(err).__name__}: {err}"
+                log.error("model reload from %s failed: %r", self.path, err)
+                return False
+
+            # A single reference assignment: in-flight commands keep the model they read
+            self.server.model = model
+            self.server.cache.invalidate(model)
+            self.generation += 1
+            self.loaded = time.time()
+            self.lastError = None
+            log.info(
+                "model reloaded from %s (generation %d, %d evolving nodes)",
+                self.path,
+                self.generation,
+                model.EvolvingNodes,
+            )
+            return True
+        finally:
+            self.running.release()
+
+    def validate(self, model):
+        """
+        Checks that a candidate model has the inputs and outputs of the current one and produces finite
+        outputs. The sessions report one species per output, so the output count cannot change.
+
+        Parameters:
+            model (TCompiledIris): The candidate model.
+
+        Raises:
+            ValueError: If the model cannot replace the current one.
+        """
+        current = self.server.model
+        if model.InputNodes != current.InputNodes:
+            raise ValueError(
+                f"model has {model.InputNodes} inputs, the current one {current.InputNodes}"
+            )
+        if model.OutputNodes != current.OutputNodes:
+            raise ValueError(
+                f"model has {model.OutputNodes} outputs, the current one {current.OutputNodes}"
+            )
+        for level in PROBE_LEVELS:
+            outputs = model.Recall([level] * model.InputNodes)
+            if not all(math.isfinite(output) for output in outputs):
+                raise ValueError(f"model produces non-finite outputs at input {level}")
+
+    def stats(self):
+        """
+        Returns the reload counters reported by 'stats'.
+
+        Returns:
+            dict: Model generation, evolving nodes, seconds since the last reload, and whether the last one failed.
+        """
+        return {
+            "generation": self.generation,
+            "nodes": self.server.model.EvolvingNodes,
+            "age_s": round(time.time() - self.loaded, 1) if self.loaded else -1,
+            "last_failed": int(self.lastError is not None),
+        }
+
+    def stop(self):
+        """
+        Stops watching the model file.
+        """
+        self.stopped.set()
@@ -3,30 +3,123 @@ This module provides a multithreaded TCP server for handling client connections
 The server accepts a set of commands from clients to input, clear, classify, and return Iris flower measurements and classifications.
 
 Classes:
+    Measurements: Fixed-size storage for the measurements entered by one client.
+    ClientSession: Holds one client's session state and executes its commands, independent of the network engine.
+    BlockingSession: Serves one client connection with a blocking receive loop, on the calling thread.
     ClientHandler: Handles a single client connection, allowing clients to input flower measurements, request classifications, and retrieve data.
+    WorkerPool: Serves connections on a fixed set of threads with a bounded queue, rejecting the excess as busy.
     Server: Manages server initialization, starts listening for incoming connections, and shuts down the server.
 
 Modules:
+    array: Stores the measurements of a session without per-value objects.
+    math: Tells unset (NaN) measurements apart.
     socket: Provides access to the BSD socket interface for communication between the server and clients.
     threading: Supports multithreading to allow handling of multiple clients concurrently.
+    queue: Holds the accepted connections waiting for a thread of the worker pool.
+    argparse: Parses the command-line options used to select the host, port and server engine.
+    protocol: Provides the framing and packing of the optional binary protocol.
+    cache: Provides the server-wide cache of classification results.
+    metrics: Provides the per-command counters and latency histograms reported by 'stats'.
+    serverlog: Provides the non-blocking logger that reports connection and command events.
+    reloader: Reloads the model file while the server runs.
+    timeouts: Closes connections that stay idle, stall mid-message or outlive their lifetime.
+    httpfrontend: Serves the HTTP/JSON frontend next to the TCP listener, imported when enabled.
+    batcher: Batches the classify requests of concurrent sessions, imported when enabled.
+    profiler: Profiles the server and traces its allocations for a window on demand.
+    ipaddress: Restricts the 'profile' command to clients on the loopback interface.
+    signal: Reloads the model file on SIGHUP and opens a profiling window on SIGUSR2.
+    time: Provides the clock used to time commands and recalls.
 
 Constants:
     commands (List[str]): List of valid command strings that the server can recognize.
-    VARIABLE_RANGES (dict): Defines acceptable ranges for each measurement in the Iris flower dataset.
+    VARIABLE_RANGES (dict): Defines acceptable ranges for each measurement of the built-in network.
+    SPECIES_LABELS (List[str]): Labels used when listing the probability of each species.
+    SPECIES_NAMES (List[str]): Species names used when reporting a classification.
+    WELCOME_MESSAGE (str): Greeting sent to every newly connected client.
+    MAX_BATCH_BYTES (int): Largest batch message the server accepts.
+    MAX_STREAM_LINE (int): Longest line accepted in streaming mode.
+    BUSY_MESSAGE (str): Response sent to connections rejected because the server is saturated.
+    DEFAULT_QUEUE_SIZE (int): Default number of connections allowed to wait for a worker thread.
+    UNSET (float): Value (NaN) of a measurement that has not been entered yet.
+    TIMEOUT_MESSAGE (str): Response sent before closing a connection that timed out, formatted with the timeout.
+    SEND_TIMEOUT (float): Seconds allowed to send that response on a blocking connection.
+    RECV_BUFFER_SIZE (int): Size of the receive buffer of every serving thread.
+    ACCEPT_TIMEOUT (float): Seconds between two checks for shutdown while accepting from an inherited socket.
+    COMMAND_TABLE (dict): Handler of every text command, whether it takes an argument and whether the connection stays open.
+
+Functions:
+    loadDefaultModel(search): Compiles the built-in network into the model shared by all client sessions.
+    parseArguments(argv): Parses the command-line options of the server.
+    normalizeMeasurements(values, ranges): Validates measurements against their ranges and normalizes them.
+    recallVectors(model, vectors, metrics): Classifies several normalized input vectors in one recall.
+    modelRanges(model): Returns the measurement ranges of a model, defaulting to VARIABLE_RANGES.
+    modelPositions(model): Returns the input position of every measurement of a model.
+    receiveBuffer(): Returns the calling thread's reusable receive buffer.
+    loadModelFile(path, search): Loads a model and its ranges from a memory-mapped model file.
+    exportDefaultModel(path): Writes the built-in network and VARIABLE_RANGES to a model file.
+    buildDecisionTable(model, resolution, refine): Replaces a model by a precomputed decision table of its outputs.
+    createServer(options, listener, reusePort): Builds the threaded or asyncio server selected on the command line.
 
 Classes:
+    Measurements: Array-backed storage of one client's measurements.
+    ClientSession: Transport-independent command processing for one client.
+    BlockingSession: Blocking receive loop serving one client connection.
     ClientHandler: Thread-based handler for client connections.
     Server: Main server class to start, run, and shut down the server.
 
 """
 
+import argparse
+import ipaddress
+import math
+import queue
+import signal
 import socket
 import threading
+import time
+from array import array
 
+from cache import DEFAULT_CACHE_SIZE, ResultCache
+from IrisANN.TCompiledIris import SEARCH_METHODS, TCompiledIris
+from IrisANN.TDecisionTable import TDecisionTable
 from IrisANN.TIris import TIris
+from IrisANN.TModelFile import LoadModel, SaveModel
+from metrics import Metrics
+from profiler import DEFAULT_DURATION, Profiler
+from protocol import (
+    OP_CLASSIFY,
+    OP_COMMAND,
+    OP_RESULT,
+    OP_TEXT,
+    STATUS_OK,
+    STATUS_OUT_OF_RANGE,
+    FrameReader,
+    ProtocolError,
+    encodeFrame,
+    float32Decimal,
+    packResults,
+    unpackMeasurements,
+)
+from reloader import ModelReloader
+from serverlog import LEVELS, log
+from timeouts import ConnectionReaper, setKeepalive
 
 # List of valid command strings the server recognizes and processes
-commands = ["close", "input", "clear", "classify", "return", "quit", "shutdown"]
+commands = [
+    "close",
+    "input",
+    "batch",
+    "protocol",
+    "clear",
+    "classify",
+    "return",
+    "stats",
+    "reload",
+    "profile",
+    "stream",
+    "quit",
+    "shutdown",
+]
 
 # Acceptable measurement ranges for Iris flower variables
 VARIABLE_RANGES = {
@@ -36,167 +129,1030 @@ VARIABLE_RANGES = {
     "petalwidth": (0.1, 2.5),
 }
 
+# Output labels used for probability listings and for the final classification
+SPECIES_LABELS = ["IrisSetosa", "IrisVersicolor", "IrisVirginica"]
+SPECIES_NAMES = ["Iris setosa", "Iris versicolor", "Iris virginica"]
+
+# Greeting sent to every client once its connection is accepted
+WELCOME_MESSAGE = (
+    "Server is ready...\nWelcome to the Iris Server\nProtocols: text binary stream\n"
+)
+
+# Upper bound on the size of a single batch message, in bytes
+MAX_BATCH_BYTES = 1024 * 1024
+
+# Longest line accepted in streaming mode, in bytes; a tag and four measurements need far less
+MAX_STREAM_LINE = 1024
+
+# Response sent to a connection turned away because the worker pool and its queue are full
+BUSY_MESSAGE = "503 Server busy, retry later.\n"
+
+# Default number of accepted connections allowed to wait for a worker thread
+DEFAULT_QUEUE_SIZE = 64
+
+# Value of a measurement that has not been entered yet
+UNSET = math.nan
+
+# Response sent to a connection closed because it timed out
+TIMEOUT_MESSAGE = "408 Error: {} timeout, closing connection.\n"
+
+# A client that timed out may not be reading either, so the response must not block its thread for long
+SEND_TIMEOUT = 1.0
+
+# Size of the buffer every serving thread receives into, reused for all its reads and connections
+RECV_BUFFER_SIZE = 4096
+
+# An inherited listening socket is shared with other processes and cannot be shut down to wake accept(),
+# so accept() wakes up this often to check whether the server is stopping
+ACCEPT_TIMEOUT = 0.5
+
+# Bytes a text message may start with before its command name
+WHITESPACE = b" \t\r\n"
+
+# The last model whose ranges modelRanges() computed, and those ranges, replaced as one tuple
+lastRanges = (None, None)
+
+# The last ranges whose input positions modelPositions() computed, and those positions
+lastPositions = (None, None)
+
+# The receive buffer of each serving thread
+receiveBuffers = threading.local()
+
+
+def normalizeMeasurements(values, ranges=VARIABLE_RANGES):
+    """
+    Validates a row of measurements against their ranges and normalizes each value to [0, 1].
+
+    Parameters:
+        values (list): The measurements in the order of the ranges.
+        ranges (dict): The (min, max) range of every measurement, defaulting to VARIABLE_RANGES.
+
+    Returns:
+        list: The normalized values, or None if any measurement is out of range.
+    """
+    normalized = []
+    for value, (min_val, max_val) in zip(values, ranges.values()):
+        if not min_val <= value <= max_val:
+            return None
+        normalized.append((value - min_val) / (max_val - min_val))
+    return normalized
+
+
+def recallVectors(model, vectors, metrics):
+    """
+    Runs a model on several normalized input vectors at once and records the recall time.
+
+    Parameters:
+        model (TCompiledIris): The model.
+        vectors (list): Normalized input vectors.
+        metrics (Metrics): The metrics the recall is recorded in.
+
+    Returns:
+        list: The output list of each vector.
+    """
+    if not vectors:
+        return []
+    started = time.perf_counter()
+    try:
+        # The vectorized recall costs several scalar ones to set up, so a lone vector runs the scalar one
+        if len(vectors) == 1:
+            outputs = [model.Recall(vectors[0])]
+        else:
+            outputs = model.RecallBatch(vectors)[0].tolist()
+    except ImportError:
+        outputs = [model.Recall(vector) for vector in vectors]
+    metrics.recordRecall(time.perf_counter() - started, len(vectors))
+    return outputs
+
+
+def modelRanges(model):
+    """
+    Returns the measurement ranges of a model: those stored with it in a model file, or VARIABLE_RANGES.
+    The ranges of the last model asked for are remembered, so sessions can look them up on every command.
+
+    Parameters:
+        model (TCompiledIris): The model.
+
+    Returns:
+        dict: The (min, max) range of every measurement, by lower-case variable name, in input order.
+    """
+    global lastRanges
+    if model.Ranges is None:
+        return VARIABLE_RANGES
+    remembered, ranges = lastRanges
+    if remembered is not model:
+        ranges = {name.lower(): tuple(bounds) for name, bounds in model.Ranges.items()}
+        lastRanges = (model, ranges)
+    return ranges
+
+
+def modelPositions(model):
+    """
+    Returns the position of every measurement among the inputs of a model, remembered like its ranges so
+    'input' commands look a name up without building a list.
+
+    Parameters:
+        model (TCompiledIris): The model.
+
+    Returns:
+        dict: The input index of every measurement, by lower-case variable name.
+    """
+    global lastPositions
+    ranges = modelRanges(model)
+    remembered, positions = lastPositions
+    if remembered is not ranges:
+        positions = {name: index for index, name in enumerate(ranges)}
+        lastPositions = (ranges, positions)
+    return positions
+
+
+def receiveBuffer():
+    """
+    Returns the receive buffer of the calling thread, allocating it on first use. A worker thread keeps
+    the same buffer for every connection it serves; sessions copy out whatever they keep past a read.
+
+    Returns:
+        memoryview: A writable view of RECV_BUFFER_SIZE bytes.
+    """
+    buffer = getattr(receiveBuffers, "buffer", None)
+    if buffer is None:
+        buffer = receiveBuffers.buffer = memoryview(bytearray(RECV_BUFFER_SIZE))
+    return buffer
+
+
+def loadModelFile(path, search="linear", copy=False):
+    """
+    Loads a model and its measurement ranges from a memory-mapped model file (see IrisANN/TModelFile.py).
+
+    Parameters:
+        path (str): The model file.
+        search (str): How the model finds the winning evolving node, "linear" or "tree".
+        copy (bool): Whether to read the weights into memory instead of mapping the file, so that the model
+            is unaffected by the file being rewritten in place.
+
+    Returns:
+        TCompiledIris: The model, whose weights are views of the read-only mapping, or of a copy.
+    """
+    model = LoadModel(path, search, copy)
+    if model.OutputNodes != len(SPECIES_NAMES):
+        raise ValueError(
+            f"{path} has {model.OutputNodes} outputs, the server reports {len(SPECIES_NAMES)} species"
+        )
+    return model
+
+
+def exportDefaultModel(path):
+    """
+    Writes the built-in TIris network and VARIABLE_RANGES to a model file.
+
+    Parameters:
+        path (str): The model file to write.
+    """
+    network = TIris()
+    SaveModel(path, network.I2EW, network.E2OW, VARIABLE_RANGES)
+
+
+def buildDecisionTable(model, resolution, refine=0):
+    """
+    Precomputes the outputs of a model over a grid of the normalized inputs (see IrisANN/TDecisionTable.py).
+    Classification then takes constant time whatever the size of the network, at the cost of a bounded
+    accuracy loss, which is measured against the model and logged with the memory the table takes.
+
+    Parameters:
+        model (TCompiledIris): The exact model.
+        resolution (int): Number of grid cells along every input.
+        refine (int): Number of sub-cells along every input of the cells next to a class boundary, or 0.
+
+    Returns:
+        TDecisionTable: The decision table, used by the sessions in place of the model.
+    """
+    started = time.perf_counter()
+    table = TDecisionTable(model, resolution, refine)
+    built = time.perf_counter() - started
+    maxDeviation, meanDeviation, mismatches = table.Deviation()
+    log.info(
+        "decision table of %d^%d cells (%d refined) built in %.2f s: %.1f KiB, "
+        "sampled output deviation max %.4f mean %.4f, class mismatches %.2f%%",
+        resolution,
+        table.InputNodes,
+        table.RefinedCells,
+        built,
+        table.MemoryBytes() / 1024,
+        maxDeviation,
+        meanDeviation,
+        mismatches * 100,
+    )
+    return table
+
 
-class ClientHandler(threading.Thread):
+def loadDefaultModel(search="linear"):
     """
-    Handles a single client connection and processes commands such as input, classify, clear, and return.
+    Compiles the built-in TIris network into the shared, immutable form used by the servers.
+
+    Parameters:
+        search (str): How the model finds the winning evolving node, "linear" or "tree".
+
+    Returns:
+        TCompiledIris: The compiled model.
+    """
+    return TCompiledIris.FromModel(TIris(), search)
+
+
+class Measurements:
+    """
+    Fixed-size storage for the measurements entered by one client: the original and the normalized value of
+    every input of the model, in input order, in a single float array. A NaN marks a measurement not entered
+    yet, so entering and clearing measurements change the array in place and allocate nothing.
 
     Attributes:
-        connection (socket.socket): The client connection socket.
+        size (int): Number of inputs of the model.
+        values (array.array): The original value of every input, followed by its normalized value.
+
+    Methods:
+        set(index, original, normalized): Stores one measurement.
+        clear(): Marks every measurement as not entered.
+        vector(): Returns the normalized values, or None if any is missing.
+        entered(): Returns the index and original value of every measurement entered.
+    """
+
+    __slots__ = ("size", "values")
+
+    def __init__(self, size):
+        self.size = size
+        self.values = array("d", [UNSET]) * (2 * size)
+
+    def set(self, index, original, normalized):
+        """
+        Stores one measurement.
+
+        Parameters:
+            index (int): Position of the measurement among the inputs of the model.
+            original (float): The value as entered.
+            normalized (float): The value normalized to [0, 1].
+        """
+        self.values[index] = original
+        self.values[self.size + index] = normalized
+
+    def clear(self):
+        """
+        Marks every measurement as not entered.
+        """
+        values = self.values
+        for index in range(len(values)):
+            values[index] = UNSET
+
+    def vector(self):
+        """
+        Returns the normalized input vector for the model.
+
+        Returns:
+            list: The normalized values in input order, or None if any measurement has not been entered.
+        """
+        vector = self.values[self.size :].tolist()
+        if any(math.isnan(value) for value in vector):
+            return None
+        return vector
+
+    def entered(self):
+        """
+        Returns the measurements entered so far.
+
+        Returns:
+            list: (index, original value) of every measurement entered, in input order.
+        """
+        return [
+            (index, self.values[index])
+            for index in range(self.size)
+            if not math.isnan(self.values[index])
+        ]
+
+
+class ClientSession:
+    """
+    Holds the state of a single client session and processes commands such as input, classify, clear, and return.
+    The session is independent of how bytes reach the server, so the threaded and asyncio engines share it.
+
+    Attributes:
+        connection (socket.socket): The client connection, or any object providing send(), sendall() and close().
         address (tuple): The client's address (IP, port).
         server (Server): A reference to the server for managing server-wide operations.
         shutdown_func (function): A function to trigger server shutdown.
-        inputs (dict): Stores original and normalized values of Iris measurements for the client.
+        inputs (Measurements): The original and normalized measurements entered by the client.
         outputs (list): Holds the model's classification result.
-        model (TIris): An instance of the Iris classification model.
+        model (TCompiledIris): The server's current model, read anew by every command so reloads take effect.
+        ranges (dict): The measurement ranges of the current model, by variable name.
+        metrics (Metrics): The server's instrumentation.
+        pending (bytes): Text received so far of a message that is not complete yet.
+        discarding (bool): True while the rest of an oversized batch message is skipped up to its newline.
+        frames (FrameReader): Frame reader once the client has switched to the binary protocol, else None.
+        streamed (int): Rows answered since the client switched to streaming mode, or None outside it.
+        deferred (bytes): Data received while a batched classify is in flight, or None when none is.
+        log (ConnectionLogger): Logger for the connection's events, subject to per-connection sampling.
+        opened (float): time.monotonic() when the session was created.
+        received (float): time.monotonic() when data was last received.
+        partial (float): time.monotonic() when the first bytes of the message in progress arrived, or 0.
+        expired (str): The timeout that closed the connection, or None.
 
     Methods:
-        run(): Listens for commands from the client and delegates processing to specific handlers.
-        handleInput(command): Processes 'input' commands to store and normalize client-provided values.
-        handleReturn(command): Processes 'return' commands to retrieve input/output data.
+        receive(data): Feeds received bytes into the session and dispatches every complete message.
+        process(data): Dispatches received bytes according to the protocol in use.
+        receiveText(data): Dispatches the command received in text mode.
+        receiveStream(data): Classifies every complete line received in streaming mode.
+        reply(text): Sends a text response, framed if the binary protocol is in use.
+        send(data): Sends raw bytes to the client and counts them.
+        isComplete(message): Tells whether a received text message can be dispatched.
+        startsWith(message, name): Tells whether a text message starts with a command name.
+        decodeCommand(message): Decodes a complete text message into a command string.
+        handleCommand(command): Times and counts a complete command and dispatches it.
+        dispatchCommand(name, argument): Dispatches a command to its handler through COMMAND_TABLE.
+        handleFrame(opcode, payload): Dispatches a complete binary frame.
+        handleProtocol(option): Processes 'protocol' commands to switch between text and binary framing.
+        handleStream(): Switches the connection to streaming mode.
+        formatStreamLine(line, ranges): Parses one streamed line into its tag and normalized measurements.
+        handleVectors(payload): Classifies the packed measurement vectors of a binary classify frame.
+        handleInput(argument): Processes 'input' commands to store and normalize client-provided values.
+        handleBatch(payload): Processes 'batch' commands to classify many measurement rows at once.
+        handleReturn(option): Processes 'return' commands to retrieve input/output data.
         handleClassify(): Processes 'classify' commands to perform classification on provided input data.
+        finishClassify(outputs): Stores and confirms the outputs of a classification.
         handleClear(): Resets the client's inputs and outputs.
+        handleStats(): Reports the server's metrics.
+        handleReload(): Reloads the model file in the background.
+        handleProfile(argument): Opens a CPU profiling or allocation tracing window, for local clients only.
         handleClose(): Closes the connection with the client.
         handleQuit(): Ends the client's session with a quit message.
         handleShutdown(): Shuts down the server upon client request.
+        deadline(reaper, now): Returns when the session times out next, and why.
+        expire(reason): Tells the client which timeout it hit and closes the connection.
     """
 
+    # No per-session __dict__: idle sessions are the bulk of the memory of a server with many connections
+    __slots__ = (
+        "connection",
+        "address",
+        "server",
+        "shutdown_func",
+        "inputs",
+        "outputs",
+        "metrics",
+        "pending",
+        "discarding",
+        "frames",
+        "streamed",
+        "deferred",
+        "log",
+        "opened",
+        "received",
+        "partial",
+        "expired",
+    )
+
     def __init__(self, connection, address, server, shutdown_func):
-        super().__init__()
         self.connection = connection
         self.address = address
         self.server = server
         self.shutdown_func = shutdown_func
-        self.inputs = {
-            "sepallength": {"original": None, "normalized": None},
-            "sepalwidth": {"original": None, "normalized": None},
-            "petallength": {"original": None, "normalized": None},
-            "petalwidth": {"original": None, "normalized": None},
-        }
+        self.inputs = Measurements(len(self.ranges))
         self.outputs = None
-        self.model = TIris()
+        self.metrics = server.metrics
+        self.pending = b""
+        self.discarding = False
+        self.frames = None
+        self.streamed = None
+        self.deferred = None
+        self.log = log.forConnection(f"{address[0]}:{address[1]}")
+        self.opened = self.received = time.monotonic()
+        self.partial = 0.0
+        self.expired = None
 
-    def run(self):
+    @property
+    def model(self):
+        return self.server.model
+
+    @property
+    def ranges(self):
+        return modelRanges(self.server.model)
+
+    @staticmethod
+    def isComplete(message):
         """
-        Main method to handle client communication. Listens for commands, processes each command, and handles exceptions.
+        Tells whether a received text message can be dispatched. Batch messages may span several packets
+        and are only complete once terminated by a newline; every other message is complete as received.
+        receiveText() rejects a batch message that reaches MAX_BATCH_BYTES before its newline.
+
+        Parameters:
+            message (bytes): The message received so far, or a view of the receive buffer.
+
+        Returns:
+            bool: True if the message should be dispatched.
         """
-        print(f"server: got connection from client {self.address[0]}")
-        self.connection.send("Server is ready...\nWelcome to the Iris Server".encode())
+        if not ClientSession.startsWith(message, b"batch"):
+            return True
+        return message[-1:] == b"\n"
 
-        while True:
+    @staticmethod
+    def startsWith(message, name):
+        """
+        Tells whether a text message starts with a command name, ignoring case and leading whitespace. Only
+        messages whose first byte could begin the name are copied to compare them, so the check costs no
+        allocation for most commands read from the receive buffer.
+
+        Parameters:
+            message (bytes): The message, or a view of the receive buffer.
+            name (bytes): The lower-case command name.
+
+        Returns:
+            bool: True if the message starts with the name.
+        """
+        if not message:
+            return False
+        first = message[0]
+        if first in WHITESPACE:
+            message = bytes(message).lstrip()
+        elif first | 0x20 != name[0]:
+            return False
+        return bytes(message[: len(name)]).lower() == name
+
+    @staticmethod
+    def decodeCommand(message):
+        """
+        Decodes a complete text message into the command string the handlers expect.
+
+        Parameters:
+            message (bytes): The message, or a view of the receive buffer.
+
+        Returns:
+            str: The stripped, lower-case command.
+        """
+        command = str(message, "utf-8", "replace").strip()
+        # Clients usually send lower-case commands already; lower() would copy them anyway
+        return command if command.islower() else command.lower()
+
+    def receive(self, data):
+        """
+        Feeds bytes received from the client into the session. While a batched classify is in flight the
+        data is held back, so commands are still answered in order.
+
+        Parameters:
+            data (bytes): The bytes received from the client.
+
+        Returns:
+            bool: False once the connection should be closed, True otherwise.
+        """
+        self.metrics.received(len(data))
+        self.received = time.monotonic()
+        if self.deferred is not None:
+            self.deferred += data
+            return True
+        return self.process(data)
+
+    def process(self, data):
+        """
+        Dispatches received bytes. In binary mode frames are reassembled however the data was segmented;
+        streaming and text mode are handled by receiveStream() and receiveText().
+
+        Parameters:
+            data (bytes): The bytes received from the client.
+
+        Returns:
+            bool: False once the connection should be closed, True otherwise.
+        """
+        if self.frames is not None:
             try:
-                command = self.connection.recv(1024).decode().strip().lower()
-                print("================================")
-                print(f"Client: Requested to {command}")
-                print("================================")
-                if not command:
-                    break
-                # Command dispatch based on received command string
-                if command.startswith("input"):
-                    self.handleInput(command)
-                elif command.startswith("return"):
-                    self.handleReturn(command)
-                elif command == "classify":
-                    self.handleClassify()
-                elif command == "clear":
-                    self.handleClear()
-                elif command == "close":
-                    self.handleClose()
-                    break
-                elif command == "shutdown":
-                    self.handleShutdown()
-                    break
-                elif command == "quit":
-                    self.handleQuit()
-                    break
-                else:
-                    self.connection.send("400 Command not valid.\n".encode())
-            except ConnectionResetError:
-                print(
-                    f"Client {self.address[0]} disconnected unexpectedly (ConnectionResetError)."
-                )
+                frames = self.frames.feed(data)
+            except ProtocolError as err:
+                self.reply(f"400 Error: {err}.\n")
+                return False
+            for opcode, payload in frames:
+                if not self.handleFrame(opcode, payload):
+                    return False
+            if self.frames is None or not self.frames.pending():
+                self.partial = 0.0
+            elif not self.partial:
+                self.partial = self.received
+            return True
+
+        if self.streamed is not None:
+            return self.receiveStream(data)
+        return self.receiveText(data)
+
+    def receiveText(self, data):
+        """
+        Feeds bytes received in text mode. Every received message is one command; batch messages are
+        gathered until complete. A batch message that grows past MAX_BATCH_BYTES is rejected and the rest of
+        it, up to its newline, discarded, so no part of it is run as a batch or as other commands.
+
+        Parameters:
+            data (bytes): The bytes received from the client, or a view of the receive buffer.
+
+        Returns:
+            bool: False once the connection should be closed, True otherwise.
+        """
+        if self.discarding:
+            end = bytes(data).find(b"\n")
+            if end < 0:
+                return True
+            self.discarding = False
+            self.partial = 0.0
+            data = data[end + 1 :]
+            if not data:
+                return True
+        # A message that fits in one read is parsed straight from the receive buffer
+        message = self.pending + data if self.pending else data
+        if not self.isComplete(message):
+            if len(message) >= MAX_BATCH_BYTES:
+                self.log.warning("batch message exceeds %d bytes", MAX_BATCH_BYTES)
+                self.reply("400 Error: Batch message too large.\n")
+                self.pending = b""
+                self.discarding = True
+                return True
+            # Copied out, as the receive buffer is overwritten by the next read
+            self.pending = bytes(message)
+            if not self.partial:
+                self.partial = self.received
+            return True
+        self.partial = 0.0
+        self.pending = b""
+        if self.startsWith(message, b"stream"):
+            # Rows sent right behind the 'stream' command belong to the stream, not to the command
+            message, _, rows = bytes(message).partition(b"\n")
+            keepOpen = self.handleCommand(self.decodeCommand(message))
+            if keepOpen and rows and self.streamed is not None:
+                return self.receiveStream(rows)
+            return keepOpen
+        return self.handleCommand(self.decodeCommand(message))
+
+    def receiveStream(self, data):
+        """
+        Feeds bytes received in streaming mode. Every complete line is a row '<tag> <measurements>'; all the
+        complete lines of one read are classified in a single recall and answered at once, tag first, in
+        order, while the client keeps sending. A line 'end' leaves streaming mode. Flow control is TCP's:
+        a client that stops reading makes the server's send block (or, with asyncio, pauses reading), so
+        the server stops reading the client's rows in turn and neither side buffers without bound.
+
+        Parameters:
+            data (bytes): The bytes received from the client.
+
+        Returns:
+            bool: False once the connection should be closed, True otherwise.
+        """
+        started = time.perf_counter()
+        buffered = self.pending + data
+        end = buffered.rfind(b"\n") + 1
+        lines, self.pending = buffered[:end].split(b"\n"), buffered[end:]
+        if len(self.pending) > MAX_STREAM_LINE:
+            self.reply("400 Error: Stream line too long.\n")
+            return False
+        if not self.pending:
+            self.partial = 0.0
+        elif not self.partial:
+            self.partial = self.received
+
+        ranges = self.ranges
+        rows = []
+        vectors = []
+        rest = None
+        for index, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+            if line.lower() == b"end":
+                rest = b"\n".join(lines[index + 1 :]) + self.pending
                 break
-        self.connection.close()
-        print(f"Connection with client {self.address[0]} closed.")
+            tag, vector = self.formatStreamLine(line, ranges)
+            if isinstance(vector, str):
+                rows.append((tag, vector))
+                continue
+            rows.append((tag, len(vectors)))
+            vectors.append(vector)
+
+        if rows:
+            outputs = self.recallMany(vectors)
+            results = []
+            for tag, result in rows:
+                if isinstance(result, str):
+                    results.append(f"{tag} {result}")
+                    continue
+                output = outputs[result]
+                probabilities = " ".join(
+                    f"{SPECIES_LABELS[i]} {output[i]:.5f}"
+                    for i in range(len(SPECIES_LABELS))
+                )
+                results.append(
+                    f"{tag} {probabilities} {SPECIES_NAMES[output.index(max(output))]}"
+                )
+            self.streamed += len(rows)
+            self.reply("\n".join(results) + "\n")
+            self.metrics.record("rows", time.perf_counter() - started)
+
+        if rest is None:
+            return True
+        self.log.info("left streaming mode after %d rows", self.streamed)
+        self.reply(f"200 OK end {self.streamed}\n")
+        self.streamed = None
+        self.pending = b""
+        self.partial = 0.0
+        if rest.strip():
+            return self.receiveText(rest)
+        return True
+
+    def reply(self, text):
+        """
+        Sends a text response to the client, wrapped in a frame when the binary protocol is in use.
+
+        Parameters:
+            text (str): The response text.
+        """
+        data = text.encode()
+        if self.frames is not None:
+            data = encodeFrame(OP_TEXT, data)
+        self.send(data)
+
+    def send(self, data):
+        """
+        Sends raw bytes to the client and counts them.
+
+        Parameters:
+            data (bytes): The bytes to send.
+        """
+        self.connection.sendall(data)
+        self.metrics.sent(len(data))
+
+    def recallMany(self, vectors):
+        """
+        Runs the model on several normalized input vectors at once.
+
+        Parameters:
+            vectors (list): Normalized input vectors.
+
+        Returns:
+            list: The output list of each vector.
+        """
+        return recallVectors(self.model, vectors, self.metrics)
+
+    def handleCommand(self, command):
+        """
+        Splits a complete command into its name and argument, dispatches it, and records its latency under
+        the command name.
+
+        Parameters:
+            command (str): The stripped, lower-case command string received from the client.
+
+        Returns:
+            bool: False once the connection should be closed, True otherwise.
+        """
+        self.log.debug("requested %s", command)
+        if not command:
+            return False
+        started = time.perf_counter()
+        name, *argument = command.split(maxsplit=1)
+        keepOpen, name = self.dispatchCommand(name, argument[0] if argument else "")
+        self.metrics.record(name, time.perf_counter() - started)
+        return keepOpen
+
+    def dispatchCommand(self, name, argument):
+        """
+        Dispatches a command to its handler through COMMAND_TABLE.
+
+        Parameters:
+            name (str): The command name.
+            argument (str): The rest of the command, or "".
+
+        Returns:
+            tuple: (False once the connection should be closed, True otherwise; the name the command is
+            recorded under).
+        """
+        entry = COMMAND_TABLE.get(name)
+        if entry is None or (argument and not entry[1]):
+            self.reply("400 Command not valid.\n")
+            return True, "invalid"
+        handler, takesArgument, keepOpen = entry
+        if takesArgument:
+            handler(self, argument)
+        else:
+            handler(self)
+        return keepOpen, name
+
+    def handleFrame(self, opcode, payload):
+        """
+        Dispatches a complete frame received over the binary protocol.
+
+        Parameters:
+            opcode (int): The frame type.
+            payload (bytes): The frame body.
+
+        Returns:
+            bool: False once the connection should be closed, True otherwise.
+        """
+        if opcode == OP_COMMAND:
+            return self.handleCommand(self.decodeCommand(payload))
+        if opcode == OP_CLASSIFY:
+            started = time.perf_counter()
+            try:
+                self.handleVectors(payload)
+            except ProtocolError as err:
+                self.reply(f"400 Error: {err}.\n")
+            self.metrics.record("vectors", time.perf_counter() - started)
+            return True
+        self.reply("400 Error: Unknown frame type.\n")
+        return True
+
+    def handleProtocol(self, option):
+        """
+        Processes 'protocol' commands. 'protocol binary' switches the connection to length-prefixed frames
+        after the confirmation; 'protocol text' switches back after the confirmation.
 
-    def handleInput(self, command):
+        Parameters:
+            option (str): The argument of the command.
+        """
+        if option == "binary":
+            self.reply("200 OK binary")
+            if self.frames is None:
+                self.frames = FrameReader()
+        elif option == "text":
+            self.reply("200 OK text")
+            self.frames = None
+        else:
+            self.reply("400 Error: Unsupported protocol.\n")
+
+    def handleStream(self):
+        """
+        Switches the connection to streaming mode, from the text protocol only. From then on the client sends
+        newline-terminated rows '<tag> <measurements>' without waiting, and gets back one line
+        '<tag> <probabilities> <species>' or '<tag> 400 Error: ...' per row as soon as it is classified,
+        until it sends the line 'end'.
+        """
+        if self.frames is not None:
+            self.reply("400 Error: Streaming requires the text protocol.\n")
+            return
+        self.streamed = 0
+        self.log.info("entered streaming mode")
+        self.reply("200 OK stream\n")
+
+    @staticmethod
+    def formatStreamLine(line, ranges):
+        """
+        Parses one row received in streaming mode.
+
+        Parameters:
+            line (bytes): The row without its newline: a tag, then the measurements separated by commas or spaces.
+            ranges (dict): The measurement ranges of the model.
+
+        Returns:
+            tuple: (tag, normalized measurements), or (tag, error message) if the row is invalid.
+        """
+        tag, _, values = line.decode(errors="replace").partition(" ")
+        values = values.replace(",", " ").split()
+        if len(values) != len(ranges):
+            return tag, "400 Error: Invalid input format."
+        try:
+            values = [float(value) for value in values]
+        except ValueError:
+            return tag, "400 Error: Invalid value format."
+        normalized = normalizeMeasurements(values, ranges)
+        if normalized is None:
+            return tag, "400 Error: Value out of range."
+        return tag, normalized
+
+    def handleVectors(self, payload):
+        """
+        Classifies the packed float32 measurement vectors of an OP_CLASSIFY frame and answers with one
+        OP_RESULT record per vector. Each vector holds one value per input of the current model; a frame
+        that is not a whole number of such vectors is rejected. Each float32 value is read back as the
+        shortest decimal that rounds to the same float32, so values typed with up to six significant digits
+        are validated and normalized exactly like the same values sent as text.
+
+        Parameters:
+            payload (bytes): The frame body holding the packed measurements.
+        """
+        ranges = self.ranges
+        rows = unpackMeasurements(payload, len(ranges))
+        vectors = []
+        for row in rows:
+            vectors.append(
+                normalizeMeasurements([float32Decimal(v) for v in row], ranges)
+            )
+        outputs = iter(self.recallMany([v for v in vectors if v is not None]))
+
+        records = []
+        for vector in vectors:
+            if vector is None:
+                records.append((STATUS_OUT_OF_RANGE, 0, (0.0, 0.0, 0.0)))
+                continue
+            output = next(outputs)
+            records.append((STATUS_OK, output.index(max(output)), output))
+        self.log.debug("classified %d binary vectors", len(rows))
+        self.send(encodeFrame(OP_RESULT, packResults(records)))
+
+    def handleInput(self, argument):
         """
         Processes 'input' commands to receive a value for a specific variable, normalize it, and store it.
 
         Parameters:
-            command (str): The command string received from the client.
+            argument (str): The argument of the command, '<variable> <value>'.
         """
         try:
-            _, var_name, value_str = command.split(maxsplit=2)
-            if var_name not in VARIABLE_RANGES:
-                self.connection.send("400 Error: Invalid variable name.\n".encode())
+            var_name, value_str = argument.split(maxsplit=1)
+            model = self.model
+            position = modelPositions(model).get(var_name)
+            if position is None:
+                self.reply("400 Error: Invalid variable name.\n")
                 return
 
             try:
                 value = float(value_str)
-                min_val, max_val = VARIABLE_RANGES[var_name]
+                min_val, max_val = modelRanges(model)[var_name]
                 if min_val <= value <= max_val:
                     normalized_value = (value - min_val) / (max_val - min_val)
-                    self.inputs[var_name] = {
-                        "original": value,
-                        "normalized": normalized_value,
-                    }
-                    self.connection.send("OK".encode())
-                    print(f"Server: {var_name} - {value} - {normalized_value:.4f}")
+                    self.inputs.set(position, value, normalized_value)
+                    self.reply("OK")
+                    self.log.debug(
+                        "input %s %s normalized %.4f", var_name, value, normalized_value
+                    )
                 else:
-                    self.connection.send("400 Error: Value out of range.\n".encode())
+                    self.reply("400 Error: Value out of range.\n")
             except ValueError:
-                self.connection.send("400 Error: Invalid value format.\n".encode())
+                self.reply("400 Error: Invalid value format.\n")
 
         except ValueError:
-            self.connection.send("400 Error: Invalid input format.\n".encode())
+            self.reply("400 Error: Invalid input format.\n")
 
-    def handleReturn(self, command):
+    def handleBatch(self, payload):
+        """
+        Processes 'batch' commands of the form 'batch <row>;<row>;...' where each row holds the four
+        measurements 'sepallength,sepalwidth,petallength,petalwidth'. Every row is validated against
+        the model's ranges and all valid rows are classified in a single recall. The response starts with
+        '200 OK <count>' followed by one line per row with its probabilities and class, or an error.
+
+        Parameters:
+            payload (str): The argument of the command, the rows.
+        """
+        if not payload:
+            self.reply("400 Error: Invalid batch format.\n")
+            return
+
+        rows = [row for row in payload.split(";") if row.strip()]
+        ranges = self.ranges
+        results = []
+        vectors = []
+        for row in rows:
+            values = row.replace(",", " ").split()
+            if len(values) != len(ranges):
+                results.append("400 Error: Invalid input format.")
+                continue
+            try:
+                values = [float(value) for value in values]
+            except ValueError:
+                results.append("400 Error: Invalid value format.")
+                continue
+            normalized = normalizeMeasurements(values, ranges)
+            if normalized is None:
+                results.append("400 Error: Value out of range.")
+                continue
+            results.append(len(vectors))
+            vectors.append(normalized)
+
+        outputs = self.recallMany(vectors)
+        lines = [f"200 OK {len(results)}"]
+        for result in results:
+            if isinstance(result, str):
+                lines.append(result)
+                continue
+            output = outputs[result]
+            probabilities = " ".join(
+                f"{SPECIES_LABELS[i]} {output[i]:.5f}"
+                for i in range(len(SPECIES_LABELS))
+            )
+            lines.append(f"{probabilities} {SPECIES_NAMES[output.index(max(output))]}")
+        self.log.debug("classified batch of %d/%d rows", len(vectors), len(results))
+        self.reply("\n".join(lines) + "\n")
+
+    def handleReturn(self, option):
         """
         Processes 'return' commands to provide input/output data to the client.
 
         Parameters:
-            command (str): The command string received from the client.
+            option (str): The argument of the command: 'inputs', 'outputs' or 'class'.
         """
-        try:
-            _, option = command.split(maxsplit=1)
-            if option == "inputs":
-                response = self.formatInputs()
-            elif option == "outputs":
-                response = self.formatOutputs()
-            elif option == "class":
-                response = self.classifyIris()
-            else:
-                response = "400 Error: Invalid return option.\n"
-            self.connection.send(response.encode())
-        except ValueError:
-            self.connection.send("400 Error: Invalid return command format.\n".encode())
+        if not option:
+            self.reply("400 Error: Invalid return command format.\n")
+            return
+        if option == "inputs":
+            response = self.formatInputs()
+        elif option == "outputs":
+            response = self.formatOutputs()
+        elif option == "class":
+            response = self.classifyIris()
+        else:
+            response = "400 Error: Invalid return option.\n"
+        self.reply(response)
 
     def handleClassify(self):
         """
         Classifies the Iris flower based on the normalized input data provided by the client.
         """
-        input_vector = [self.inputs[var]["normalized"] for var in self.inputs]
-        if any(v is None for v in input_vector):
-            self.connection.send(
-                "400 Error: Insufficient input values for classification.\n".encode()
-            )
+        input_vector = self.inputs.vector()
+        if input_vector is None:
+            self.reply("400 Error: Insufficient input values for classification.\n")
             return
 
-        self.outputs = self.model.Recall(input_vector)
-        print("classified output:", self.outputs)
-        self.connection.send("Classification complete".encode())
+        batcher = self.server.batcher
+        if batcher is not None:
+            # The asyncio batcher answers later, from the event loop; until then received data waits
+            self.deferred = b""
+            batcher.submit(self.model, input_vector, self.finishClassify)
+            return
+        started = time.perf_counter()
+        outputs = self.server.cache.recall(self.model, input_vector)
+        self.metrics.recordRecall(time.perf_counter() - started)
+        self.finishClassify(outputs)
+
+    def finishClassify(self, outputs):
+        """
+        Stores the outputs of a classification and confirms it to the client, then processes any data held
+        back while a batched classification was in flight.
+
+        Parameters:
+            outputs (list): The model outputs, or None if the batched recall failed.
+        """
+        deferred, self.deferred = self.deferred, None
+        if outputs is None:
+            self.reply("500 Error: Classification failed.\n")
+        else:
+            self.outputs = outputs
+            self.log.debug("classified output %s", self.outputs)
+            self.reply("Classification complete")
+        if deferred and not self.process(deferred):
+            self.connection.close()
 
     def handleClear(self):
         """
-        Clears all inputs and outputs for the current client session.
+        Clears all inputs and outputs for the current client session, in place.
         """
-        self.inputs = {
-            key: {"original": None, "normalized": None} for key in self.inputs
-        }
+        self.inputs.clear()
         self.outputs = None
-        self.connection.send("All input and output values have been cleared.".encode())
-        print("Server: Cleared all inputs and outputs for the client.")
+        self.reply("All input and output values have been cleared.")
+        self.log.debug("cleared all inputs and outputs")
+
+    def handleStats(self):
+        """
+        Reports the server's command counters, latency histograms, connection and byte counts,
+        model recall time, result cache counters and worker pool counters, one statistic per line.
+        The first line announces how many statistic lines follow, as for a batch.
+        """
+        text = self.metrics.format(self.server.stats())
+        lines = text.count("\n") + 1
+        self.reply(f"200 OK stats {lines}\n{text}\n")
+
+    def handleReload(self):
+        """
+        Starts reloading the server's model file in the background. The model in use is replaced only if
+        the new one loads and validates; 'stats' reports the outcome.
+        """
+        started = self.server.requestReload()
+        if started is None:
+            self.reply("400 Error: No model file to reload.\n")
+        elif started:
+            self.reply("200 OK reload started")
+        else:
+            self.reply("200 OK reload in progress")
+
+    def handleProfile(self, argument):
+        """
+        Processes 'profile cpu|memory|all [seconds]' commands: opens a window during which the server's
+        threads are sampled, its allocations traced, or both, and replies with the report files that will be
+        written when it closes. Profiling reads the stacks of every connection, so it is only accepted from
+        clients on the loopback interface.
+
+        Parameters:
+            argument (str): The kind of window and its optional length in seconds.
+        """
+        try:
+            local = ipaddress.ip_address(self.address[0]).is_loopback
+        except (TypeError, ValueError, IndexError):
+            local = False
+        if not local:
+            self.log.warning("profile command refused to a remote client")
+            self.reply("403 Error: Profiling is restricted to local clients.\n")
+            return
+        parts = argument.split()
+        if not parts or parts[0] not in ("cpu", "memory", "all") or len(parts) > 2:
+            self.reply("400 Error: Usage: profile cpu|memory|all [seconds].\n")
+            return
+        try:
+            duration = float(parts[1]) if len(parts) > 1 else None
+        except ValueError:
+            duration = 0.0
+        if duration is not None and not 0 < duration <= 3600:
+            self.reply("400 Error: Invalid profiling window.\n")
+            return
+        paths = self.server.requestProfile(parts[0], duration)
+        if paths is None:
+            self.reply("400 Error: Profiling is disabled.\n")
+        elif paths:
+            self.reply("200 OK profile " + " ".join(paths))
+        else:
+            self.reply("200 OK profile in progress")
 
     def formatInputs(self):
         """
@@ -205,10 +1161,11 @@ class ClientHandler(threading.Thread):
         Returns:
             str: A formatted string with each variable's original value.
         """
-        inputs_set = {k: v for k, v in self.inputs.items() if v["original"] is not None}
+        inputs_set = self.inputs.entered()
         if not inputs_set:
             return "400 Error: No input values set.\n"
-        return " ".join([f"{k} {v['original']}" for k, v in inputs_set.items()])
+        names = list(self.ranges)
+        return " ".join([f"{names[index]} {value}" for index, value in inputs_set])
 
     def formatOutputs(self):
         """
@@ -219,9 +1176,11 @@ class ClientHandler(threading.Thread):
         """
         if not self.outputs:
             return "400 Error: No output values set.\n"
-        species = ["IrisSetosa", "IrisVersicolor", "IrisVirginica"]
         return " ".join(
-            [f"{species[i]} {self.outputs[i]:.5f}" for i in range(len(species))]
+            [
+                f"{SPECIES_LABELS[i]} {self.outputs[i]:.5f}"
+                for i in range(len(SPECIES_LABELS))
+            ]
         )
 
     def classifyIris(self):
@@ -233,38 +1192,293 @@ class ClientHandler(threading.Thread):
         """
         if not self.outputs:
             return "400 Error: No output values set.\n"
-        species = ["Iris setosa", "Iris versicolor", "Iris virginica"]
-        classification = species[self.outputs.index(max(self.outputs))]
-        print(f"Classification: {classification}")
+        classification = SPECIES_NAMES[self.outputs.index(max(self.outputs))]
+        self.log.debug("classification %s", classification)
         return f"Classification: {classification}"
 
     def handleClose(self):
         """
         Ends the client connection by resetting inputs/outputs and notifying the client.
         """
-        print(f"{self.address[0]} requested to close connection.")
-        self.inputs = {
-            key: {"original": None, "normalized": None} for key in self.inputs
-        }
+        self.log.info("requested to close connection")
+        self.inputs.clear()
         self.outputs = None
-        self.connection.send("200 OK".encode())
+        self.reply("200 OK")
 
     def handleQuit(self):
         """
         Disconnects the client from the server with a confirmation message.
         """
-        print(f"{self.address[0]} requested to quit. Closing connection.")
-        self.connection.send("200 OK\nConnection closed.".encode())
+        self.log.info("requested to quit")
+        self.reply("200 OK\nConnection closed.")
 
     def handleShutdown(self):
         """
         Shuts down the server, closing all connections and notifying clients.
         """
-        self.connection.send("200 OK\nServer is shutting down...\n".encode())
-        print("Shutdown command received. Server is shutting down.")
+        self.reply("200 OK\nServer is shutting down...\n")
+        self.log.warning("shutdown command received, server is shutting down")
         self.shutdown_func()
         self.connection.close()
 
+    def deadline(self, reaper, now):
+        """
+        Returns the earliest time at which one of the reaper's timeouts closes the session.
+
+        Parameters:
+            reaper (ConnectionReaper): The timeouts in force.
+            now (float): The current time.monotonic() value.
+
+        Returns:
+            tuple: (deadline, timeout name), or (time of the next check, None) when the only timeout left
+            is the read timeout and no message is in progress.
+        """
+        deadline, reason = math.inf, None
+        if reaper.idle:
+            deadline, reason = self.received + reaper.idle, "idle"
+        if reaper.read:
+            if self.partial:
+                candidate = (self.partial + reaper.read, "read")
+            else:
+                candidate = (now + reaper.read, None)
+            if candidate[0] < deadline:
+                deadline, reason = candidate
+        if reaper.lifetime and self.opened + reaper.lifetime < deadline:
+            deadline, reason = self.opened + reaper.lifetime, "lifetime"
+        return deadline, reason
+
+    def expire(self, reason):
+        """
+        Tells the client which timeout it hit and closes the connection. Called by the reaper, on the event
+        loop for asyncio sessions, whose writes never block.
+
+        Parameters:
+            reason (str): The timeout, "idle", "read" or "lifetime".
+        """
+        self.expired = reason
+        self.reply(TIMEOUT_MESSAGE.format(reason))
+        self.connection.close()
+
+
+# Handler of every text command, whether it takes an argument, and whether the connection stays open after it
+COMMAND_TABLE = {
+    "input": (ClientSession.handleInput, True, True),
+    "batch": (ClientSession.handleBatch, True, True),
+    "protocol": (ClientSession.handleProtocol, True, True),
+    "return": (ClientSession.handleReturn, True, True),
+    "classify": (ClientSession.handleClassify, False, True),
+    "clear": (ClientSession.handleClear, False, True),
+    "stats": (ClientSession.handleStats, False, True),
+    "reload": (ClientSession.handleReload, False, True),
+    "profile": (ClientSession.handleProfile, True, True),
+    "stream": (ClientSession.handleStream, False, True),
+    "close": (ClientSession.handleClose, False, False),
+    "shutdown": (ClientSession.handleShutdown, False, False),
+    "quit": (ClientSession.handleQuit, False, False),
+}
+
+
+class BlockingSession(ClientSession):
+    """
+    Serves one client connection with a blocking receive loop on the calling thread. The worker pool runs
+    these directly, so a pooled connection costs no Thread object.
+
+    Methods:
+        serve(): Listens for commands from the client and delegates processing to specific handlers.
+        expire(reason): Wakes the serving thread so it closes the connection that timed out.
+    """
+
+    __slots__ = ()
+
+    def serve(self):
+        """
+        Main method to handle client communication. Listens for commands, processes each command, and handles exceptions.
+        """
+        self.log.info("connection opened")
+        self.metrics.connectionOpened()
+        reaper = self.server.reaper
+        if reaper is not None:
+            reaper.track(self)
+        self.reply(WELCOME_MESSAGE)
+
+        buffer = receiveBuffer()
+        while True:
+            try:
+                count = self.connection.recv_into(buffer)
+                if not count or not self.receive(buffer[:count]):
+                    break
+            except ConnectionResetError:
+                self.log.warning("disconnected unexpectedly (ConnectionResetError)")
+                break
+        if reaper is not None:
+            reaper.forget(self)
+        if self.expired:
+            try:
+                self.connection.settimeout(SEND_TIMEOUT)
+                self.reply(TIMEOUT_MESSAGE.format(self.expired))
+            except OSError:
+                pass
+        self.connection.close()
+        self.metrics.connectionClosed()
+        self.metrics.retire()
+        self.log.info("connection closed")
+
+    def expire(self, reason):
+        """
+        Called by the reaper thread while the serving thread may be blocked in recv(). Shutting the read side
+        down makes recv() return, and the serving thread then sends the timeout response and closes.
+
+        Parameters:
+            reason (str): The timeout, "idle", "read" or "lifetime".
+        """
+        self.expired = reason
+        self.connection.shutdown(socket.SHUT_RD)
+
+
+class ClientHandler(BlockingSession, threading.Thread):
+    """
+    Thread-based handler serving one client connection on a thread of its own.
+
+    Methods:
+        run(): Serves the connection on the handler's own thread.
+    """
+
+    def __init__(self, connection, address, server, shutdown_func):
+        threading.Thread.__init__(self)
+        ClientSession.__init__(self, connection, address, server, shutdown_func)
+
+    def run(self):
+        """
+        Serves the connection when the handler is started as a thread.
+        """
+        self.serve()
+
+
+class WorkerPool:
+    """
+    Fixed set of threads serving client connections, with a bounded number of accepted connections waiting
+    for a free thread. A connection that cannot be admitted is told the server is busy and closed at once,
+    so an overload costs a short response instead of a thread and its memory.
+
+    Attributes:
+        server (Server): The server whose connections are served.
+        workers (int): Number of serving threads.
+        queueSize (int): Maximum number of accepted connections waiting for a free thread.
+        queue (queue.Queue): Accepted connections waiting for a thread.
+        busy (int): Number of threads currently serving a connection.
+        admitted (int): Number of connections admitted and not finished yet, queued or being served.
+        peakQueued (int): Largest number of connections that have waited at once.
+        accepted (int): Number of connections admitted so far.
+        rejected (int): Number of connections turned away as busy so far.
+
+    Methods:
+        start(): Starts the serving threads.
+        submit(connection, address): Admits a connection, or rejects it when the pool is saturated.
+        work(): Body of a serving thread.
+        stats(): Returns the pool counters.
+        stop(): Stops the serving threads once they finish their current connection.
+    """
+
+    def __init__(self, server, workers, queueSize=DEFAULT_QUEUE_SIZE):
+        self.server = server
+        self.workers = workers
+        self.queueSize = queueSize
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.busy = 0
+        self.admitted = 0
+        self.peakQueued = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    def start(self):
+        """
+        Starts the serving threads.
+        """
+        for index in range(self.workers):
+            threading.Thread(
+                target=self.work, name=f"worker-{index}", daemon=True
+            ).start()
+
+    def submit(self, connection, address):
+        """
+        Admits an accepted connection if a thread or a queue slot is free; otherwise answers that the
+        server is busy and closes the connection.
+
+        Parameters:
+            connection (socket.socket): The accepted connection.
+            address (tuple): The client's address (IP, port).
+
+        Returns:
+            bool: True if the connection was admitted.
+        """
+        with self.lock:
+            admit = self.admitted < self.workers + self.queueSize
+            if admit:
+                self.admitted += 1
+                self.accepted += 1
+                self.peakQueued = max(self.peakQueued, self.admitted - self.workers)
+            else:
+                self.rejected += 1
+        if admit:
+            self.queue.put((connection, address))
+            return True
+        try:
+            connection.sendall(BUSY_MESSAGE.encode())
+        except OSError:
+            pass
+        connection.close()
+        log.warning("rejected connection from %s:%s, server busy", *address[:2])
+        return False
+
+    def work(self):
+        """
+        Body of a serving thread: serves queued connections one after the other until stopped.
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            connection, address = item
+            with self.lock:
+                self.busy += 1
+            try:
+                BlockingSession(
+                    connection, address, self.server, self.server.shutdownServer
+                ).serve()
+            except Exception as err:
+                log.error("worker failed serving %s:%s: %r", *address[:2], err)
+                connection.close()
+            finally:
+                with self.lock:
+                    self.busy -= 1
+                    self.admitted -= 1
+
+    def stats(self):
+        """
+        Returns the pool counters reported by 'stats'.
+
+        Returns:
+            dict: Workers, busy workers, queued connections, peak queue depth, admitted and rejected connections.
+        """
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queued": max(self.admitted - self.busy, 0),
+                "queue_size": self.queueSize,
+                "queue_peak": self.peakQueued,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+            }
+
+    def stop(self):
+        """
+        Asks every serving thread to exit once it has finished its current connection.
+        """
+        for _ in range(self.workers):
+            self.queue.put(None)
+
 
 class Server:
     """
@@ -274,69 +1488,482 @@ class Server:
         host (str): The server's hostname or IP address.
         port (int): The server's port number.
         server_socket (socket.socket): The main server socket for listening to incoming connections.
+        model (TCompiledIris): The immutable classification model shared by every client handler, swapped on reload.
+        cache (ResultCache): The classification results shared by every client handler.
+        metrics (Metrics): Counters and latency histograms recorded by every client handler.
+        listener (socket.socket): An already listening socket to accept from instead of binding one, or None.
+        reusePort (bool): Whether the bound socket sets SO_REUSEPORT, so several processes can share the port.
+        pool (WorkerPool): The fixed pool serving the connections, or None for one thread per connection.
+        reloader (ModelReloader): Reloads the model from its file without a restart, or None.
+        reaper (ConnectionReaper): Closes connections that time out, or None if no timeout is set.
+        keepalive (tuple): (idle, interval, count) TCP keepalive settings of accepted connections, or None.
+        http (HttpFrontend): The HTTP/JSON frontend served next to the TCP listener, or None.
+        batcher (ThreadBatcher): Runs the classify requests of concurrent sessions in shared batches, or None.
+        profiler (Profiler): Profiles the server for a window on demand, or None if profiling is disabled.
+        stopping (bool): True once stop() has been called.
 
     Methods:
         start(): Binds the socket, starts listening for incoming connections, and creates a new ClientHandler for each connection.
+        stats(): Returns the counter groups reported by 'stats' next to the metrics.
+        requestReload(): Starts reloading the model file in the background.
+        requestProfile(kind, duration): Opens a profiling window in the background.
         shutdownServer(): Closes the server socket and stops accepting new connections.
         stop(): Stops the server.
     """
 
-    def __init__(self, host, port):
+    def __init__(
+        self,
+        host,
+        port,
+        model=None,
+        cache=None,
+        listener=None,
+        reusePort=False,
+        workers=0,
+        queueSize=DEFAULT_QUEUE_SIZE,
+    ):
         self.host = host
         self.port = port
         self.server_socket = None
+        self.model = model if model is not None else loadDefaultModel()
+        self.cache = cache if cache is not None else ResultCache()
+        self.metrics = Metrics()
+        self.listener = listener
+        self.reusePort = reusePort
+        self.pool = WorkerPool(self, workers, queueSize) if workers > 0 else None
+        self.reloader = None
+        self.reaper = None
+        self.keepalive = None
+        self.http = None
+        self.batcher = None
+        self.profiler = None
+        self.stopping = False
 
     def start(self):
         """
         Starts the server, binds the host and port, and listens for incoming connections.
-        Each client connection is handled in a separate thread.
+        Each client connection is handled in a separate thread, or handed to the worker pool if there is one.
         """
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen()
-        print("\n===============================================")
-        print(f"Server started on {self.host}:{self.port}")
-        print("Waiting for connections...")
-        print("===============================================\n")
+        if self.listener is not None:
+            self.server_socket = self.listener
+            self.server_socket.settimeout(ACCEPT_TIMEOUT)
+        else:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reusePort:
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen()
+        log.info(
+            "server started on %s:%s, waiting for connections", self.host, self.port
+        )
+        if self.pool is not None:
+            self.pool.start()
+        if self.reaper is not None:
+            self.reaper.start()
 
         while True:
             try:
                 connection, address = self.server_socket.accept()
+                if self.keepalive is not None:
+                    setKeepalive(connection, *self.keepalive)
+                if self.pool is not None:
+                    self.pool.submit(connection, address)
+                    continue
                 client_handler = ClientHandler(
                     connection, address, self, self.shutdownServer
                 )
                 client_handler.start()
+            except TimeoutError:
+                if self.stopping:
+                    break
             except OSError:
                 break
-        print("Server has been shut down.")
+        if self.listener is not None:
+            # Only this process's descriptor is closed; the other processes keep accepting
+            self.server_socket.close()
+        if self.pool is not None:
+            self.pool.stop()
+        log.info("server has been shut down")
+
+    def stats(self):
+        """
+        Returns the counter groups reported by 'stats' next to the metrics.
+
+        Returns:
+            dict: The result cache counters and, when present, the worker pool, model reload, timeout, batching
+            and profiling counters.
+        """
+        groups = {"cache": self.cache.stats()}
+        if self.pool is not None:
+            groups["pool"] = self.pool.stats()
+        if self.reloader is not None:
+            groups["model"] = self.reloader.stats()
+        if self.reaper is not None:
+            groups["timeouts"] = self.reaper.stats()
+        if self.batcher is not None:
+            groups["batching"] = self.batcher.stats()
+        if self.profiler is not None:
+            groups["profiling"] = self.profiler.stats()
+        return groups
+
+    def requestReload(self):
+        """
+        Starts reloading the model file in the background.
+
+        Returns:
+            bool: Whether a reload was started (False if one is running), or None without a model file.
+        """
+        if self.reloader is None:
+            return None
+        return self.reloader.request()
+
+    def requestProfile(self, kind, duration=None):
+        """
+        Opens a CPU profiling or allocation tracing window in the background.
+
+        Parameters:
+            kind (str): "cpu", "memory", or "all" for both.
+            duration (float): Length of the window in seconds, or None for the configured length.
+
+        Returns:
+            list: The report files of the windows opened (empty if they are all open already), or None if
+            profiling is disabled.
+        """
+        if self.profiler is None:
+            return None
+        return self.profiler.start(kind, duration)
 
     def shutdownServer(self):
         """
         Initiates server shutdown by closing the main socket and stopping connections.
         """
-        print("Shutting down the server...")
-        if self.server_socket:
-            self.server_socket.close()
+        log.info("shutting down the server")
+        self.stop()
 
     def stop(self):
         """
-        Stops the server by closing the server socket.
+        Stops the server by shutting down and closing the server socket. Closing alone does not wake a
+        thread blocked in accept() on Linux, while shutting the socket down does. An inherited socket is
+        shared with the other worker processes, where a shutdown would stop accepting too, so it is left
+        open and closed by start() once its accept() times out.
         """
-        if self.server_socket:
+        self.stopping = True
+        if self.reloader is not None:
+            self.reloader.stop()
+        if self.reaper is not None:
+            self.reaper.stop()
+        if self.http is not None:
+            self.http.stop()
+        if self.server_socket and self.listener is None:
+            try:
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.server_socket.close()
 
 
+def parseArguments(argv=None):
+    """
+    Parses the command-line options of the server.
+
+    Parameters:
+        argv (list): Arguments to parse, defaulting to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed options.
+    """
+    parser = argparse.ArgumentParser(description="Iris classification server")
+    parser.add_argument("--host", default=socket.gethostname(), help="address to bind")
+    parser.add_argument("--port", type=int, default=5991, help="port to listen on")
+    parser.add_argument(
+        "--mode",
+        choices=["threaded", "asyncio"],
+        default="threaded",
+        help="threaded: one thread per connection; asyncio: all connections on one event loop",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="maximum number of cached classification results (0 disables the cache)",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=0,
+        help="print the server metrics every this many seconds (0 disables the dump)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=list(LEVELS),
+        default="info",
+        help="least severe events logged; per-command events are logged at debug",
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=float,
+        default=1.0,
+        help="fraction of connections whose debug and info events are logged",
+    )
+    parser.add_argument(
+        "--model",
+        help="load the model and measurement ranges from this model file instead of the built-in network",
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=0,
+        help="with --model: check the model file every this many seconds and reload it when it changes (0 disables);"
+        " the model is then copied into memory instead of mapped, as the file may be rewritten in place",
+    )
+    parser.add_argument(
+        "--export-model",
+        metavar="PATH",
+        help="write the built-in network and its measurement ranges to a model file and exit",
+    )
+    parser.add_argument(
+        "--search",
+        choices=list(SEARCH_METHODS),
+        default="linear",
+        help="winner search of the model: linear scan, or an exact tree index for large networks",
+    )
+    parser.add_argument(
+        "--decision-table",
+        type=int,
+        default=0,
+        metavar="RESOLUTION",
+        help="answer from a table of the model's outputs precomputed over RESOLUTION cells per input "
+        "(approximate, constant time; 0 recalls the model exactly)",
+    )
+    parser.add_argument(
+        "--table-refine",
+        type=int,
+        default=0,
+        metavar="FACTOR",
+        help="with --decision-table: split the cells next to a class boundary into FACTOR sub-cells per input",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="threaded mode: serve connections on this many threads (0 starts one thread per connection)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help="with --workers: accepted connections allowed to wait for a thread before new ones are told the server is busy",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=0,
+        help="close connections that receive nothing for this many seconds (0 disables)",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=0,
+        help="close connections that take longer than this many seconds to complete a message (0 disables)",
+    )
+    parser.add_argument(
+        "--session-lifetime",
+        type=float,
+        default=0,
+        help="close connections open for longer than this many seconds (0 disables)",
+    )
+    parser.add_argument(
+        "--keepalive",
+        type=float,
+        default=0,
+        metavar="IDLE",
+        help="enable TCP keepalive, probing connections silent for IDLE seconds (0 disables)",
+    )
+    parser.add_argument(
+        "--keepalive-interval",
+        type=float,
+        default=0,
+        help="with --keepalive: seconds between probes (0 keeps the system default)",
+    )
+    parser.add_argument(
+        "--keepalive-count",
+        type=int,
+        default=0,
+        help="with --keepalive: unanswered probes before the connection is dropped (0 keeps the system default)",
+    )
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=0,
+        metavar="MICROSECONDS",
+        help="run the classify requests of all connections arriving within this window as one recall, while"
+        " concurrent requests keep the batcher busy; a request on an idle server runs at once (0 disables)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="with --batch-window: largest number of classify requests run in one recall",
+    )
+    parser.add_argument(
+        "--http-port",
+        type=int,
+        default=0,
+        help="also serve the HTTP/JSON frontend on this port (0 disables)",
+    )
+    parser.add_argument(
+        "--http-host",
+        help="with --http-port: host the HTTP frontend binds (defaults to --host)",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        help="enable the 'profile' command and SIGUSR2, writing the profiles and allocation reports here",
+    )
+    parser.add_argument(
+        "--profile-seconds",
+        type=float,
+        default=DEFAULT_DURATION,
+        help="default length of a profiling window, in seconds",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        help="run this many worker processes under a supervisor (0 serves in this process)",
+    )
+    parser.add_argument(
+        "--listen",
+        choices=["reuseport", "inherit"],
+        default="reuseport" if hasattr(socket, "SO_REUSEPORT") else "inherit",
+        help="reuseport: every worker process binds the port; inherit: workers share the supervisor's socket",
+    )
+    return parser.parse_args(argv)
+
+
+def createServer(options, listener=None, reusePort=False):
+    """
+    Builds the server engine selected on the command line.
+
+    Parameters:
+        options (argparse.Namespace): The parsed command-line options.
+        listener (socket.socket): An already listening socket for the server to accept from, or None.
+        reusePort (bool): Whether the server binds its port with SO_REUSEPORT.
+
+    Returns:
+        Server: The threaded server, or an AsyncServer exposing the same start/shutdownServer/stop methods.
+    """
+    log.configure(level=LEVELS[options.log_level], sampleRate=options.log_sample)
+    cache = ResultCache(options.cache_size)
+
+    def prepareModel(model):
+        if options.decision_table > 0:
+            return buildDecisionTable(
+                model, options.decision_table, options.table_refine
+            )
+        return model
+
+    # A watched model file is expected to change under the server, possibly written in place
+    copyModel = options.reload_interval > 0
+    if options.model:
+        model = prepareModel(loadModelFile(options.model, options.search, copyModel))
+    else:
+        model = prepareModel(loadDefaultModel(options.search))
+    if options.mode == "asyncio":
+        from aioserver import AsyncServer
+
+        server = AsyncServer(
+            options.host,
+            options.port,
+            model=model,
+            cache=cache,
+            listener=listener,
+            reusePort=reusePort,
+        )
+    else:
+        server = Server(
+            options.host,
+            options.port,
+            model=model,
+            cache=cache,
+            listener=listener,
+            reusePort=reusePort,
+            workers=options.workers,
+            queueSize=options.queue_size,
+        )
+    if options.model:
+        server.reloader = ModelReloader(
+            server,
+            options.model,
+            lambda path: prepareModel(loadModelFile(path, options.search, copyModel)),
+            options.reload_interval,
+        )
+        server.reloader.start()
+    if options.idle_timeout or options.read_timeout or options.session_lifetime:
+        server.reaper = ConnectionReaper(
+            options.idle_timeout, options.read_timeout, options.session_lifetime
+        )
+    if options.keepalive:
+        server.keepalive = (
+            options.keepalive,
+            options.keepalive_interval,
+            options.keepalive_count,
+        )
+    if options.batch_window > 0:
+        if options.mode == "asyncio":
+            from batcher import LoopBatcher as Batcher
+        else:
+            from batcher import ThreadBatcher as Batcher
+
+        server.batcher = Batcher(
+            server.cache,
+            server.metrics,
+            options.batch_window * 1e-6,
+            max(1, options.batch_size),
+        )
+    if options.http_port:
+        from httpfrontend import HttpFrontend
+
+        # Every worker process binds the HTTP port too, whatever the --listen mode of the TCP port
+        server.http = HttpFrontend(
+            server,
+            options.http_host or options.host,
+            options.http_port,
+            idleTimeout=options.idle_timeout,
+            reusePort=options.processes > 0,
+        )
+        server.http.start()
+    if options.profile_dir:
+        server.profiler = Profiler(options.profile_dir, options.profile_seconds)
+    if options.stats_interval > 0:
+        server.metrics.startDump(options.stats_interval, extra=server.stats)
+    return server
+
+
 # Entry point to run the server
 if __name__ == "__main__":
-    host = socket.gethostname()
-    port = 5991
-    server = Server(host, port)
+    options = parseArguments()
+    if options.export_model:
+        exportDefaultModel(options.export_model)
+        raise SystemExit(0)
+    if options.processes > 0:
+        from supervisor import Supervisor
+
+        server = Supervisor(options)
+    else:
+        server = createServer(options)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: server.requestReload())
+        if hasattr(signal, "SIGUSR2"):
+            signal.signal(
+                signal.SIGUSR2, lambda signum, frame: server.requestProfile("all")
+            )
     try:
         server.start()
     except KeyboardInterrupt:
-        print("\nKeyboardInterrupt detected. Shutting down the server...")
+        log.info("KeyboardInterrupt detected, shutting down the server")
         server.shutdownServer()
     finally:
         server.stop()
-        print("Server stopped.")
+        log.info("server stopped")
+        log.close()
@@ -0,0 +1,289 @@
+"""
+Non-blocking structured logging for the Iris server.
+
+Request handlers never write to the output stream themselves. A log call checks the level, and if the record is
+wanted, appends a tuple to a deque (an atomic, lock-free operation) and returns; the message is not even
+formatted. A background writer thread wakes up periodically, formats everything buffered, and writes it in one
+batched call. Below the configured level, and for connections left out by sampling, a call costs one comparison.
+
+Classes:
+    Logger: Buffered logger with levels, a bounded lock-free buffer, and a background writer thread.
+    ConnectionLogger: Logger view bound to one client connection, subject to per-connection sampling.
+
+Modules:
+    atexit: Flushes the buffered records when the interpreter exits.
+    collections: Provides the deque used as the log buffer.
+    os: Resets the logger in forked worker processes.
+    random: Decides which connections are sampled.
+    threading: Provides the writer thread.
+    time: Timestamps records.
+
+Constants:
+    DEBUG, INFO, WARNING, ERROR, OFF (int): Log levels.
+    LEVELS (dict): Log levels by name, as accepted on the command line.
+    log (Logger): The logger used by the server.
+
+"""
+
+import atexit
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class Logger:
+    """
+    Buffered logger whose output is written by a background thread in batches.
+
+    Attributes:
+        level (int): Records below this level are discarded at the call site.
+        sampleRate (float): Fraction of connections whose records below WARNING are kept.
+        stream (file): Where the writer thread writes, defaulting to sys.stdout.
+        capacity (int): Maximum number of buffered records; further records are counted as dropped.
+        flushInterval (float): Seconds between two batched writes.
+        dropped (int): Number of records discarded because the buffer was full.
+
+    Methods:
+        configure(level, sampleRate, stream): Changes the level, sampling rate or output stream.
+        isEnabledFor(level): Tells whether records of a level are kept.
+        forConnection(label): Returns a ConnectionLogger for one client connection.
+        debug/info/warning/error(message, *args, **fields): Buffers a record.
+        flush(): Formats and writes every buffered record.
+        close(): Stops the writer thread after writing everything buffered.
+        afterFork(): Resets the writer state in a forked child process.
+    """
+
+    def __init__(
+        self,
+        level=INFO,
+        sampleRate=1.0,
+        stream=None,
+        capacity=65536,
+        flushInterval=0.05,
+    ):
+        self.level = level
+        self.sampleRate = sampleRate
+        self.stream = stream
+        self.capacity = capacity
+        self.flushInterval = flushInterval
+        self.dropped = 0
+        self.buffer = deque()
+        self.writer = None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.afterFork)
+
+    def configure(self, level=None, sampleRate=None, stream=None):
+        """
+        Changes the level, the per-connection sampling rate or the output stream.
+
+        Parameters:
+            level (int): The new level.
+            sampleRate (float): The new fraction of sampled connections, between 0 and 1.
+            stream (file): The new output stream.
+        """
+        if level is not None:
+            self.level = level
+        if sampleRate is not None:
+            self.sampleRate = sampleRate
+        if stream is not None:
+            self.stream = stream
+
+    def isEnabledFor(self, level):
+        """
+        Tells whether records of the given level are kept.
+
+        Parameters:
+            level (int): The level to check.
+
+        Returns:
+            bool: True if such records are kept.
+        """
+        return level >= self.level
+
+    def forConnection(self, label):
+        """
+        Returns a logger bound to one client connection. Whether the connection is sampled is decided once,
+        here, so a sampled connection is logged completely and the others cost nothing below WARNING.
+
+        Parameters:
+            label (str): Identifies the connection in every record, e.g. 'host:port'.
+
+        Returns:
+            ConnectionLogger: The connection's logger.
+        """
+        sampled = self.sampleRate >= 1.0 or random.random() < self.sampleRate
+        return ConnectionLogger(self, label, sampled)
+
+    def emit(self, level, label, message, args, fields):
+        """
+        Buffers a record for the writer thread. The record is formatted later, on the writer thread.
+
+        Parameters:
+            level (int): The record level.
+            label (str): The connection the record belongs to, or None.
+            message (str): The message, possibly with %-style placeholders.
+            args (tuple): Values for the placeholders.
+            fields (dict): Additional key=value pairs.
+        """
+        if len(self.buffer) >= self.capacity:
+            self.dropped += 1
+            return
+        self.buffer.append((time.time(), level, label, message, args, fields))
+        if self.writer is None:
+            self.startWriter()
+
+    def debug(self, message, *args, **fields):
+        if DEBUG >= self.level:
+            self.emit(DEBUG, None, message, args, fields)
+
+    def info(self, message, *args, **fields):
+        if INFO >= self.level:
+            self.emit(INFO, None, message, args, fields)
+
+    def warning(self, message, *args, **fields):
+        if WARNING >= self.level:
+            self.emit(WARNING, None, message, args, fields)
+
+    def error(self, message, *args, **fields):
+        if ERROR >= self.level:
+            self.emit(ERROR, None, message, args, fields)
+
+    def startWriter(self):
+        """
+        Starts the background writer thread on first use, and makes sure it is flushed at exit.
+        """
+        with self.lock:
+            if self.writer is None:
+                atexit.register(self.close)
+                self.stopping.clear()
+                self.writer = threading.Thread(
+                    target=self.run, name="log-writer", daemon=True
+                )
+                self.writer.start()
+
+    def afterFork(self):
+        """
+        Resets the logger in a forked child, which inherits neither the writer thread nor a usable lock.
+        Records buffered before the fork are dropped, since the parent writes them.
+        """
+        self.buffer = deque()
+        self.writer = None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+    def run(self):
+        """
+        Body of the writer thread: writes the buffered records in batches until closed.
+        """
+        while not self.stopping.wait(self.flushInterval):
+            self.flush()
+        self.flush()
+
+    @staticmethod
+    def format(record):
+        """
+        Formats one record as a line of text.
+
+        Parameters:
+            record (tuple): The buffered record.
+
+        Returns:
+            str: The formatted line.
+        """
+        created, level, label, message, args, fields = record
+        if args:
+            message = message % args
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(created))
+        line = f"{stamp}.{int(created % 1 * 1000):03d} {LEVEL_NAMES.get(level, level)}"
+        if label:
+            line += f" [{label}]"
+        line += f" {message}"
+        for key, value in fields.items():
+            line += f" {key}={value}"
+        return line
+
+    def flush(self):
+        """
+        Formats every buffered record and writes them with a single write and flush.
+        """
+        lines = []
+        while True:
+            try:
+                record = self.buffer.popleft()
+            except IndexError:
+                break
+            lines.append(self.format(record))
+        if self.dropped:
+            lines.append(f"{self.dropped} log records dropped (buffer full)")
+            self.dropped = 0
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+
+    def close(self):
+        """
+        Stops the writer thread once everything buffered has been written.
+        """
+        with self.lock:
+            writer, self.writer = self.writer, None
+        if writer is not None:
+            self.stopping.set()
+            writer.join()
+        self.flush()
+
+
+class ConnectionLogger:
+    """
+    Logger view bound to one client connection. Records below WARNING are only kept if the connection was
+    selected by sampling; warnings and errors are always kept.
+
+    Attributes:
+        logger (Logger): The logger receiving the records.
+        label (str): Identifies the connection in every record.
+        sampled (bool): Whether records below WARNING are kept for this connection.
+
+    Methods:
+        debug/info/warning/error(message, *args, **fields): Buffers a record for the connection.
+    """
+
+    __slots__ = ("logger", "label", "sampled")
+
+    def __init__(self, logger, label, sampled):
+        self.logger = logger
+        self.label = label
+        self.sampled = sampled
+
+    def debug(self, message, *args, **fields):
+        if self.sampled and DEBUG >= self.logger.level:
+            self.logger.emit(DEBUG, self.label, message, args, fields)
+
+    def info(self, message, *args, **fields):
+        if self.sampled and INFO >= self.logger.level:
+            self.logger.emit(INFO, self.label, message, args, fields)
+
+    def warning(self, message, *args, **fields):
+        if WARNING >= self.logger.level:
+            self.logger.emit(WARNING, self.label, message, args, fields)
+
+    def error(self, message, *args, **fields):
+        if ERROR >= self.logger.level:
+            self.logger.emit(ERROR, self.label, message, args, fields)
+
+
+# Logger shared by the whole server, configured from the command line
+log = Logger()
@@ -0,0 +1,267 @@
+"""
+Multi-process mode of the Iris server.
+
+A single server process is limited to one core by the GIL however many client threads it runs. The supervisor
+forks N worker processes, each running its own threaded or asyncio server with its own accept loop. Workers
+either bind the same port with SO_REUSEPORT, letting the kernel spread new connections across them, or accept
+from one listening socket created by the supervisor and inherited through fork. The supervisor restarts workers
+that die, and stops every worker when it is signalled or when a client sends 'shutdown' to any worker. Each
+worker keeps its own result cache and metrics, so 'stats' reports the worker that serves the connection.
+
+Classes:
+    Supervisor: Forks, watches, restarts and stops the worker processes.
+
+Modules:
+    os: Forks and reaps the worker processes.
+    signal: Delivers shutdown, reload and profiling requests between the supervisor and its workers.
+    socket: Creates the listening socket shared in 'inherit' mode.
+    threading: Runs a worker's server while its main thread waits for signals.
+    time: Paces the restarts of workers that die right after starting.
+    server: Builds the server run by each worker.
+    serverlog: Reports worker starts, exits and restarts.
+
+Constants:
+    RESTART_DELAY (float): Minimum seconds between the start of a worker and its replacement.
+
+"""
+
+import os
+import signal
+import socket
+import threading
+import time
+
+from server import createServer
+from serverlog import LEVELS, log
+
+# A worker dying sooner than this after starting is replaced only after this delay, so a worker that
+# cannot start (e.g. the port is taken) is not restarted in a tight loop
+RESTART_DELAY = 1.0
+
+
+class Supervisor:
+    """
+    Runs the server as several worker processes. It exposes the same start/shutdownServer/stop methods as
+    server.Server, so the entry point drives both the same way.
+
+    Attributes:
+        options (argparse.Namespace): The parsed command-line options, passed on to every worker.
+        processes (int): Number of worker processes kept running.
+        listener (socket.socket): The socket shared by the workers in 'inherit' mode, else None.
+        workers (dict): Start time (time.monotonic()) of every running worker, by process id.
+        restarts (int): Number of workers replaced after dying.
+        stopping (bool): True once shutdown has begun; workers exiting then are not replaced.
+        supervisorPid (int): Process id of the supervisor, signalled by workers to request shutdown.
+
+    Methods:
+        start(): Starts the workers and supervises them until they have all stopped.
+        spawn(): Forks one worker process.
+        runWorker(): Body of a worker process.
+        requestShutdown(): Called in a worker when a client sends 'shutdown'; asks the supervisor to stop.
+        requestReload(): Called in a worker when a client sends 'reload'; asks the supervisor to reload all workers.
+        handleReload(signum, frame): Makes every worker reload its model when the supervisor gets SIGHUP.
+        handleProfile(signum, frame): Makes every worker open a profiling window when the supervisor gets SIGUSR2.
+        handleSignal(signum, frame): Stops every worker when the supervisor is signalled.
+        shutdownServer(): Stops every worker.
+        stop(): Stops every worker.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.processes = options.processes
+        self.listener = None
+        self.workers = {}
+        self.restarts = 0
+        self.stopping = False
+        self.supervisorPid = os.getpid()
+        log.configure(level=LEVELS[options.log_level], sampleRate=options.log_sample)
+
+    def start(self):
+        """
+        Starts the worker processes, restarts those that die, and returns once every worker has stopped.
+        """
+        if self.options.listen == "inherit":
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.listener.bind((self.options.host, self.options.port))
+            self.listener.listen()
+
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+            signal.signal(signum, self.handleSignal)
+        signal.signal(signal.SIGHUP, self.handleReload)
+        signal.signal(signal.SIGUSR2, self.handleProfile)
+        for _ in range(self.processes):
+            self.spawn()
+        log.info(
+            "supervisor started %d worker processes on %s:%s (%s)",
+            self.processes,
+            self.options.host,
+            self.options.port,
+            self.options.listen,
+        )
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self.workers.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            log.warning(
+                "worker %d exited with status %d, restarting",
+                pid,
+                os.waitstatus_to_exitcode(status),
+            )
+            self.restarts += 1
+            delay = started + RESTART_DELAY - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if not self.stopping:
+                self.spawn()
+
+        if self.listener is not None:
+            self.listener.close()
+        log.info("server has been shut down")
+
+    def spawn(self):
+        """
+        Forks one worker process. The child never returns from this method.
+        """
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                status = self.runWorker()
+            except BaseException as err:
+                log.error("worker failed: %r", err)
+            finally:
+                log.close()
+                os._exit(status)
+        self.workers[pid] = time.monotonic()
+        log.info("started worker %d", pid)
+
+    def runWorker(self):
+        """
+        Body of a worker process. The server runs on a separate thread so the main thread is always free
+        to receive the supervisor's SIGTERM, which stops the server.
+
+        Returns:
+            int: The exit status of the worker process.
+        """
+
+        def terminate(signum, frame):
+            raise SystemExit
+
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR2, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, terminate)
+
+        server = createServer(
+            self.options, self.listener, reusePort=self.listener is None
+        )
+        # 'shutdown' and 'reload' must reach every worker, so they are routed through the supervisor
+        server.shutdownServer = self.requestShutdown
+        reloadModel = server.requestReload
+        signal.signal(signal.SIGHUP, lambda signum, frame: reloadModel())
+        server.requestReload = self.requestReload
+        signal.signal(
+            signal.SIGUSR2, lambda signum, frame: server.requestProfile("all")
+        )
+        failures = []
+
+        def serve():
+            try:
+                server.start()
+            except Exception as err:
+                failures.append(err)
+                log.error("worker server failed: %r", err)
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        try:
+            thread.join()
+        except SystemExit:
+            pass
+        finally:
+            server.stop()
+            thread.join(1.0)
+        return 1 if failures else 0
+
+    def requestShutdown(self):
+        """
+        Asks the supervisor to stop every worker. Called in a worker when a client sends 'shutdown'.
+        """
+        log.info("shutting down the server")
+        os.kill(self.supervisorPid, signal.SIGUSR1)
+
+    def requestReload(self):
+        """
+        Asks the supervisor to make every worker reload its model. Called in a worker for 'reload'.
+
+        Returns:
+            bool: True, as every worker starts its reload asynchronously, or None without a model file.
+        """
+        if not self.options.model:
+            return None
+        os.kill(self.supervisorPid, signal.SIGHUP)
+        return True
+
+    def handleReload(self, signum, frame):
+        """
+        Forwards SIGHUP to every worker, each of which reloads its model in the background.
+
+        Parameters:
+            signum (int): The signal received.
+            frame (frame): The interrupted stack frame.
+        """
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    def handleProfile(self, signum, frame):
+        """
+        Forwards SIGUSR2 to every worker, each of which profiles itself for a window and writes its own
+        reports, named after its process id.
+
+        Parameters:
+            signum (int): The signal received.
+            frame (frame): The interrupted stack frame.
+        """
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGUSR2)
+            except ProcessLookupError:
+                pass
+
+    def handleSignal(self, signum, frame):
+        """
+        Stops every worker when the supervisor receives SIGTERM, SIGINT, or SIGUSR1 from a worker.
+
+        Parameters:
+            signum (int): The signal received.
+            frame (frame): The interrupted stack frame.
+        """
+        self.stop()
+
+    def shutdownServer(self):
+        """
+        Initiates shutdown by stopping every worker.
+        """
+        log.info("shutting down the server")
+        self.stop()
+
+    def stop(self):
+        """
+        Sends SIGTERM to every worker; start() returns once they have all exited.
+        """
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
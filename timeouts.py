@@ -0,0 +1,306 @@
+"""
+Connection timeouts for the Iris server.
+
+Every open connection may be subject to three timeouts: idle (no bytes received for a while), read (a message
+started but not completed in time) and lifetime (connection open for too long). Rather than arming a timer per
+socket, all deadlines are kept in one hashed timer wheel, advanced by a single thread or event loop callback.
+Sessions only record timestamps as they receive data; the wheel is touched when a connection opens, closes,
+or reaches a deadline that turns out to have moved, in which case it is scheduled again. The wheel therefore
+holds one entry per open connection and costs nothing per received message.
+
+Classes:
+    TimerWheel: Hashed timer wheel holding one deadline per key.
+    ConnectionReaper: Tracks the deadlines of open connections and closes those that time out.
+
+Functions:
+    setKeepalive(connection, idle, interval, count): Enables TCP keepalive probes on a connection.
+
+Modules:
+    math: Rounds deadlines up to the tick of their slot.
+    socket: Sets the TCP keepalive options.
+    threading: Runs the reaper thread of the threaded server and guards the wheel.
+    time: Provides the monotonic clock of every deadline.
+
+Constants:
+    DEFAULT_TICK (float): Default seconds between two advances of the wheel.
+    DEFAULT_SLOTS (int): Default number of slots of the wheel.
+    REASONS (List[str]): The timeouts, as reported by 'stats' and to the sessions closed.
+
+"""
+
+import math
+import socket
+import threading
+import time
+
+# Timeouts fire at most this late; the wheel needs no finer resolution for timeouts counted in seconds
+DEFAULT_TICK = 0.5
+
+# Deadlines up to DEFAULT_SLOTS * DEFAULT_TICK seconds ahead are found without waiting for another round
+DEFAULT_SLOTS = 512
+
+REASONS = ["idle", "read", "lifetime"]
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: a ring of slots, each holding the keys whose deadline falls on one tick modulo the
+    size of the ring. Scheduling and cancelling take constant time, and advancing the wheel only looks at the
+    slots of the ticks that have passed. Keys due in a later round stay in their slot until then.
+
+    Attributes:
+        tick (float): Seconds per slot.
+        slots (List[dict]): The ring of slots, each mapping keys to their deadline.
+        where (dict): The slot index of every scheduled key.
+        current (int): The last tick advanced to.
+        popped (set): Keys returned by advance() and neither rescheduled, released nor cancelled since.
+        lock (threading.Lock): Guards the slots.
+
+    Methods:
+        schedule(key, deadline): Sets the deadline of a key, replacing any previous one.
+        reschedule(key, deadline): Sets a new deadline for a key returned by advance(), unless cancelled since.
+        release(key): Forgets a key returned by advance() that is not rescheduled.
+        cancel(key): Removes the deadline of a key.
+        advance(now): Removes and returns the keys whose deadline has passed.
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS, now=None):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        self.where = {}
+        self.current = int((time.monotonic() if now is None else now) / tick)
+        self.popped = set()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.where)
+
+    def schedule(self, key, deadline):
+        """
+        Sets the deadline of a key, replacing any previous one.
+
+        Parameters:
+            key (object): Any hashable key.
+            deadline (float): The time.monotonic() value at which the key expires.
+        """
+        with self.lock:
+            self.insert(key, deadline)
+
+    def insert(self, key, deadline):
+        """
+        Sets the deadline of a key; the caller holds the lock.
+
+        Parameters:
+            key (object): Any hashable key.
+            deadline (float): The time.monotonic() value at which the key expires.
+        """
+        # A key goes to the first tick at or after its deadline, so it is due when that tick is
+        # advanced over; a deadline already passed goes to the next tick advanced over
+        index = max(math.ceil(deadline / self.tick), self.current + 1)
+        index %= len(self.slots)
+        previous = self.where.get(key)
+        if previous is not None:
+            del self.slots[previous][key]
+        self.slots[index][key] = deadline
+        self.where[key] = index
+
+    def reschedule(self, key, deadline):
+        """
+        Sets a new deadline for a key returned by advance(). A key cancelled in the meantime, e.g. because
+        its connection closed while its deadline was being checked, stays cancelled.
+
+        Parameters:
+            key (object): The key.
+            deadline (float): The time.monotonic() value at which the key expires.
+
+        Returns:
+            bool: Whether the key was scheduled again.
+        """
+        with self.lock:
+            if key not in self.popped:
+                return False
+            self.popped.discard(key)
+            self.insert(key, deadline)
+            return True
+
+    def release(self, key):
+        """
+        Forgets a key returned by advance() that will not be scheduled again.
+
+        Parameters:
+            key (object): The key.
+        """
+        with self.lock:
+            self.popped.discard(key)
+
+    def cancel(self, key):
+        """
+        Removes the deadline of a key, if it has one, including a key being checked after advance().
+
+        Parameters:
+            key (object): The key.
+        """
+        with self.lock:
+            self.popped.discard(key)
+            index = self.where.pop(key, None)
+            if index is not None:
+                del self.slots[index][key]
+
+    def advance(self, now):
+        """
+        Advances the wheel to the current time.
+
+        Parameters:
+            now (float): The current time.monotonic() value.
+
+        Returns:
+            list: The keys whose deadline is at or before now, no longer scheduled; each must be passed to
+            reschedule() or release() once handled.
+        """
+        expired = []
+        with self.lock:
+            target = int(now / self.tick)
+            # After a long pause every slot is visited once, not once per missed tick
+            first = max(self.current + 1, target - len(self.slots) + 1)
+            for tick in range(first, target + 1):
+                slot = self.slots[tick % len(self.slots)]
+                if not slot:
+                    continue
+                due = [key for key, deadline in slot.items() if deadline <= now]
+                for key in due:
+                    del slot[key]
+                    del self.where[key]
+                self.popped.update(due)
+                expired.extend(due)
+            self.current = max(self.current, target)
+        return expired
+
+
+class ConnectionReaper:
+    """
+    Closes connections that exceed their idle, read or lifetime timeout. Sessions record when they opened,
+    when they last received data, and since when a message has been partially received (see
+    server.ClientSession.deadline); the reaper keeps the earliest of their deadlines in a TimerWheel. When a
+    deadline is reached the session's current deadline is recomputed: the session is closed if it has
+    passed, or scheduled again otherwise. A session with no message in progress is checked again after the
+    read timeout, which is never later than a read deadline starting in the meantime.
+
+    Attributes:
+        idle (float): Seconds a connection may go without receiving anything, or 0.
+        read (float): Seconds allowed to complete a message once its first bytes arrived, or 0.
+        lifetime (float): Seconds a connection may stay open, or 0.
+        wheel (TimerWheel): The deadlines of the open connections.
+        expired (dict): Number of connections closed, by timeout.
+        stopped (threading.Event): Set to stop the reaper thread.
+
+    Methods:
+        track(session): Starts watching a newly opened session.
+        forget(session): Stops watching a closed session.
+        reap(now): Closes the sessions that have timed out, and reschedules those that have not.
+        start(): Starts the reaper thread (threaded server).
+        run(): Body of the reaper thread.
+        stats(): Returns the timeout counters.
+        stop(): Stops the reaper thread.
+    """
+
+    def __init__(self, idle=0.0, read=0.0, lifetime=0.0, tick=DEFAULT_TICK):
+        self.idle = idle
+        self.read = read
+        self.lifetime = lifetime
+        self.wheel = TimerWheel(tick)
+        self.expired = dict.fromkeys(REASONS, 0)
+        self.stopped = threading.Event()
+
+    def track(self, session):
+        """
+        Starts watching a newly opened session.
+
+        Parameters:
+            session (ClientSession): The session.
+        """
+        self.wheel.schedule(session, session.deadline(self, time.monotonic())[0])
+
+    def forget(self, session):
+        """
+        Stops watching a closed session.
+
+        Parameters:
+            session (ClientSession): The session.
+        """
+        self.wheel.cancel(session)
+
+    def reap(self, now=None):
+        """
+        Closes the sessions that have timed out, and reschedules those whose deadline moved. A session
+        forgotten while its deadline is checked, outside the wheel's lock, is not scheduled again.
+
+        Parameters:
+            now (float): The current time.monotonic() value, read if not given.
+        """
+        if now is None:
+            now = time.monotonic()
+        for session in self.wheel.advance(now):
+            deadline, reason = session.deadline(self, now)
+            if reason is None or deadline > now:
+                self.wheel.reschedule(session, deadline)
+                continue
+            self.wheel.release(session)
+            self.expired[reason] += 1
+            session.log.info("closing connection: %s timeout", reason)
+            try:
+                session.expire(reason)
+            except OSError:
+                pass
+
+    def start(self):
+        """
+        Starts the thread advancing the wheel, for the threaded server.
+        """
+        threading.Thread(target=self.run, name="reaper", daemon=True).start()
+
+    def run(self):
+        """
+        Body of the reaper thread: advances the wheel every tick until stopped.
+        """
+        while not self.stopped.wait(self.wheel.tick):
+            self.reap()
+
+    def stats(self):
+        """
+        Returns the timeout counters reported by 'stats'.
+
+        Returns:
+            dict: Connections watched, and connections closed by each timeout.
+        """
+        counters = {"tracked": len(self.wheel)}
+        counters.update(self.expired)
+        return counters
+
+    def stop(self):
+        """
+        Stops the reaper thread.
+        """
+        self.stopped.set()
+
+
+def setKeepalive(connection, idle, interval=None, count=None):
+    """
+    Enables TCP keepalive probes, so peers that vanished without closing are detected by the kernel. The
+    per-connection timings are set where the platform supports them.
+
+    Parameters:
+        connection (socket.socket): The connection.
+        idle (float): Seconds of silence before the first probe.
+        interval (float): Seconds between probes, or None for the system default.
+        count (int): Unanswered probes before the connection is dropped, or None for the system default.
+    """
+    connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for name, value in (
+        ("TCP_KEEPIDLE", idle),
+        ("TCP_KEEPINTVL", interval),
+        ("TCP_KEEPCNT", count),
+    ):
+        if value and hasattr(socket, name):
+            connection.setsockopt(
+                socket.IPPROTO_TCP, getattr(socket, name), max(1, int(value))
+            )